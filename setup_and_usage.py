@@ -12,12 +12,12 @@ def setup_database():
     
     print("Step 1: Creating database schema...")
     db = DiseaseDataDatabase()
-    db.create_database_schema()
+    db.create_database_schema(normalized_geometry=True)
     print("✅ Database schema created")
     
     print("\nStep 2: Importing GeoJSON files...")
     print("⏳ This will take several minutes for 273 files...")
-    db.import_geojson_files()
+    db.import_geojson_files(streaming=True, workers=os.cpu_count(), bulk_load=True)
     print("✅ Data import completed")
     
     print("\nStep 3: Verifying import...")
@@ -30,6 +30,19 @@ def setup_database():
     
     print("\n🎉 Setup complete! You can now start the web application.")
 
+def update_database():
+    """Import only new or changed GeoJSON files into the existing database"""
+    print("🔄 Updating Disease Prediction Database\n")
+    
+    db = DiseaseDataDatabase()
+    db.import_geojson_files(streaming=True, workers=os.cpu_count(), incremental=True)
+    
+    stats = db.get_database_stats()
+    print(f"\n📊 Database Statistics:")
+    print(f"  - Total predictions: {stats['total_predictions']:,}")
+    print(f"  - Total dates: {stats['total_dates']}")
+    print(f"  - Date range: {stats['date_range'][0]} to {stats['date_range'][1]}")
+
 def show_usage_guide():
     """Show usage guide for the system"""
     print("""
@@ -51,17 +64,45 @@ def show_usage_guide():
 
 🚀 Getting Started:
 1. Set up database:     python setup_and_usage.py --setup
+   Add new days later:  python setup_and_usage.py --update
+   Pre-render tiles:    python src/main/python/vector_tiles.py --seed 10 14
+   Verify catalog:      python src/main/python/database_manager.py --check-catalog
+                        (--rebuild-catalog upgrades a database created before the catalog)
+   District rollups:    python src/main/python/database_manager.py --build-town-rollups
+                        (only for databases imported before district rollups existed)
+   Date-to-date diffs:  python src/main/python/database_manager.py --build-region-changes
+                        (only for databases imported before diffs were precomputed)
 2. Test database:       python src/main/python/test_database.py  
 3. Start web app:       python src/main/python/app.py
 4. Open browser:        http://localhost:5000
+   Several workers:     DISEASE_MEMORY_STORE=1 DISEASE_MEMORY_SNAPSHOT_DIR=/dev/shm/disease gunicorn -w 4 app:app
+                        (attributes served from shared numpy matrices, reloaded when a new import lands)
+   Query cache:         DISEASE_QUERY_CACHE_MB=64 DISEASE_QUERY_CACHE_ENTRIES=1024 [DISEASE_QUERY_CACHE_TTL=seconds]
+                        (results keyed by dataset version, so a re-import invalidates them; 0 MB disables)
 
 🔧 API Endpoints:
 - GET /api/dates                   # Get all available dates
 - GET /api/data?date=YYYY-MM-DD   # Get predictions for specific date
+  (/api/data, /api/high-risk and /api/geometry accept &zoom=N or &tolerance=DEG for simplified polygons)
+  (/api/data and /api/high-risk accept &format=topojson[&quantization=N] for shared-arc TopoJSON)
+  (/api/data and /api/high-risk accept &bbox=west,south,east,north to return only regions in view)
+- GET /api/geometry               # Region polygons (redirects to a content-hashed, cache-forever URL)
+- GET /api/attributes?date=YYYY-MM-DD&layout=arrays|keyed  # Per-date values keyed by townvill
+- GET /api/diff?from=YYYY-MM-DD&to=YYYY-MM-DD[&tolerance=1]  # Only regions whose values changed, as a patch
+- GET /tiles/<date>/<z>/<x>/<y>.pbf  # Mapbox Vector Tile of regions with the date's predictions
+- GET /api/series?start=&end=&field=percentage|predicted|binary|actual&dtype=uint8|float16
+  (binary dates x regions matrix: uint32 header length, JSON header with dates/regions/scale, values)
 - GET /api/region/<townvill>      # Get timeline for specific region
+- GET|POST /api/regions/timeline?townvill=A,B,...&start_date=&end_date=&points=N&method=lttb|minmax
+  (many timelines from one query, optionally downsampled; POST {"townvill": [...]} for long lists)
 - GET /api/high-risk?date=YYYY-MM-DD&threshold=50  # Get high-risk regions
+- GET /api/ranking?date=YYYY-MM-DD&limit=50&cursor=&town=&min_percentage=  # Top-K regions, keyset-paginated
+- GET /api/export?start=&end=&format=csv|ndjson|geojson[&townvill=][&geometry=1]  # Streamed bulk download
+  (/api/data and /api/region/<townvill> accept &stream=1 to stream the response in chunks)
 - GET /api/summary/<date>         # Get daily summary statistics
+- GET /api/towns?date=YYYY-MM-DD[&zoom=N][&geometry=0]  # District rollups with dissolved district polygons
 - GET /api/stats                  # Get overall database statistics
+- GET /api/cache-stats            # Response/query cache hits, misses and evictions (this worker)
 
 📊 Database Features:
 - Fast queries with optimized indexes
@@ -80,6 +121,12 @@ curl "http://localhost:5000/api/high-risk?date=2023-06-01&threshold=20"
 # Get region timeline
 curl "http://localhost:5000/api/region/A6727-0001-00?start_date=2023-06-01&end_date=2023-06-07"
 
+# Export June as CSV
+curl -o june.csv "http://localhost:5000/api/export?start=2023-06-01&end=2023-06-30&format=csv"
+
+# Compare regions, 60 points each
+curl "http://localhost:5000/api/regions/timeline?townvill=A6727-0001-00,A6727-0002-00&points=60"
+
 🎨 Web Interface Features:
 - Interactive map visualization
 - Date selector for temporal analysis  
@@ -111,6 +158,8 @@ def main():
     
     if len(sys.argv) > 1 and sys.argv[1] == '--setup':
         setup_database()
+    elif len(sys.argv) > 1 and sys.argv[1] == '--update':
+        update_database()
     else:
         show_usage_guide()
 
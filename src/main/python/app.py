@@ -1,25 +1,301 @@
-from flask import Flask, render_template, jsonify, request, send_from_directory
-from database_manager import DiseaseDataDatabase
+from flask import (Flask, Response, redirect, render_template, jsonify, request, send_from_directory,
+                   stream_with_context, url_for)
+from database_manager import DEFAULT_CHANGE_TOLERANCE, SERIES_FIELDS, TOWN_SUMMARY_COLUMNS, DiseaseDataDatabase
+from region_topology import DEFAULT_QUANTIZATION, RegionTopology, TopoJSONEncoder, tolerance_for_zoom
+from response_cache import CachedPayload, ResponseCache
+from streaming import EXPORT_FORMATS, STREAM_CHUNK_ROWS, buffered, iter_export, iter_feature_collection, iter_json_array
+from timeseries import DOWNSAMPLE_METHODS, downsample_timeline
+from vector_tiles import DEFAULT_TILE_CACHE_DIR, RegionTileSource
+import atexit
+import base64
+import binascii
+import itertools
 import json
+import math
 import os
-from datetime import datetime
+import re
+import struct
+import sys
+from array import array
+from datetime import datetime, timezone
+from functools import lru_cache
 
 app = Flask(__name__,
             static_folder=os.path.abspath('src/main/resources/assets'),
             template_folder=os.path.abspath('src/main/resources'))
 
-# Initialize database
-db = DiseaseDataDatabase()
+# Query result cache shared by both backends (DISEASE_QUERY_CACHE_MB=0 disables it)
+query_cache_options = dict(
+    query_cache_bytes=int(os.environ.get('DISEASE_QUERY_CACHE_MB', 64)) * 1024 * 1024,
+    query_cache_entries=int(os.environ.get('DISEASE_QUERY_CACHE_ENTRIES', 1024)),
+    query_cache_ttl=float(os.environ['DISEASE_QUERY_CACHE_TTL']) if os.environ.get('DISEASE_QUERY_CACHE_TTL') else None
+)
 
-# Cache available dates for performance
-available_dates = None
+# Initialize data backend: SQLite (default) or the Parquet dataset
+if os.environ.get('DISEASE_DATA_BACKEND', 'sqlite') == 'columnar':
+    from columnar_store import ColumnarDiseaseData
+    db = ColumnarDiseaseData(os.environ.get('DISEASE_COLUMNAR_DIR', 'output/columnar'), **query_cache_options)
+else:
+    # Pooled read-only connections, closed on shutdown
+    db = DiseaseDataDatabase(
+        cache_size_kib=int(os.environ.get('DISEASE_DB_CACHE_KIB', 64 * 1024)),
+        mmap_size=int(os.environ.get('DISEASE_DB_MMAP_BYTES', 256 * 1024 * 1024)),
+        temp_store=os.environ.get('DISEASE_DB_TEMP_STORE', 'MEMORY'),
+        **query_cache_options
+    )
 
-def get_available_dates():
-    """Get available dates with caching"""
-    global available_dates
-    if available_dates is None:
-        available_dates = db.get_available_dates()
-    return available_dates
+# Optionally answer attribute queries from dates x regions numpy matrices shared by all workers
+if os.environ.get('DISEASE_MEMORY_STORE', '').lower() in ('1', 'true', 'yes'):
+    from memory_store import DEFAULT_CHECK_INTERVAL, InMemoryDiseaseData
+    db = InMemoryDiseaseData(
+        db,
+        snapshot_dir=os.environ.get('DISEASE_MEMORY_SNAPSHOT_DIR') or None,
+        check_interval=float(os.environ.get('DISEASE_MEMORY_CHECK_SECONDS', DEFAULT_CHECK_INTERVAL))
+    )
+atexit.register(db.close)
+
+# Finished payloads keyed by (endpoint, arguments, dataset version)
+response_cache = ResponseCache(
+    max_bytes=int(os.environ.get('DISEASE_RESPONSE_CACHE_MB', 256)) * 1024 * 1024,
+    max_entries=int(os.environ.get('DISEASE_RESPONSE_CACHE_ENTRIES', 256))
+)
+
+# Seconds browsers and proxies may reuse a read response before revalidating
+HTTP_MAX_AGE = int(os.environ.get('DISEASE_HTTP_MAX_AGE', 300))
+
+# Content-addressed responses never change under their URL
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Per-date attribute columns served by /api/attributes, in row order after townvill
+ATTRIBUTE_FIELDS = [
+    "predicted_case_lag_future_14",
+    "predicted_case_lag_future_14_percentage",
+    "predicted_case_lag_future_14_binary",
+    "case_lag_future_14"
+]
+
+# Region vector tiles, cached on disk per dataset version (empty setting disables the disk cache)
+tile_source = RegionTileSource(db, os.environ.get('DISEASE_TILE_CACHE_DIR', DEFAULT_TILE_CACHE_DIR))
+MAX_TILE_ZOOM = 22
+
+# Largest page /api/ranking serves
+MAX_RANKING_LIMIT = 1000
+
+# Most regions one /api/regions/timeline request may ask for
+MAX_TIMELINE_REGIONS = int(os.environ.get('DISEASE_MAX_TIMELINE_REGIONS', 500))
+DATE_PATTERN = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+def feature_collection_payload(features):
+    """Assemble FeatureCollection bytes from (properties, geometry GeoJSON text) pairs
+
+    Stored geometry text is spliced in as-is, so polygons are never parsed
+    or re-serialized.
+    """
+    parts = [
+        '{"type":"Feature","properties":%s,"geometry":%s}' % (
+            json.dumps(properties, ensure_ascii=False, separators=(',', ':')),
+            geometry_json if geometry_json is not None else 'null'
+        )
+        for properties, geometry_json in features
+    ]
+    return ('{"type":"FeatureCollection","features":[' + ','.join(parts) + ']}').encode('utf-8')
+
+# Integer types for exact series matrices: (dtype, array typecode, value marking "no row")
+SERIES_INTEGER_TYPES = [('uint8', 'B', 0xFF), ('uint16', 'H', 0xFFFF), ('uint32', 'I', 0xFFFFFFFF)]
+SERIES_MISSING_UINT8 = 0xFF
+
+def series_payload(field, dates, townvills, rows, dtype='uint8'):
+    """Binary date x region matrix: uint32 LE header length, JSON header, row-major values
+
+    With ``uint8`` integer-valued data (counts, flags) is stored exactly as
+    ``value = stored + offset`` in the smallest of uint8/uint16/uint32 that
+    fits, whose largest value means missing; the header's dtype names the
+    type used. Other data is quantized linearly into uint8 (value = byte *
+    scale + offset, 255 missing). ``float16`` stores half floats with NaN for
+    missing. Values are little-endian and the header is padded with spaces so
+    the matrix starts at a 4-byte aligned offset.
+    """
+    values = [value for row in rows for value in row]
+    present = [value for value in values if value is not None]
+    header = {
+        "field": field,
+        "column": SERIES_FIELDS[field],
+        "dtype": dtype,
+        "shape": [len(dates), len(townvills)],
+        "dates": dates,
+        "regions": townvills
+    }
+    
+    if dtype == 'float16':
+        body = struct.pack(f'<{len(values)}e', *(math.nan if value is None else value for value in values))
+        header["missing"] = None
+    else:
+        low, high = (min(present), max(present)) if present else (0, 0)
+        exact = None
+        if all(float(value).is_integer() for value in present):
+            offset = int(min(low, 0))
+            exact = next((integer_type for integer_type in SERIES_INTEGER_TYPES
+                          if high - offset < integer_type[2]), None)
+        if exact is not None:
+            (dtype, typecode, missing), scale = exact, 1
+        else:
+            typecode, missing = 'B', SERIES_MISSING_UINT8
+            scale, offset = (high - low) / (SERIES_MISSING_UINT8 - 1) or 1, low
+        matrix = array(typecode, (
+            missing if value is None else round((value - offset) / scale)
+            for value in values
+        ))
+        if sys.byteorder == 'big':
+            matrix.byteswap()
+        body = matrix.tobytes()
+        header.update({"dtype": dtype, "scale": scale, "offset": offset, "missing": missing})
+    
+    header_bytes = json_bytes(header)
+    header_bytes += b' ' * (-len(header_bytes) % 4)
+    return struct.pack('<I', len(header_bytes)) + header_bytes + body
+
+def json_bytes(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def streamed_response(pieces, mimetype='application/json', headers=None):
+    """Chunked response sent as the generator produces it (never cached)"""
+    response = Response(stream_with_context(buffered(pieces)), mimetype=mimetype, headers=headers)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+def requested_stream():
+    return request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+def dataset_last_modified(version):
+    """Last-Modified time for a dataset version stamp (nanoseconds since the epoch)"""
+    try:
+        return datetime.fromtimestamp(int(version) / 1e9, tz=timezone.utc).replace(microsecond=0)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+def cached_payload(key, build):
+    """(CachedPayload or None, dataset version) for a version-keyed cache entry
+
+    ``build`` returns the body bytes, or None when there is nothing to serve.
+    """
+    version = db.get_dataset_version()
+    
+    def build_payload():
+        body = build()
+        return CachedPayload(body) if body is not None else None
+    
+    return response_cache.get_or_build(key + (version,), build_payload), version
+
+def cached_json_response(key, build, cache_control=None, mimetype='application/json'):
+    """Serve a version-keyed cached payload (JSON unless ``mimetype`` says otherwise) with HTTP validators
+
+    ``build`` returns the body bytes, or None when there is nothing to serve
+    (the caller then answers 404). Responses carry a content-hash ETag per
+    representation (suffixed -gzip/-br for compressed variants, which are
+    picked from Accept-Encoding), Last-Modified from the dataset version and
+    Cache-Control; conditional requests naming any representation of the
+    current payload get 304 with the ETag of the one this client would get.
+    """
+    payload, version = cached_payload(key, build)
+    if payload is None:
+        return None
+    
+    encoding, body = payload.variant(lambda name: request.accept_encodings[name] > 0)
+    last_modified = dataset_last_modified(version)
+    if request.if_none_match:
+        not_modified = request.if_none_match.star_tag or any(
+            payload.matches(tag) for tag in request.if_none_match.as_set(include_weak=True))
+    else:
+        not_modified = (last_modified is not None and request.if_modified_since is not None
+                        and last_modified <= request.if_modified_since)
+    
+    if not_modified:
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    
+    response.set_etag(payload.variant_etag(encoding))
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = cache_control or f'public, max-age={HTTP_MAX_AGE}'
+    response.vary.add('Accept-Encoding')
+    return response
+
+def requested_geometry_level():
+    """Stored simplification level for ?tolerance= (degrees) or ?zoom=, or None for full resolution
+
+    Raises ValueError for malformed values.
+    """
+    tolerance = request.args.get('tolerance')
+    zoom = request.args.get('zoom')
+    if tolerance is not None:
+        tolerance = float(tolerance)
+    elif zoom is not None:
+        tolerance = tolerance_for_zoom(int(zoom))
+    return db.simplification_level(tolerance)
+
+INVALID_LEVEL_ERROR = {"error": "zoom must be a non-negative integer and tolerance a number"}
+
+def requested_bbox():
+    """(min_x, min_y, max_x, max_y) from ?bbox=west,south,east,north, or None
+
+    Raises ValueError for malformed boxes.
+    """
+    bbox = request.args.get('bbox')
+    if not bbox:
+        return None
+    min_x, min_y, max_x, max_y = (float(value) for value in bbox.split(','))
+    if min_x > max_x or min_y > max_y:
+        raise ValueError(bbox)
+    return min_x, min_y, max_x, max_y
+
+INVALID_BBOX_ERROR = {"error": "bbox must be west,south,east,north"}
+
+# TopoJSON grid size per axis unless ?quantization= overrides it (0 = unquantized)
+TOPOJSON_QUANTIZATION = int(os.environ.get('DISEASE_TOPOJSON_QUANTIZATION', DEFAULT_QUANTIZATION))
+
+def requested_output_format():
+    """('geojson', None) or ('topojson', quantization) from ?format= and ?quantization=
+
+    Raises ValueError for unknown formats or malformed quantization.
+    """
+    output_format = request.args.get('format', 'geojson')
+    if output_format == 'geojson':
+        return output_format, None
+    if output_format != 'topojson':
+        raise ValueError(output_format)
+    quantization = int(request.args.get('quantization', TOPOJSON_QUANTIZATION))
+    if quantization < 0 or quantization == 1:
+        raise ValueError(quantization)
+    return output_format, quantization
+
+INVALID_FORMAT_ERROR = {"error": "format must be 'geojson' or 'topojson' and quantization 0 or at least 2"}
+
+@lru_cache(maxsize=8)
+def topojson_encoder(version, level, quantization):
+    """Region arc topology and quantized arcs, built once per dataset version, level and quantization"""
+    geometries = {
+        townvill: json.loads(geometry_json)
+        for townvill, _, geometry_json in db.get_region_geometries(level) if geometry_json
+    }
+    return TopoJSONEncoder(RegionTopology(geometries), quantization)
+
+def region_features_payload(rows, output_format, level):
+    """GeoJSON or TopoJSON bytes for (townvill, properties, geometry GeoJSON text) rows"""
+    format_name, quantization = output_format
+    if format_name == 'topojson':
+        encoder = topojson_encoder(db.get_dataset_version(), level, quantization)
+        return encoder.encode((townvill, properties) for townvill, properties, _ in rows)
+    return feature_collection_payload((properties, geometry_json) for _, properties, geometry_json in rows)
+
+def build_geometry_payload(level=None):
+    """Region layer FeatureCollection (static across dates)"""
+    return feature_collection_payload(
+        ({"townvill": townvill, "town": town}, geometry_json)
+        for townvill, town, geometry_json in db.get_region_geometries(level)
+    )
 
 @app.route('/')
 def index():
@@ -29,127 +305,528 @@ def index():
 def get_dates():
     """Get all available dates"""
     try:
-        dates = get_available_dates()
-        return jsonify(dates)
+        return cached_json_response(('dates',), lambda: json_bytes(db.get_available_dates()))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/data')
 def get_data_by_date():
-    """Get prediction data for a specific date"""
+    """Get prediction data for a specific date
+
+    ``zoom``/``tolerance`` select simplified geometry; ``format=topojson``
+    (with optional ``quantization``) returns shared-arc TopoJSON; ``bbox``
+    limits the response to regions intersecting the box.
+    """
+    selected_date = request.args.get('date')
+    if not selected_date:
+        return jsonify({"error": "Missing date parameter"}), 400
+    try:
+        level = requested_geometry_level()
+    except ValueError:
+        return jsonify(INVALID_LEVEL_ERROR), 400
+    try:
+        output_format = requested_output_format()
+    except ValueError:
+        return jsonify(INVALID_FORMAT_ERROR), 400
+    try:
+        bbox = requested_bbox()
+    except ValueError:
+        return jsonify(INVALID_BBOX_ERROR), 400
+    
+    if requested_stream():
+        # Feature by feature, ordered by townvill instead of percentage
+        if output_format[0] != 'geojson':
+            return jsonify({"error": "stream=1 supports GeoJSON output only"}), 400
+        if db.get_daily_summary(selected_date) is None:
+            return jsonify({"error": "No data found for the specified date"}), 404
+        
+        chunks = db.iter_predictions(selected_date, selected_date, geometry=True, tolerance=level, bbox=bbox,
+                                    chunk_size=STREAM_CHUNK_ROWS)
+        return streamed_response(iter_feature_collection(chunks, lambda row: {
+            "date": row[0],
+            "townvill": row[1],
+            "town": row[2],
+            "predicted_case_lag_future_14": row[4],
+            "predicted_case_lag_future_14_percentage": row[5],
+            "predicted_case_lag_future_14_binary": row[6],
+            "case_lag_future_14": row[7]
+        }))
+    
+    def build():
+        predictions = db.get_predictions_by_date(selected_date, level, bbox)
+        if not predictions and (bbox is None or db.get_daily_summary(selected_date) is None):
+            return None  # An empty viewport on a known date is still a valid (empty) result
+        
+        return region_features_payload(
+            ((townvill, {
+                "date": date,
+                "townvill": townvill,
+                "town": town,
+                "predicted_case_lag_future_14": predicted_value,
+                "predicted_case_lag_future_14_percentage": predicted_percentage,
+                "predicted_case_lag_future_14_binary": predicted_binary,
+                "case_lag_future_14": actual_case
+            }, geometry_json)
+            for date, townvill, town, predicted_value, predicted_percentage, predicted_binary, actual_case, geometry_json
+            in predictions),
+            output_format, level
+        )
+    
+    try:
+        response = cached_json_response(('data', selected_date, level, output_format, bbox), build)
+        
+        if response is None:
+            return jsonify({"error": "No data found for the specified date"}), 404
+        
+        return response
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/geometry')
+def get_geometry():
+    """Redirect to the region layer under its current content hash"""
+    try:
+        level = requested_geometry_level()
+    except ValueError:
+        return jsonify(INVALID_LEVEL_ERROR), 400
+    
+    try:
+        payload, _ = cached_payload(('geometry', level), lambda: build_geometry_payload(level))
+        response = redirect(url_for('get_geometry_version', geometry_hash=payload.etag, tolerance=level))
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/geometry/<geometry_hash>')
+def get_geometry_version(geometry_hash):
+    """Region polygons, cacheable forever under their content hash"""
+    try:
+        level = requested_geometry_level()
+    except ValueError:
+        return jsonify(INVALID_LEVEL_ERROR), 400
+    
+    try:
+        build = lambda: build_geometry_payload(level)
+        payload, _ = cached_payload(('geometry', level), build)
+        if geometry_hash != payload.etag:
+            # Stale hash after a re-import: send the client to the current layer
+            return redirect(url_for('get_geometry_version', geometry_hash=payload.etag, tolerance=level))
+        return cached_json_response(('geometry', level), build, cache_control=IMMUTABLE_CACHE_CONTROL)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/attributes')
+def get_attributes_by_date():
+    """Per-date prediction attributes keyed by townvill, to be joined with /api/geometry
+
+    ``layout=arrays`` (default) returns parallel arrays; ``layout=keyed``
+    returns ``{townvill: [values in "fields" order]}``.
+    """
     selected_date = request.args.get('date')
+    layout = request.args.get('layout', 'arrays')
     if not selected_date:
         return jsonify({"error": "Missing date parameter"}), 400
+    if layout not in ('arrays', 'keyed'):
+        return jsonify({"error": "layout must be 'arrays' or 'keyed'"}), 400
+    
+    def build():
+        rows = db.get_region_attributes_by_date(selected_date)
+        if not rows:
+            return None
+        
+        if layout == 'keyed':
+            return json_bytes({
+                "date": selected_date,
+                "fields": ATTRIBUTE_FIELDS,
+                "regions": {row[0]: list(row[1:]) for row in rows}
+            })
+        
+        columns = list(zip(*rows))
+        data = {"date": selected_date, "townvill": list(columns[0])}
+        for field, values in zip(ATTRIBUTE_FIELDS, columns[1:]):
+            data[field] = list(values)
+        return json_bytes(data)
     
     try:
-        # Get predictions from database
-        predictions = db.get_predictions_by_date(selected_date)
+        response = cached_json_response(('attributes', selected_date, layout), build)
         
-        if not predictions:
+        if response is None:
             return jsonify({"error": "No data found for the specified date"}), 404
         
-        # Convert to GeoJSON format
-        features = []
-        for row in predictions:
-            date, townvill, town, predicted_value, predicted_percentage, predicted_binary, actual_case, geometry_json = row
-            
-            feature = {
-                "type": "Feature",
-                "properties": {
-                    "date": date,
-                    "townvill": townvill,
-                    "town": town,
-                    "predicted_case_lag_future_14": predicted_value,
-                    "predicted_case_lag_future_14_percentage": predicted_percentage,
-                    "predicted_case_lag_future_14_binary": predicted_binary,
-                    "case_lag_future_14": actual_case
-                },
-                "geometry": json.loads(geometry_json)
-            }
-            features.append(feature)
-        
-        geojson = {
-            "type": "FeatureCollection",
-            "features": features
-        }
+        return response
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/diff')
+def get_attribute_diff():
+    """Patch from one date's attributes to another's: only the regions that changed
+
+    ``changed`` maps townvill to its values on ``to`` (in ``fields`` order, as
+    /api/attributes?layout=keyed); ``removed`` lists regions without a row on
+    ``to``. A region changes when its binary prediction, actual case or risk
+    band differs, or its percentage moves by more than ``tolerance`` points.
+    """
+    from_date = request.args.get('from')
+    to_date = request.args.get('to')
+    if not from_date or not to_date or not DATE_PATTERN.match(from_date) or not DATE_PATTERN.match(to_date):
+        return jsonify({"error": "from and to must both be given as YYYY-MM-DD"}), 400
+    try:
+        tolerance = float(request.args.get('tolerance', DEFAULT_CHANGE_TOLERANCE))
+    except ValueError:
+        return jsonify({"error": "tolerance must be a number"}), 400
+    if not 0 <= tolerance < math.inf:
+        return jsonify({"error": "tolerance must be a non-negative number"}), 400
+    
+    def build():
+        dates = db.get_available_dates()
+        if from_date not in dates or to_date not in dates:
+            return None
+        
+        changed = {}
+        removed = []
+        for townvill, *values in db.get_region_changes(from_date, to_date, tolerance):
+            if all(value is None for value in values):
+                removed.append(townvill)
+            else:
+                changed[townvill] = values
+        return json_bytes({
+            "from": from_date,
+            "to": to_date,
+            "tolerance": tolerance,
+            "fields": ATTRIBUTE_FIELDS,
+            "changed": changed,
+            "removed": removed
+        })
+    
+    try:
+        response = cached_json_response(('diff', from_date, to_date, tolerance), build)
+        
+        if response is None:
+            return jsonify({"error": "No data found for the specified dates"}), 404
         
-        return jsonify(geojson)
+        return response
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/tiles/<date>/<int:z>/<int:x>/<int:y>.pbf')
+def get_tile(date, z, x, y):
+    """Mapbox Vector Tile of the region layer with the date's prediction attributes"""
+    if not DATE_PATTERN.match(date) or z > MAX_TILE_ZOOM or x >= (1 << z) or y >= (1 << z):
+        return jsonify({"error": "Invalid tile address"}), 400
+    
+    try:
+        response = cached_json_response(('tile', date, z, x, y),
+                                        lambda: tile_source.get_tile(date, z, x, y),
+                                        mimetype='application/x-protobuf')
+        
+        if response is None:
+            return jsonify({"error": "No data found for the specified date"}), 404
+        
+        return response
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/series')
+def get_series():
+    """One attribute as a dense dates x regions binary matrix (see series_payload)
+
+    ``field`` is one of SERIES_FIELDS (default percentage); ``dtype`` is uint8
+    (default; integer fields widen to uint16/uint32 to stay exact) or float16.
+    Without ``start``/``end`` the whole season is returned.
+    """
+    dates = db.get_available_dates()
+    start_date = request.args.get('start') or (dates[0] if dates else '')
+    end_date = request.args.get('end') or (dates[-1] if dates else '')
+    field = request.args.get('field', 'percentage')
+    dtype = request.args.get('dtype', 'uint8')
+    
+    if field not in SERIES_FIELDS:
+        return jsonify({"error": f"field must be one of {', '.join(SERIES_FIELDS)}"}), 400
+    if dtype not in ('uint8', 'float16'):
+        return jsonify({"error": "dtype must be 'uint8' or 'float16'"}), 400
+    
+    def build():
+        series_dates, townvills, rows = db.get_series(start_date, end_date, field)
+        if not series_dates:
+            return None
+        return series_payload(field, series_dates, townvills, rows, dtype)
+    
+    try:
+        response = cached_json_response(('series', start_date, end_date, field, dtype), build,
+                                        mimetype='application/octet-stream')
+        
+        if response is None:
+            return jsonify({"error": "No data found for the specified date range"}), 404
+        
+        return response
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+INVALID_DOWNSAMPLE_ERROR = f"points must be a positive integer and method one of {', '.join(DOWNSAMPLE_METHODS)}"
+
+def requested_downsampling():
+    """(points, method) from ``points``/``method``; points None keeps every day
+
+    Raises ValueError for a non-positive point count or unknown method.
+    """
+    points = request.args.get('points')
+    method = request.args.get('method', 'lttb')
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(method)
+    if points is None:
+        return None, method
+    points = int(points)
+    if points < 2:
+        raise ValueError(points)
+    return points, method
+
+def timeline_points(rows):
+    """Timeline JSON points from (date, predicted, percentage) rows"""
+    return [
+        {
+            "date": date,
+            "predicted_value": predicted_value,
+            "predicted_percentage": predicted_percentage
+        }
+        for date, predicted_value, predicted_percentage in rows
+    ]
+
 @app.route('/api/region/<townvill>')
-def get_region_timeline():
-    """Get prediction timeline for a specific region"""
+def get_region_timeline(townvill):
+    """Get prediction timeline for a specific region (optionally downsampled to ``points``)"""
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     
     try:
-        predictions = db.get_predictions_by_region(townvill, start_date, end_date)
+        points, method = requested_downsampling()
+    except ValueError:
+        return jsonify({"error": INVALID_DOWNSAMPLE_ERROR}), 400
+    
+    if requested_stream():
+        # Downsampling needs the whole series, so streamed timelines are always full
+        if points:
+            return jsonify({"error": "points cannot be combined with stream=1"}), 400
         
-        timeline_data = []
-        for row in predictions:
-            date, predicted_value, predicted_percentage = row
-            timeline_data.append({
-                "date": date,
-                "predicted_value": predicted_value,
-                "predicted_percentage": predicted_percentage
-            })
+        chunks = db.iter_predictions(start_date, end_date, townvill=townvill, chunk_size=STREAM_CHUNK_ROWS)
+        points_stream = iter_json_array(
+            point for rows in chunks for point in timeline_points((row[0], row[4], row[5]) for row in rows)
+        )
+        prefix = ('{"townvill":%s,"timeline":' % json.dumps(townvill, ensure_ascii=False)).encode('utf-8')
+        return streamed_response(itertools.chain([prefix], points_stream, [b'}']))
+    
+    try:
+        predictions = db.get_predictions_by_region(townvill, start_date, end_date)
         
         return jsonify({
             "townvill": townvill,
-            "timeline": timeline_data
+            "timeline": timeline_points(downsample_timeline(predictions, points, method))
         })
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/regions/timeline', methods=['GET', 'POST'])
+def get_regions_timeline():
+    """Timelines for many regions from one query, optionally downsampled for charting
+
+    Regions come from repeated or comma-separated ``townvill`` parameters, or a
+    POSTed JSON body ``{"townvill": [...]}`` for long lists. ``points`` caps each
+    timeline with LTTB (default) or ``method=minmax`` bucketing.
+    """
+    townvills = [
+        townvill
+        for value in request.args.getlist('townvill')
+        for townvill in value.split(',') if townvill
+    ]
+    if request.method == 'POST':
+        body = request.get_json(silent=True)
+        if isinstance(body, dict) and isinstance(body.get('townvill'), list):
+            townvills += [townvill for townvill in body['townvill'] if isinstance(townvill, str) and townvill]
+    townvills = sorted(set(townvills))
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    
+    if not townvills:
+        return jsonify({"error": "At least one townvill is required"}), 400
+    if len(townvills) > MAX_TIMELINE_REGIONS:
+        return jsonify({"error": f"At most {MAX_TIMELINE_REGIONS} regions per request"}), 400
+    try:
+        points, method = requested_downsampling()
+    except ValueError:
+        return jsonify({"error": INVALID_DOWNSAMPLE_ERROR}), 400
+    
+    def build():
+        by_region = {townvill: [] for townvill in townvills}
+        for townvill, *row in db.get_predictions_by_regions(townvills, start_date, end_date):
+            by_region[townvill].append(row)
+        
+        return json_bytes({
+            "start_date": start_date,
+            "end_date": end_date,
+            "points": points,
+            "method": method if points else None,
+            "timelines": {
+                townvill: timeline_points(downsample_timeline(rows, points, method))
+                for townvill, rows in by_region.items() if rows
+            },
+            "missing": [townvill for townvill, rows in by_region.items() if not rows]
+        })
+    
+    try:
+        return cached_json_response(
+            ('timelines', tuple(townvills), start_date, end_date, points, method), build
+        )
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/high-risk')
 def get_high_risk_regions():
-    """Get high-risk regions for a specific date"""
+    """Get high-risk regions for a specific date (``zoom``/``tolerance``/``format``/``bbox`` as in /api/data)"""
     selected_date = request.args.get('date')
     threshold = float(request.args.get('threshold', 50))
     
     if not selected_date:
         return jsonify({"error": "Missing date parameter"}), 400
+    try:
+        level = requested_geometry_level()
+    except ValueError:
+        return jsonify(INVALID_LEVEL_ERROR), 400
+    try:
+        output_format = requested_output_format()
+    except ValueError:
+        return jsonify(INVALID_FORMAT_ERROR), 400
+    try:
+        bbox = requested_bbox()
+    except ValueError:
+        return jsonify(INVALID_BBOX_ERROR), 400
+    
+    def build():
+        high_risk = db.get_high_risk_regions(selected_date, threshold, level, bbox)
+        
+        return region_features_payload(
+            ((townvill, {
+                "townvill": townvill,
+                "town": town,
+                "predicted_case_lag_future_14_percentage": predicted_percentage,
+                "risk_level": "high"
+            }, geometry_json)
+            for townvill, town, predicted_percentage, geometry_json in high_risk),
+            output_format, level
+        )
     
     try:
-        high_risk = db.get_high_risk_regions(selected_date, threshold)
+        return cached_json_response(('high-risk', selected_date, threshold, level, output_format, bbox), build)
         
-        features = []
-        for row in high_risk:
-            townvill, town, predicted_percentage, geometry_json = row
-            
-            feature = {
-                "type": "Feature",
-                "properties": {
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def encode_ranking_cursor(row):
+    """Opaque keyset cursor for the page after a ranked row: its (percentage, townvill)"""
+    return base64.urlsafe_b64encode(json_bytes([row[2], row[0]])).decode('ascii').rstrip('=')
+
+def decode_ranking_cursor(cursor):
+    """(percentage, townvill) from encode_ranking_cursor; raises ValueError if malformed"""
+    try:
+        percentage, townvill = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, TypeError, ValueError, UnicodeDecodeError):
+        raise ValueError(cursor)
+    if not isinstance(percentage, (int, float)) or not isinstance(townvill, str):
+        raise ValueError(cursor)
+    return percentage, townvill
+
+@app.route('/api/ranking')
+def get_ranking():
+    """Regions of a date ranked by predicted percentage, with keyset pagination
+
+    ``limit`` rows per page (default 50); pass the response's ``next_cursor``
+    as ``cursor`` for the next page. ``town`` and ``min_percentage`` filter.
+    """
+    date = request.args.get('date')
+    town = request.args.get('town') or None
+    
+    if not date:
+        return jsonify({"error": "Date parameter is required"}), 400
+    try:
+        limit = int(request.args.get('limit', 50))
+        min_percentage = request.args.get('min_percentage')
+        min_percentage = float(min_percentage) if min_percentage is not None else None
+        cursor = request.args.get('cursor')
+        after = decode_ranking_cursor(cursor) if cursor else None
+    except ValueError:
+        return jsonify({"error": "limit, min_percentage or cursor is malformed"}), 400
+    if not 1 <= limit <= MAX_RANKING_LIMIT:
+        return jsonify({"error": f"limit must be between 1 and {MAX_RANKING_LIMIT}"}), 400
+    
+    def build():
+        # One extra row tells whether another page follows
+        rows = db.get_ranked_regions(date, limit + 1, after, town, min_percentage)
+        page = rows[:limit]
+        return json_bytes({
+            "date": date,
+            "town": town,
+            "limit": limit,
+            "regions": [
+                {
                     "townvill": townvill,
-                    "town": town,
-                    "predicted_case_lag_future_14_percentage": predicted_percentage,
-                    "risk_level": "high"
-                },
-                "geometry": json.loads(geometry_json)
-            }
-            features.append(feature)
-        
-        geojson = {
-            "type": "FeatureCollection",
-            "features": features
-        }
-        
-        return jsonify(geojson)
+                    "town": region_town,
+                    "predicted_case_lag_future_14_percentage": percentage,
+                    "predicted_case_lag_future_14": predicted,
+                    "predicted_case_lag_future_14_binary": binary,
+                    "case_lag_future_14": actual
+                }
+                for townvill, region_town, percentage, predicted, binary, actual in page
+            ],
+            "next_cursor": encode_ranking_cursor(page[-1]) if len(rows) > limit else None
+        })
+    
+    try:
+        return cached_json_response(('ranking', date, limit, after, town, min_percentage), build)
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/export')
+def export_predictions():
+    """Bulk export of predictions as CSV, NDJSON or GeoJSON, streamed in chunks
+
+    ``start``/``end`` bound the dates (all dates when omitted) and
+    ``townvill`` limits it to one region. ``geometry=1`` adds polygons to CSV
+    and NDJSON; GeoJSON always has them.
+    """
+    start_date = request.args.get('start')
+    end_date = request.args.get('end')
+    export_format = request.args.get('format', 'csv')
+    townvill = request.args.get('townvill') or None
+    geometry = export_format == 'geojson' or request.args.get('geometry', '').lower() in ('1', 'true', 'yes')
+    
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    if bool(start_date) != bool(end_date) or any(
+            date and not DATE_PATTERN.match(date) for date in (start_date, end_date)):
+        return jsonify({"error": "start and end must both be given as YYYY-MM-DD"}), 400
+    
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    filename = f"predictions_{start_date or 'all'}_{end_date or 'all'}.{extension}"
+    chunks = db.iter_predictions(start_date, end_date, townvill=townvill, geometry=geometry,
+                                chunk_size=STREAM_CHUNK_ROWS)
+    return streamed_response(iter_export(chunks, export_format, geometry), mimetype,
+                             {'Content-Disposition': f'attachment; filename="{filename}"'})
+
 @app.route('/api/summary/<date>')
 def get_daily_summary(date):
     """Get daily summary statistics"""
-    try:
+    def build():
         summary = db.get_daily_summary(date)
         
         if not summary:
-            return jsonify({"error": "No summary data found for the specified date"}), 404
+            return None
         
         summary_data = {
             "date": summary[0],
@@ -163,17 +840,74 @@ def get_daily_summary(date):
             "low_risk_regions": summary[8]
         }
         
-        return jsonify(summary_data)
+        return json_bytes(summary_data)
+    
+    try:
+        response = cached_json_response(('summary', date), build)
+        
+        if response is None:
+            return jsonify({"error": "No summary data found for the specified date"}), 404
+        
+        return response
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/towns')
+def get_town_view():
+    """District (town) view of a date: rollups joined with dissolved district polygons
+    
+    Served from the import-time rollup and polygon tables, never from village
+    rows. ``zoom``/``tolerance`` select simplified polygons as in /api/data;
+    ``geometry=0`` omits them for clients that already hold the district layer.
+    """
+    selected_date = request.args.get('date')
+    geometry = request.args.get('geometry', '1').lower() not in ('0', 'false', 'no')
+    if not selected_date:
+        return jsonify({"error": "Missing date parameter"}), 400
+    try:
+        level = requested_geometry_level()
+    except ValueError:
+        return jsonify(INVALID_LEVEL_ERROR), 400
+    
+    def build():
+        summaries = db.get_town_summaries(selected_date)
+        if not summaries:
+            return None
+        
+        polygons = {row[0]: row[-1] for row in db.get_town_geometries(level)} if geometry else {}
+        return feature_collection_payload(
+            (dict({"date": selected_date, "town": row[0]}, **dict(zip(TOWN_SUMMARY_COLUMNS, row[1:]))),
+             polygons.get(row[0]))
+            for row in summaries
+        )
+    
+    try:
+        response = cached_json_response(('towns', selected_date, level, geometry), build)
+        
+        if response is None:
+            return jsonify({"error": "No data found for the specified date"}), 404
+        
+        return response
+    
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/cache-stats')
+def get_cache_stats():
+    """Hit/miss/eviction counters of the response and query caches (per worker process)"""
+    query_cache = getattr(db, 'query_cache', None)
+    return jsonify({
+        "dataset_version": db.get_dataset_version(),
+        "response_cache": response_cache.stats(),
+        "query_cache": query_cache.stats() if query_cache is not None else None
+    })
+
 @app.route('/api/stats')
 def get_database_stats():
     """Get overall database statistics"""
     try:
-        stats = db.get_database_stats()
-        return jsonify(stats)
+        return cached_json_response(('stats',), lambda: json_bytes(db.get_database_stats()))
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
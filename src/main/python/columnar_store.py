@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+Columnar (Parquet) storage backend for disease prediction data
+Writes a date-partitioned attribute dataset with geometry kept separately, and
+answers the same queries as DiseaseDataDatabase using column projection and
+partition pruning
+"""
+import json
+import shutil
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # Optional: only needed for the columnar backend
+    pa = None
+
+from database_manager import (DEFAULT_BATCH_SIZE, DEFAULT_CHANGE_TOLERANCE, EXPORT_COLUMNS, SERIES_FIELDS,
+                              TOWN_SUMMARY_COLUMNS, geometry_bbox, geometry_text, region_changed)
+from region_topology import pick_level
+from response_cache import (DEFAULT_QUERY_CACHE_BYTES, DEFAULT_QUERY_CACHE_ENTRIES, ResponseCache,
+                            cached_query, result_size)
+
+# Rows buffered per date before a partition file is written
+DEFAULT_ROWS_PER_FILE = 100000
+
+PREDICTION_COLUMNS = [
+    'date', 'townvill', 'town', 'county', 'case_lag_future_14',
+    'predicted_case_lag_future_14', 'predicted_case_lag_future_14_binary',
+    'predicted_case_lag_future_14_percentage', 'x_coord', 'y_coord', 'area'
+]
+
+REGION_COLUMNS = [
+    'townvill', 'code1', 'code2', 'town_id', 'town', 'county_id', 'county',
+    'x_coord', 'y_coord', 'area', 'min_x', 'min_y', 'max_x', 'max_y', 'geometry_json'
+]
+
+SUMMARY_COLUMNS = [
+    'date', 'total_regions', 'total_predicted_cases', 'avg_prediction',
+    'max_prediction', 'min_prediction', 'high_risk_regions',
+    'medium_risk_regions', 'low_risk_regions', 'created_at'
+]
+
+TOWN_COLUMNS = ['date', 'town'] + TOWN_SUMMARY_COLUMNS
+
+TOWN_GEOMETRY_COLUMNS = ['tolerance', 'town', 'county', 'total_regions', 'geometry_json']
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("The columnar backend requires the 'pyarrow' package")
+
+
+def _prediction_schema():
+    return pa.schema([
+        ('townvill', pa.string()),
+        ('town', pa.string()),
+        ('county', pa.string()),
+        ('case_lag_future_14', pa.int64()),
+        ('predicted_case_lag_future_14', pa.float64()),
+        ('predicted_case_lag_future_14_binary', pa.int64()),
+        ('predicted_case_lag_future_14_percentage', pa.float64()),
+        ('x_coord', pa.float64()),
+        ('y_coord', pa.float64()),
+        ('area', pa.float64()),
+    ])
+
+
+def _table_rows(table, columns):
+    """Rows of a pyarrow table as tuples in the given column order"""
+    return list(zip(*(table.column(name).to_pylist() for name in columns)))
+
+
+class ColumnarDatasetWriter:
+    """Write import output as a date-partitioned Parquet dataset
+
+    Layout under ``output_dir``::
+
+        predictions/date=YYYY-MM-DD/part-NNNNN.parquet   attributes only
+        region_info.parquet                              one geometry and bbox per region
+        region_levels.parquet                            simplified geometry per tolerance
+        daily_summary.parquet
+        town_summary.parquet                             district rollups per date
+        town_geometry.parquet                            dissolved district polygons per tolerance
+
+    A date's partition is replaced the first time the writer sees that date,
+    so incremental imports rewrite exactly the dates they re-ingest.
+    """
+
+    def __init__(self, output_dir, overwrite=False, rows_per_file=DEFAULT_ROWS_PER_FILE):
+        _require_pyarrow()
+        self.output_dir = Path(output_dir)
+        self.rows_per_file = rows_per_file
+        if overwrite and self.output_dir.exists():
+            shutil.rmtree(self.output_dir)
+        (self.output_dir / "predictions").mkdir(parents=True, exist_ok=True)
+
+        self.pending = defaultdict(list)
+        self.part_numbers = {}
+
+    def _partition_dir(self, date):
+        return self.output_dir / "predictions" / f"date={date}"
+
+    def _flush(self, date):
+        rows = self.pending.pop(date, None)
+        if not rows:
+            return
+        columns = list(zip(*rows))
+        table = pa.Table.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns[1:], _prediction_schema())],
+            schema=_prediction_schema()
+        )
+        part = self.part_numbers[date]
+        pq.write_table(table, self._partition_dir(date) / f"part-{part:05d}.parquet")
+        self.part_numbers[date] = part + 1
+
+    def add_predictions(self, prediction_records):
+        """Buffer predictions rows (PREDICTION_INSERT_SQL order; geometry is ignored)"""
+        for record in prediction_records:
+            date = record[0]
+            if date not in self.part_numbers:
+                partition = self._partition_dir(date)
+                if partition.exists():
+                    shutil.rmtree(partition)
+                partition.mkdir(parents=True)
+                self.part_numbers[date] = 0
+
+            self.pending[date].append(record[:11])
+            if len(self.pending[date]) >= self.rows_per_file:
+                self._flush(date)
+
+    def remove_date(self, date):
+        """Drop a date's partition (e.g. a date no longer present in its source file)"""
+        self.pending.pop(date, None)
+        partition = self._partition_dir(date)
+        if partition.exists():
+            shutil.rmtree(partition)
+
+    def _merge_table(self, filename, key, rows, columns):
+        """Rewrite a small keyed table, replacing existing rows with the same key"""
+        path = self.output_dir / filename
+        merged = {}
+        if path.exists():
+            for row in _table_rows(pq.read_table(path), columns):
+                merged[row[0]] = row
+        for row in rows:
+            merged[row[0]] = row
+
+        ordered = [merged[k] for k in sorted(merged)]
+        table = pa.Table.from_pydict({
+            name: [row[i] for row in ordered] for i, name in enumerate(columns)
+        })
+        pq.write_table(table, path)
+
+    def write_regions(self, region_records):
+        """Store region_info rows, with geometry as GeoJSON text and its bounding box"""
+        rows = []
+        for record in region_records:
+            text = geometry_text(record[-1])
+            bbox = geometry_bbox(json.loads(text)) if text else None
+            rows.append(record[:-1] + (bbox or (None,) * 4) + (text,))
+        self._merge_table("region_info.parquet", 'townvill', rows, REGION_COLUMNS)
+
+    def write_region_levels(self, levels):
+        """Store simplified geometry: {tolerance: {townvill: GeoJSON text}}"""
+        if not levels:
+            return
+        rows = [
+            (tolerance, townvill, text)
+            for tolerance, geometries in sorted(levels.items())
+            for townvill, text in sorted(geometries.items())
+        ]
+        pq.write_table(pa.Table.from_pydict({
+            'tolerance': [row[0] for row in rows],
+            'townvill': [row[1] for row in rows],
+            'geometry_json': [row[2] for row in rows]
+        }), self.output_dir / "region_levels.parquet")
+
+    def write_daily_summaries(self, summary_records):
+        created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        rows = [tuple(record) + (created_at,) for record in summary_records]
+        self._merge_table("daily_summary.parquet", 'date', rows, SUMMARY_COLUMNS)
+
+    def write_town_summaries(self, rows, dates=None):
+        """Replace the district rollups of ``dates`` (all of them by default) with ``rows``
+
+        Rows are in town_daily_summary column order.
+        """
+        path = self.output_dir / "town_summary.parquet"
+        kept = []
+        if dates is not None and path.exists():
+            kept = [row for row in _table_rows(pq.read_table(path), TOWN_COLUMNS) if row[0] not in dates]
+        ordered = sorted(kept + [tuple(row) for row in rows], key=lambda row: (row[0], row[1]))
+        pq.write_table(pa.Table.from_pydict({
+            name: [row[i] for row in ordered] for i, name in enumerate(TOWN_COLUMNS)
+        }), path)
+
+    def write_town_geometries(self, rows):
+        """Store dissolved district polygons: (tolerance, town, county, total_regions, GeoJSON text) rows"""
+        if rows is None:
+            return
+        pq.write_table(pa.Table.from_pydict({
+            name: [row[i] for row in rows] for i, name in enumerate(TOWN_GEOMETRY_COLUMNS)
+        }), self.output_dir / "town_geometry.parquet")
+
+    def close(self):
+        for date in list(self.pending):
+            self._flush(date)
+
+
+class ColumnarDiseaseData:
+    """Query backend over a ColumnarDatasetWriter dataset with the DiseaseDataDatabase method surface"""
+
+    def __init__(self, dataset_dir="output/columnar", query_cache_bytes=DEFAULT_QUERY_CACHE_BYTES,
+                 query_cache_entries=DEFAULT_QUERY_CACHE_ENTRIES, query_cache_ttl=None):
+        _require_pyarrow()
+        self.dataset_dir = Path(dataset_dir)
+        self._region_geometry_cache = None
+        self._region_geometry_version = None
+        self._simplified_geometry_cache = {}
+        self._simplification_levels = None
+        # Query results keyed by dataset version, as in DiseaseDataDatabase
+        self.query_cache = ResponseCache(
+            max_bytes=query_cache_bytes, max_entries=query_cache_entries,
+            ttl=query_cache_ttl, sizeof=result_size
+        ) if query_cache_bytes else None
+
+    def _partition_dir(self, date):
+        return self.dataset_dir / "predictions" / f"date={date}"
+
+    def _dataset(self):
+        return ds.dataset(self.dataset_dir / "predictions", format="parquet", partitioning="hive")
+
+    def _read_date(self, date, columns):
+        """Read one date's partition directly (partition pruning by path)"""
+        partition = self._partition_dir(date)
+        if not partition.exists():
+            return None
+        return ds.dataset(partition, format="parquet", schema=_prediction_schema()).to_table(columns=columns)
+
+    def _region_geometries(self, tolerance=None):
+        """townvill -> GeoJSON text, at full resolution or the simplified level a tolerance picks"""
+        version = self.get_dataset_version()
+        if self._region_geometry_cache is None or self._region_geometry_version != version:
+            self._region_geometry_version = version
+            table = pq.read_table(self.dataset_dir / "region_info.parquet", columns=['townvill', 'geometry_json'])
+            self._region_geometry_cache = dict(_table_rows(table, ['townvill', 'geometry_json']))
+            self._simplified_geometry_cache = {}
+
+        level = self.simplification_level(tolerance)
+        if level is None:
+            return self._region_geometry_cache
+        if level not in self._simplified_geometry_cache:
+            table = pq.read_table(self.dataset_dir / "region_levels.parquet",
+                                  columns=['townvill', 'geometry_json'], filters=[('tolerance', '=', level)])
+            self._simplified_geometry_cache[level] = dict(_table_rows(table, ['townvill', 'geometry_json']))
+        return self._simplified_geometry_cache[level]
+
+    def get_simplification_levels(self):
+        """Tolerances (degrees) of the precomputed simplified geometry levels"""
+        version = self.get_dataset_version()
+        if self._simplification_levels is None or self._simplification_levels[0] != version:
+            path = self.dataset_dir / "region_levels.parquet"
+            levels = []
+            if path.exists():
+                levels = sorted(set(pq.read_table(path, columns=['tolerance']).column('tolerance').to_pylist()))
+            self._simplification_levels = (version, levels)
+        return self._simplification_levels[1]
+
+    def simplification_level(self, tolerance):
+        """Stored level a requested tolerance resolves to, or None for full resolution"""
+        if tolerance is None:
+            return None
+        return pick_level(self.get_simplification_levels(), tolerance)
+
+    def _filter_bbox(self, table, bbox):
+        """Keep rows whose region bounding box intersects (min_x, min_y, max_x, max_y)"""
+        if not bbox:
+            return table
+        min_x, min_y, max_x, max_y = bbox
+        regions = pq.read_table(self.dataset_dir / "region_info.parquet", columns=['townvill'], filters=[
+            ('max_x', '>=', min_x), ('min_x', '<=', max_x), ('max_y', '>=', min_y), ('min_y', '<=', max_y)
+        ])
+        return table.filter(pc.is_in(table['townvill'], value_set=regions.column('townvill')))
+
+    def get_dataset_version(self):
+        """Version stamp of the current data: the summary table is rewritten by every import"""
+        summary_path = self.dataset_dir / "daily_summary.parquet"
+        return str(summary_path.stat().st_mtime_ns) if summary_path.exists() else '0'
+
+    @cached_query
+    def get_predictions_by_date(self, date, tolerance=None, bbox=None):
+        """Get all predictions for a specific date
+
+        ``tolerance`` (degrees) picks a precomputed simplified geometry level.
+        ``bbox`` (min_x, min_y, max_x, max_y) keeps only regions whose bounding
+        box intersects it.
+        """
+        columns = ['townvill', 'town', 'predicted_case_lag_future_14',
+                   'predicted_case_lag_future_14_percentage', 'predicted_case_lag_future_14_binary',
+                   'case_lag_future_14']
+        table = self._read_date(date, columns)
+        if table is None:
+            return []
+        table = self._filter_bbox(table, bbox)
+        table = table.sort_by([('predicted_case_lag_future_14_percentage', 'descending')])
+
+        geometries = self._region_geometries(tolerance)
+        return [
+            (date,) + row + (geometries.get(row[0]),)
+            for row in _table_rows(table, columns)
+        ]
+
+    @cached_query
+    def get_predictions_by_region(self, townvill, start_date=None, end_date=None):
+        """Get predictions for a specific region with optional date range"""
+        condition = ds.field('townvill') == townvill
+        if start_date and end_date:
+            # Filters on the partition key prune whole date directories
+            condition = condition & (ds.field('date') >= start_date) & (ds.field('date') <= end_date)
+
+        columns = ['date', 'predicted_case_lag_future_14', 'predicted_case_lag_future_14_percentage']
+        table = self._dataset().to_table(columns=columns, filter=condition)
+        table = table.sort_by([('date', 'ascending')])
+        return _table_rows(table, columns)
+
+    @cached_query
+    def get_predictions_by_regions(self, townvills, start_date=None, end_date=None):
+        """Get timelines for many regions in one scan: (townvill, date, predicted, percentage) rows"""
+        condition = ds.field('townvill').isin(list(townvills))
+        if start_date and end_date:
+            condition = condition & (ds.field('date') >= start_date) & (ds.field('date') <= end_date)
+
+        columns = ['townvill', 'date', 'predicted_case_lag_future_14', 'predicted_case_lag_future_14_percentage']
+        table = self._dataset().to_table(columns=columns, filter=condition)
+        table = table.sort_by([('townvill', 'ascending'), ('date', 'ascending')])
+        return [
+            (townvill, str(date), predicted, percentage)
+            for townvill, date, predicted, percentage in _table_rows(table, columns)
+        ]
+
+    def iter_predictions(self, start_date=None, end_date=None, townvill=None, geometry=False,
+                         tolerance=None, bbox=None, chunk_size=DEFAULT_BATCH_SIZE):
+        """Yield prediction rows in chunks (see DiseaseDataDatabase.iter_predictions)
+
+        Partitions are read one date at a time, so memory holds a single day.
+        """
+        columns = [column for column in EXPORT_COLUMNS if column != 'date']
+        geometries = self._region_geometries(tolerance) if geometry else None
+        for date in self.get_available_dates():
+            if start_date and end_date and not start_date <= date <= end_date:
+                continue
+            table = self._read_date(date, columns)
+            if townvill:
+                table = table.filter(pc.equal(table['townvill'], townvill))
+            table = self._filter_bbox(table, bbox).sort_by([('townvill', 'ascending')])
+
+            for offset in range(0, table.num_rows, chunk_size):
+                rows = _table_rows(table.slice(offset, chunk_size), columns)
+                if geometry:
+                    yield [(date,) + row + (geometries.get(row[0]),) for row in rows]
+                else:
+                    yield [(date,) + row for row in rows]
+
+    @cached_query
+    def get_series(self, start_date, end_date, field='percentage'):
+        """Dense date x region matrix of one attribute (see DiseaseDataDatabase.get_series)"""
+        column = SERIES_FIELDS[field]
+        condition = (ds.field('date') >= start_date) & (ds.field('date') <= end_date)
+        table = self._dataset().to_table(columns=['date', 'townvill', column], filter=condition)
+
+        values = defaultdict(dict)
+        for date, townvill, value in _table_rows(table, ['date', 'townvill', column]):
+            values[str(date)][townvill] = value
+
+        dates = sorted(values)
+        townvills = sorted({townvill for by_region in values.values() for townvill in by_region})
+        rows = [[values[date].get(townvill) for townvill in townvills] for date in dates]
+        return dates, townvills, rows
+
+    @cached_query
+    def get_high_risk_regions(self, date, threshold=50, tolerance=None, bbox=None):
+        """Get high-risk regions for a specific date (``tolerance``/``bbox`` as in get_predictions_by_date)"""
+        columns = ['townvill', 'town', 'predicted_case_lag_future_14_percentage']
+        table = self._read_date(date, columns)
+        if table is None:
+            return []
+        table = table.filter(pc.greater_equal(table['predicted_case_lag_future_14_percentage'], threshold))
+        table = self._filter_bbox(table, bbox)
+        table = table.sort_by([('predicted_case_lag_future_14_percentage', 'descending')])
+
+        geometries = self._region_geometries(tolerance)
+        return [row + (geometries.get(row[0]),) for row in _table_rows(table, columns)]
+
+    @cached_query
+    def get_ranked_regions(self, date, limit=50, after=None, town=None, min_percentage=None):
+        """Regions of a date ranked by percentage (see DiseaseDataDatabase.get_ranked_regions)"""
+        columns = ['townvill', 'town', 'predicted_case_lag_future_14_percentage',
+                   'predicted_case_lag_future_14', 'predicted_case_lag_future_14_binary',
+                   'case_lag_future_14']
+        table = self._read_date(date, columns)
+        if table is None:
+            return []
+        percentage = table['predicted_case_lag_future_14_percentage']
+        condition = pc.is_valid(percentage)
+        if min_percentage is not None:
+            condition = pc.and_(condition, pc.greater_equal(percentage, min_percentage))
+        if after is not None:
+            condition = pc.and_(condition, pc.or_(
+                pc.less(percentage, after[0]),
+                pc.and_(pc.equal(percentage, after[0]), pc.greater(table['townvill'], after[1]))
+            ))
+        if town is not None:
+            condition = pc.and_(condition, pc.equal(table['town'], town))
+        table = table.filter(condition).sort_by([
+            ('predicted_case_lag_future_14_percentage', 'descending'), ('townvill', 'ascending')
+        ])
+        return _table_rows(table.slice(0, limit), columns)
+
+    @cached_query
+    def get_region_geometries(self, tolerance=None, bbox=None):
+        """Get the static region layer: (townvill, town, geometry_json) for every region (or those in ``bbox``)"""
+        table = pq.read_table(self.dataset_dir / "region_info.parquet", columns=['townvill', 'town'])
+        table = self._filter_bbox(table, bbox)
+        geometries = self._region_geometries(tolerance)
+        return [
+            row + (geometries.get(row[0]),)
+            for row in _table_rows(table.sort_by([('townvill', 'ascending')]), ['townvill', 'town'])
+        ]
+
+    @cached_query
+    def get_region_attributes_by_date(self, date, bbox=None):
+        """Get per-region prediction attributes for a date, without geometry"""
+        columns = ['townvill', 'predicted_case_lag_future_14', 'predicted_case_lag_future_14_percentage',
+                   'predicted_case_lag_future_14_binary', 'case_lag_future_14']
+        table = self._read_date(date, columns)
+        if table is None:
+            return []
+        table = self._filter_bbox(table, bbox)
+        return _table_rows(table.sort_by([('townvill', 'ascending')]), columns)
+
+    @cached_query
+    def get_region_changes(self, from_date, to_date, tolerance=DEFAULT_CHANGE_TOLERANCE):
+        """Regions whose prediction changed between two dates (see DiseaseDataDatabase.get_region_changes)
+
+        Compares the two date partitions directly; results are kept in the query cache.
+        """
+        columns = ['townvill', 'predicted_case_lag_future_14', 'predicted_case_lag_future_14_percentage',
+                   'predicted_case_lag_future_14_binary', 'case_lag_future_14']
+        before, after = (
+            {row[0]: row[1:] for row in _table_rows(table, columns)} if table is not None else {}
+            for table in (self._read_date(from_date, columns), self._read_date(to_date, columns))
+        )
+        return [
+            (townvill,) + after.get(townvill, (None,) * 4)
+            for townvill in sorted(set(before) | set(after))
+            if region_changed(before.get(townvill), after.get(townvill), tolerance)
+        ]
+
+    @cached_query
+    def get_daily_summary(self, date):
+        """Get daily summary statistics"""
+        table = pq.read_table(self.dataset_dir / "daily_summary.parquet",
+                              filters=[('date', '=', date)])
+        rows = _table_rows(table, SUMMARY_COLUMNS)
+        return rows[0] if rows else None
+
+    @cached_query
+    def get_town_summaries(self, date):
+        """District rollups of a date (see DiseaseDataDatabase.get_town_summaries)"""
+        path = self.dataset_dir / "town_summary.parquet"
+        if not path.exists():
+            return []
+        table = pq.read_table(path, columns=TOWN_COLUMNS[1:], filters=[('date', '=', date)])
+        return _table_rows(table.sort_by([('town', 'ascending')]), TOWN_COLUMNS[1:])
+
+    @cached_query
+    def get_town_geometries(self, tolerance=None):
+        """Dissolved district polygons (see DiseaseDataDatabase.get_town_geometries)"""
+        path = self.dataset_dir / "town_geometry.parquet"
+        if not path.exists():
+            return []
+        level = self.simplification_level(tolerance)
+        table = pq.read_table(path, columns=TOWN_GEOMETRY_COLUMNS[1:],
+                              filters=[('tolerance', '=', level or 0.0)])
+        return _table_rows(table.sort_by([('town', 'ascending')]), TOWN_GEOMETRY_COLUMNS[1:])
+
+    @cached_query
+    def get_available_dates(self):
+        """Get all available dates (one partition directory per date)"""
+        return sorted(
+            path.name.split('=', 1)[1]
+            for path in (self.dataset_dir / "predictions").glob("date=*")
+            if path.is_dir()
+        )
+
+    @cached_query
+    def get_database_stats(self):
+        """Get dataset statistics from Parquet footers and the region table"""
+        dates = self.get_available_dates()
+        total_predictions = sum(
+            pq.ParquetFile(path).metadata.num_rows
+            for path in (self.dataset_dir / "predictions").glob("date=*/*.parquet")
+        )
+        return {
+            'total_predictions': total_predictions,
+            'total_dates': len(dates),
+            'total_regions': len(self._region_geometries()),
+            'date_range': (dates[0], dates[-1]) if dates else (None, None)
+        }
+
+    def close(self):
+        """Nothing is held open; present for interface parity"""
+        self._region_geometry_cache = None
+        if self.query_cache is not None:
+            self.query_cache.clear()
@@ -6,9 +6,78 @@ import json
 import sqlite3
 from pathlib import Path
 from datetime import datetime
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 import os
 
+from database_manager import DEFAULT_BATCH_SIZE, DailyAggregate, feature_to_records, iter_geojson_features
+
+# Per-date output files kept open at once by the single-pass pipeline
+MAX_OPEN_DATE_FILES = 64
+
+
+class DateFileWriter:
+    """Append features to per-date FeatureCollection files with a bounded number of open handles"""
+    
+    def __init__(self, output_dir, max_open=MAX_OPEN_DATE_FILES):
+        self.output_dir = Path(output_dir)
+        self.max_open = max_open
+        self.open_files = OrderedDict()  # date -> file handle, least recently used first
+        self.feature_counts = defaultdict(int)
+    
+    def path_for(self, date):
+        date_str = date.replace('-', '')
+        return self.output_dir / f"{date_str}_predictions.geojson"
+    
+    def _handle(self, date):
+        f = self.open_files.get(date)
+        if f is not None:
+            self.open_files.move_to_end(date)
+            return f
+        
+        if len(self.open_files) >= self.max_open:
+            _, oldest = self.open_files.popitem(last=False)
+            oldest.close()
+        
+        if self.feature_counts[date] == 0:
+            f = open(self.path_for(date), 'w', encoding='utf-8')
+            f.write('{"type": "FeatureCollection", "features": [')
+        else:
+            f = open(self.path_for(date), 'a', encoding='utf-8')
+        self.open_files[date] = f
+        return f
+    
+    def write(self, date, feature):
+        f = self._handle(date)
+        if self.feature_counts[date]:
+            f.write(', ')
+        json.dump(feature, f, ensure_ascii=False)
+        self.feature_counts[date] += 1
+    
+    def close(self):
+        """Close every file with the FeatureCollection terminator"""
+        for f in self.open_files.values():
+            f.close()
+        self.open_files.clear()
+        for date in self.feature_counts:
+            with open(self.path_for(date), 'a', encoding='utf-8') as f:
+                f.write(']}')
+
+# Inserts for the schema built by create_database (not database_manager's, whose
+# column order and daily_summary columns differ)
+PROCESSOR_PREDICTION_INSERT_SQL = '''
+    INSERT INTO predictions 
+    (date, townvill, town, county, case_lag_future_14, 
+     predicted_case_lag_future_14, predicted_case_lag_future_14_binary,
+     predicted_case_lag_future_14_percentage, geometry_json, x_coord, y_coord, area)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+PROCESSOR_SUMMARY_INSERT_SQL = '''
+    INSERT INTO daily_summary (date, total_regions, avg_prediction, max_prediction, high_risk_regions)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+
 class DiseaseDataProcessor:
     def __init__(self, geojson_path, output_dir="output"):
         self.geojson_path = Path(geojson_path)
@@ -19,6 +88,25 @@ class DiseaseDataProcessor:
         (self.output_dir / "geojson_by_date").mkdir(exist_ok=True)
         (self.output_dir / "database").mkdir(exist_ok=True)
     
+    @staticmethod
+    def _prediction_record(feature):
+        """Row for the predictions table from one GeoJSON feature"""
+        props = feature['properties']
+        return (
+            props['date'],
+            props['townvill'],
+            props['TOWN'],
+            props['COUNTY'],
+            props.get('case_lag_future_14', 0),
+            props['predicted_case_lag_future_14'],
+            props['predicted_case_lag_future_14_binary'],
+            props['predicted_case_lag_future_14_percentage'],
+            json.dumps(feature['geometry']),
+            props['X'],
+            props['Y'],
+            props['AREA']
+        )
+    
     def split_geojson_by_date(self):
         """Split GeoJSON file by date into separate files"""
         print("Loading GeoJSON data...")
@@ -128,23 +216,7 @@ class DiseaseDataProcessor:
         
         for feature in data['features']:
             props = feature['properties']
-            geom_json = json.dumps(feature['geometry'])
-            
-            record = (
-                props['date'],
-                props['townvill'],
-                props['TOWN'],
-                props['COUNTY'],
-                props.get('case_lag_future_14', 0),
-                props['predicted_case_lag_future_14'],
-                props['predicted_case_lag_future_14_binary'],
-                props['predicted_case_lag_future_14_percentage'],
-                geom_json,
-                props['X'],
-                props['Y'],
-                props['AREA']
-            )
-            records.append(record)
+            records.append(self._prediction_record(feature))
             
             # Calculate daily statistics
             date = props['date']
@@ -155,13 +227,7 @@ class DiseaseDataProcessor:
                 daily_stats[date]['high_risk'] += 1
         
         # Batch insert predictions
-        cursor.executemany('''
-            INSERT INTO predictions 
-            (date, townvill, town, county, case_lag_future_14, 
-             predicted_case_lag_future_14, predicted_case_lag_future_14_binary,
-             predicted_case_lag_future_14_percentage, geometry_json, x_coord, y_coord, area)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', records)
+        cursor.executemany(PROCESSOR_PREDICTION_INSERT_SQL, records)
         
         # Insert daily summaries
         summary_records = []
@@ -175,10 +241,7 @@ class DiseaseDataProcessor:
                 stats['high_risk']
             ))
         
-        cursor.executemany('''
-            INSERT INTO daily_summary (date, total_regions, avg_prediction, max_prediction, high_risk_regions)
-            VALUES (?, ?, ?, ?, ?)
-        ''', summary_records)
+        cursor.executemany(PROCESSOR_SUMMARY_INSERT_SQL, summary_records)
         
         conn.commit()
         conn.close()
@@ -186,18 +249,107 @@ class DiseaseDataProcessor:
         print(f"Imported {len(records)} prediction records")
         print(f"Created {len(summary_records)} daily summaries")
     
-    def process_all(self):
-        """Run complete data processing pipeline"""
-        print("Starting data processing pipeline...")
+    def split_and_import(self, batch_size=DEFAULT_BATCH_SIZE, columnar_dir=None):
+        """Split by date and import to the database in a single streaming pass
+
+        The source is read once; each feature goes to its per-date file and to
+        a batched insert, and daily summaries are accumulated on the fly.
+        Expects the database created by ``create_database``. With
+        ``columnar_dir`` a date-partitioned Parquet dataset is written as well.
+        """
+        db_path = self.output_dir / "database" / "disease_predictions.db"
+        writer = DateFileWriter(self.output_dir / "geojson_by_date")
         
-        # Step 1: Split by date
-        dates = self.split_geojson_by_date()
+        columnar = None
+        region_records = {}
+        if columnar_dir is not None:
+            from columnar_store import ColumnarDatasetWriter
+            columnar = ColumnarDatasetWriter(columnar_dir, overwrite=True)
         
-        # Step 2: Create database
-        db_path = self.create_database()
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        
+        print("Streaming GeoJSON data (single pass)...")
+        batch = []
+        total_records = 0
+        daily_stats = defaultdict(DailyAggregate)
+        high_risk = defaultdict(int)
+        
+        try:
+            for feature in iter_geojson_features(self.geojson_path):
+                record = self._prediction_record(feature)
+                date = record[0]
+                
+                writer.write(date, feature)
+                batch.append(record)
+                if columnar is not None:
+                    # Reuse the geometry text already serialized for the SQLite row
+                    prediction_record, region_record = feature_to_records(
+                        feature, self.geojson_path, geometry_encoder=lambda _: record[8])
+                    columnar.add_predictions([prediction_record])
+                    region_records.setdefault(region_record[0], region_record)
+                
+                daily_stats[date].add(record[5], record[7])
+                if record[6] == 1:
+                    high_risk[date] += 1
+                
+                if len(batch) >= batch_size:
+                    cursor.executemany(PROCESSOR_PREDICTION_INSERT_SQL, batch)
+                    total_records += len(batch)
+                    batch = []
+        finally:
+            writer.close()
+        
+        cursor.executemany(PROCESSOR_PREDICTION_INSERT_SQL, batch)
+        total_records += len(batch)
+        
+        summary_records = [
+            (date, stats.count, stats.total / stats.count, stats.max_value, high_risk[date])
+            for date, stats in daily_stats.items()
+        ]
+        cursor.executemany(PROCESSOR_SUMMARY_INSERT_SQL, summary_records)
+        
+        conn.commit()
+        conn.close()
+        
+        if columnar is not None:
+            columnar.write_regions(region_records.values())
+            columnar.write_daily_summaries(
+                [stats.summary_record(date) for date, stats in daily_stats.items()]
+            )
+            columnar.close()
+            print(f"Columnar dataset written to {columnar_dir}")
+        
+        for date, count in writer.feature_counts.items():
+            print(f"Saved {count} features for {date} to {writer.path_for(date).name}")
+        print(f"Imported {total_records} prediction records")
+        print(f"Created {len(summary_records)} daily summaries")
+        
+        return list(daily_stats.keys())
+    
+    def process_all(self, single_pass=True):
+        """Run complete data processing pipeline
+
+        By default the source is read once (``split_and_import``); pass
+        ``single_pass=False`` for the original split-then-import steps.
+        """
+        print("Starting data processing pipeline...")
         
-        # Step 3: Import data
-        self.import_data_to_database()
+        if single_pass:
+            # Step 1: Create database
+            db_path = self.create_database()
+            
+            # Step 2: Split by date and import data in one pass
+            dates = self.split_and_import()
+        else:
+            # Step 1: Split by date
+            dates = self.split_geojson_by_date()
+            
+            # Step 2: Create database
+            db_path = self.create_database()
+            
+            # Step 3: Import data
+            self.import_data_to_database()
         
         print("\nData processing complete!")
         print(f"- Split into {len(dates)} date files")
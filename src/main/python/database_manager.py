@@ -4,31 +4,958 @@ SQLite Database Manager for Disease Prediction Data
 Handles import from multiple GeoJSON files and provides fast query interface
 """
 import sqlite3
+import hashlib
+import io
 import json
+import re
+import sys
+import threading
+import time
+import zlib
+from functools import partial
+from itertools import accumulate
 from pathlib import Path
 from datetime import datetime
 import glob
-from collections import defaultdict
+from array import array
+from collections import defaultdict, deque
+import multiprocessing
+import pickle
+import queue
 import os
 
+from region_topology import SIMPLIFY_TOLERANCES, RegionTopology, pick_level
+from response_cache import (DEFAULT_QUERY_CACHE_BYTES, DEFAULT_QUERY_CACHE_ENTRIES, ResponseCache,
+                            cached_query, result_size)
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+try:
+    import zstandard
+except ImportError:  # Optional: only needed for zstd-compressed geometry
+    zstandard = None
+
+# Rows buffered before each executemany in streaming imports
+DEFAULT_BATCH_SIZE = 5000
+
+# Characters read per chunk by the incremental GeoJSON parser
+STREAM_CHUNK_SIZE = 1 << 20
+
+# Parsed batches a parser process may queue ahead of the writer in streaming parallel imports
+STREAM_QUEUE_BATCHES = 2
+
+# Read connection pragmas: page cache (KiB) and memory-mapped I/O (bytes)
+DEFAULT_CACHE_SIZE_KIB = 64 * 1024
+DEFAULT_MMAP_SIZE = 256 * 1024 * 1024
+
+# Values of the 'geometry_storage' metadata key
+GEOMETRY_INLINE = 'inline'
+GEOMETRY_NORMALIZED = 'normalized'
+
+# Values of the 'geometry_encoding' metadata key
+GEOMETRY_ENCODING_JSON = 'json'
+GEOMETRY_ENCODING_QUANTIZED = 'quantized'
+
+# Decimal places kept by the quantized geometry codec (~0.1 m in degrees)
+DEFAULT_GEOMETRY_PRECISION = 6
+
+_FEATURES_ARRAY_RE = re.compile(r'"features"\s*:\s*\[')
+_SEPARATORS_RE = re.compile(r'[\s,]*')
+
+PREDICTION_INSERT_SQL = '''
+    INSERT INTO predictions 
+    (date, townvill, town, county, case_lag_future_14, 
+     predicted_case_lag_future_14, predicted_case_lag_future_14_binary,
+     predicted_case_lag_future_14_percentage, x_coord, y_coord, area, geometry_json)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+REGION_INSERT_SQL = '''
+    INSERT OR REPLACE INTO region_info 
+    (townvill, code1, code2, town_id, town, county_id, county, 
+     x_coord, y_coord, area, geometry_json)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+SUMMARY_INSERT_SQL = '''
+    INSERT OR REPLACE INTO daily_summary 
+    (date, total_regions, total_predicted_cases, avg_prediction, 
+     max_prediction, min_prediction, high_risk_regions, 
+     medium_risk_regions, low_risk_regions)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+MANIFEST_UPSERT_SQL = '''
+    INSERT OR REPLACE INTO import_manifest
+    (path, size, mtime_ns, content_hash, dates, row_count)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+# (name, columns) of every index on predictions
+PREDICTION_INDEXES = [
+    ('idx_predictions_date', 'date'),
+    ('idx_predictions_town', 'town'),
+    ('idx_predictions_townvill', 'townvill'),
+    ('idx_predictions_date_town', 'date, town'),
+    ('idx_predictions_date_townvill', 'date, townvill'),
+    ('idx_predictions_binary', 'predicted_case_lag_future_14_binary'),
+    ('idx_predictions_percentage', 'predicted_case_lag_future_14_percentage'),
+    # Ranking: rows come out of the index already in ORDER BY order, so LIMIT stops early;
+    # the trailing columns make it covering, so no row is looked up in the table. A town
+    # filter is checked against the covered town column while walking the same index,
+    # which is cheap (one date's regions at most) and avoids a second 7-column index.
+    ('idx_predictions_rank', 'date, predicted_case_lag_future_14_percentage DESC, townvill, '
+                             'town, predicted_case_lag_future_14, predicted_case_lag_future_14_binary, '
+                             'case_lag_future_14'),
+]
+
+# Indexes replaced by the ones above; dropped when indexes are (re)created
+OBSOLETE_INDEXES = ['idx_predictions_date_rank', 'idx_predictions_date_town_rank',
+                    'idx_predictions_town_rank']
+
+# Attributes available as date x region series (short name -> predictions column)
+SERIES_FIELDS = {
+    'percentage': 'predicted_case_lag_future_14_percentage',
+    'predicted': 'predicted_case_lag_future_14',
+    'binary': 'predicted_case_lag_future_14_binary',
+    'actual': 'case_lag_future_14',
+}
+
+# Prediction columns of an export row, in order (geometry optionally follows)
+EXPORT_COLUMNS = [
+    'date', 'townvill', 'town', 'county', 'predicted_case_lag_future_14',
+    'predicted_case_lag_future_14_percentage', 'predicted_case_lag_future_14_binary',
+    'case_lag_future_14'
+]
+
+# Per-(date, town) rollup of predictions rows, in town_daily_summary column
+# order; callers append the WHERE clause and GROUP BY date, town
+TOWN_ROLLUP_SELECT = '''
+    SELECT date, town, MIN(county), COUNT(*),
+           SUM(predicted_case_lag_future_14), AVG(predicted_case_lag_future_14),
+           MAX(predicted_case_lag_future_14),
+           AVG(predicted_case_lag_future_14_percentage), MAX(predicted_case_lag_future_14_percentage),
+           SUM(predicted_case_lag_future_14_binary = 1), SUM(case_lag_future_14),
+           SUM(predicted_case_lag_future_14_percentage >= 50),
+           SUM(predicted_case_lag_future_14_percentage >= 20 AND predicted_case_lag_future_14_percentage < 50),
+           SUM(predicted_case_lag_future_14_percentage < 20)
+    FROM predictions
+'''
+
+# town_daily_summary columns after (date, town) returned by get_town_summaries
+TOWN_SUMMARY_COLUMNS = [
+    'county', 'total_regions', 'total_predicted_cases', 'avg_prediction', 'max_prediction',
+    'avg_percentage', 'max_percentage', 'positive_regions', 'actual_cases',
+    'high_risk_regions', 'medium_risk_regions', 'low_risk_regions'
+]
+
+# Percentage points a region may move between two dates without counting as changed
+DEFAULT_CHANGE_TOLERANCE = 1.0
+
+# Regions that changed between :from_date and :to_date, as (townvill,
+# predicted, percentage, binary, actual) on :to_date; regions gone on
+# :to_date come back with NULL values (see get_region_changes)
+REGION_CHANGES_SQL = '''
+    SELECT t.townvill, t.predicted_case_lag_future_14, t.predicted_case_lag_future_14_percentage,
+           t.predicted_case_lag_future_14_binary, t.case_lag_future_14
+    FROM predictions AS t
+    LEFT JOIN predictions AS f ON f.date = :from_date AND f.townvill = t.townvill
+    WHERE t.date = :to_date AND (
+        f.townvill IS NULL
+        OR f.predicted_case_lag_future_14_binary IS NOT t.predicted_case_lag_future_14_binary
+        OR f.case_lag_future_14 IS NOT t.case_lag_future_14
+        OR (f.predicted_case_lag_future_14_percentage >= 50) != (t.predicted_case_lag_future_14_percentage >= 50)
+        OR (f.predicted_case_lag_future_14_percentage >= 20) != (t.predicted_case_lag_future_14_percentage >= 20)
+        OR ABS(t.predicted_case_lag_future_14_percentage - f.predicted_case_lag_future_14_percentage) > :tolerance)
+    UNION ALL
+    SELECT f.townvill, NULL, NULL, NULL, NULL
+    FROM predictions AS f
+    WHERE f.date = :from_date AND NOT EXISTS (
+        SELECT 1 FROM predictions AS t WHERE t.date = :to_date AND t.townvill = f.townvill)
+'''
+
+# Restricts a query on townvill to regions whose bounding box intersects a
+# bbox; parameters come from bbox_params()
+BBOX_FILTER_SQL = '''townvill IN (
+                SELECT region_info.townvill FROM region_rtree
+                JOIN region_info ON region_info.rowid = region_rtree.id
+                WHERE region_rtree.max_x >= ? AND region_rtree.min_x <= ?
+                  AND region_rtree.max_y >= ? AND region_rtree.min_y <= ?)'''
+
+
+# ---------------------------------------------------------------------------
+# Compact geometry codec
+#
+# Layout: b'GQ' | compression (1 byte) | precision (1 byte) | payload
+# The payload is a little-endian int32 array: geometry type code, the number
+# of nesting counts, the counts themselves (pre-order), then the x/y deltas of
+# every vertex quantized to ``precision`` decimals. Decoding runs mostly in C
+# (array.frombytes, itertools.accumulate).
+# ---------------------------------------------------------------------------
+
+_GEOMETRY_TYPES = ['Point', 'MultiPoint', 'LineString', 'MultiLineString', 'Polygon', 'MultiPolygon']
+_GEOMETRY_DEPTHS = [0, 1, 1, 2, 2, 3]
+_CODEC_MAGIC = b'GQ'
+_COMPRESSIONS = ['none', 'zlib', 'zstd']
+
+# Quantized lon/lat must fit in int32
+MAX_GEOMETRY_PRECISION = 7
+
+
+def _compress(payload, compression):
+    if compression == 'zlib':
+        return zlib.compress(payload, 9)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+        return zstandard.ZstdCompressor(level=19).compress(payload)
+    return payload
+
+
+def _decompress(payload, compression):
+    if compression == 'zlib':
+        return zlib.decompress(payload)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+        return zstandard.ZstdDecompressor().decompress(payload)
+    return payload
+
+
+def encode_geometry(geometry, precision=DEFAULT_GEOMETRY_PRECISION, compression='zlib'):
+    """Encode a GeoJSON geometry dict as quantized, delta-encoded integers"""
+    if geometry['type'] not in _GEOMETRY_TYPES:
+        raise ValueError(f"Unsupported geometry type for encoding: {geometry['type']}")
+    if compression not in _COMPRESSIONS:
+        raise ValueError(f"Unknown geometry compression: {compression}")
+    if not 0 <= precision <= MAX_GEOMETRY_PRECISION:
+        raise ValueError(f"Geometry precision must be between 0 and {MAX_GEOMETRY_PRECISION}")
+    
+    type_code = _GEOMETRY_TYPES.index(geometry['type'])
+    scale = 10 ** precision
+    counts = []
+    xs = []
+    ys = []
+    
+    def collect(coordinates, depth):
+        if depth == 0:
+            # Only x/y are kept; any z value is dropped
+            xs.append(round(coordinates[0] * scale))
+            ys.append(round(coordinates[1] * scale))
+            return
+        counts.append(len(coordinates))
+        for child in coordinates:
+            collect(child, depth - 1)
+    
+    collect(geometry['coordinates'], _GEOMETRY_DEPTHS[type_code])
+    
+    values = array('i', [type_code, len(counts)])
+    values.extend(counts)
+    previous_x = previous_y = 0
+    for x, y in zip(xs, ys):
+        values.append(x - previous_x)
+        values.append(y - previous_y)
+        previous_x, previous_y = x, y
+    if sys.byteorder == 'big':
+        values.byteswap()
+    
+    header = _CODEC_MAGIC + bytes([_COMPRESSIONS.index(compression), precision])
+    return header + _compress(values.tobytes(), compression)
+
+
+def _decode_encoded(blob, make_point, make_list):
+    """Rebuild (type name, coordinates) of an encoded geometry with the given builders"""
+    if blob[:2] != _CODEC_MAGIC:
+        raise ValueError("Not an encoded geometry")
+    values = array('i')
+    values.frombytes(_decompress(blob[4:], _COMPRESSIONS[blob[2]]))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    values = values.tolist()
+    
+    scale = 10 ** blob[3]
+    type_code, count_total = values[0], values[1]
+    counts = iter(values[2:2 + count_total])
+    start = 2 + count_total
+    points = list(map(make_point,
+                      (x / scale for x in accumulate(values[start::2])),
+                      (y / scale for y in accumulate(values[start + 1::2]))))
+    
+    position = 0
+    
+    def build(depth):
+        nonlocal position
+        count = next(counts)
+        if depth == 1:
+            position += count
+            return make_list(points[position - count:position])
+        return make_list([build(depth - 1) for _ in range(count)])
+    
+    depth = _GEOMETRY_DEPTHS[type_code]
+    coordinates = points[0] if depth == 0 else build(depth)
+    return _GEOMETRY_TYPES[type_code], coordinates
+
+
+def decode_geometry(blob):
+    """Decode an encoded geometry back to a GeoJSON geometry dict"""
+    geometry_type, coordinates = _decode_encoded(blob, lambda x, y: [x, y], list)
+    return {'type': geometry_type, 'coordinates': coordinates}
+
+
+def decode_geometry_json(blob):
+    """Decode an encoded geometry straight to compact GeoJSON text (no intermediate dicts)"""
+    geometry_type, coordinates = _decode_encoded(blob, '[{!r},{!r}]'.format,
+                                                 lambda items: '[' + ','.join(items) + ']')
+    return f'{{"type":"{geometry_type}","coordinates":{coordinates}}}'
+
+
+def geometry_text(stored):
+    """GeoJSON text for a stored geometry value, whether JSON text or an encoded BLOB"""
+    if isinstance(stored, bytes):
+        return decode_geometry_json(stored)
+    return stored
+
+
+def geometry_bbox(geometry):
+    """(min_x, min_y, max_x, max_y) of a GeoJSON geometry dict, or None if it has no coordinates"""
+    xs, ys = [], []
+    
+    def collect(coordinates):
+        if coordinates and isinstance(coordinates[0], (int, float)):
+            xs.append(coordinates[0])
+            ys.append(coordinates[1])
+        else:
+            for item in coordinates or []:
+                collect(item)
+    
+    collect((geometry or {}).get('coordinates'))
+    if not xs:
+        return None
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def bbox_params(bbox):
+    """BBOX_FILTER_SQL parameters for a (min_x, min_y, max_x, max_y) bbox"""
+    min_x, min_y, max_x, max_y = bbox
+    return (min_x, max_x, min_y, max_y)
+
+
+class _HashingReader(io.RawIOBase):
+    """Binary file wrapper that feeds every byte read into a hashlib digest"""
+    
+    def __init__(self, raw, digest):
+        self.raw = raw
+        self.digest = digest
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, buffer):
+        count = self.raw.readinto(buffer)
+        if count:
+            self.digest.update(memoryview(buffer)[:count])
+        return count
+    
+    def close(self):
+        self.raw.close()
+        super().close()
+
+
+def open_source(file_path, digest=None):
+    """Open a GeoJSON source as UTF-8 text; with a hashlib ``digest`` its bytes are hashed as they are read"""
+    if digest is None:
+        return open(file_path, 'r', encoding='utf-8')
+    raw = _HashingReader(open(file_path, 'rb'), digest)
+    return io.TextIOWrapper(io.BufferedReader(raw, STREAM_CHUNK_SIZE), encoding='utf-8')
+
+
+def iter_geojson_features(file_path, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield features of a FeatureCollection one at a time without loading the whole file"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        yield from _iter_stream_features(f, file_path, chunk_size)
+
+
+def _iter_stream_features(f, file_path, chunk_size=STREAM_CHUNK_SIZE):
+    """iter_geojson_features over an open text file"""
+    decoder = json.JSONDecoder()
+    
+    # Skip ahead to the opening bracket of the features array
+    buffer = ''
+    while True:
+        match = _FEATURES_ARRAY_RE.search(buffer)
+        if match:
+            buffer = buffer[match.end():]
+            break
+        chunk = f.read(chunk_size)
+        if not chunk:
+            raise ValueError(f"No features array found in {file_path}")
+        buffer = buffer[-64:] + chunk
+    
+    position = 0
+    while True:
+        position = _SEPARATORS_RE.match(buffer, position).end()
+        if position < len(buffer):
+            if buffer[position] == ']':
+                return
+            try:
+                feature, position = decoder.raw_decode(buffer, position)
+                yield feature
+                continue
+            except json.JSONDecodeError:
+                pass
+        
+        # Current feature is incomplete: drop consumed text and read more
+        chunk = f.read(chunk_size)
+        if not chunk:
+            raise ValueError(f"Truncated features array in {file_path}")
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def iter_file_features(file_path, streaming=False, digest=None):
+    """Yield features of a GeoJSON file, incrementally when streaming
+
+    A hashlib ``digest`` receives the whole file (including anything after
+    the features array) during the same read, so no separate hashing pass
+    is needed.
+    """
+    with open_source(file_path, digest) as f:
+        if streaming:
+            yield from _iter_stream_features(f, file_path)
+        else:
+            yield from json.load(f)['features']
+        if digest is not None:
+            while f.read(STREAM_CHUNK_SIZE):
+                pass
+
+
+def risk_level(percentage):
+    """Risk bucket for a prediction percentage: 2=high, 1=medium, 0=low"""
+    if percentage >= 50:
+        return 2
+    elif percentage >= 20:
+        return 1
+    return 0
+
+
+def region_changed(before, after, tolerance=DEFAULT_CHANGE_TOLERANCE):
+    """Whether a region's (predicted, percentage, binary, actual) values differ enough to report
+
+    ``None`` stands for a region missing on that date. Changes in binary
+    prediction, actual case or risk band always count; the percentage must
+    move by more than ``tolerance`` points.
+    """
+    if before is None or after is None:
+        return before is not after
+    (_, old_percentage, old_binary, old_actual), (_, new_percentage, new_binary, new_actual) = before, after
+    if old_binary != new_binary or old_actual != new_actual:
+        return True
+    if old_percentage is None or new_percentage is None:
+        return old_percentage is not new_percentage
+    return (risk_level(old_percentage) != risk_level(new_percentage)
+            or abs(new_percentage - old_percentage) > tolerance)
+
+
+def feature_to_records(feature, file_path, geometry_encoder=None):
+    """Build the predictions row and region_info row for one GeoJSON feature
+
+    ``geometry_encoder`` optionally turns the geometry into a compact BLOB;
+    by default it is stored as compact GeoJSON text.
+    """
+    props = feature['properties']
+    if geometry_encoder is not None:
+        geom_json = geometry_encoder(feature['geometry'])
+    else:
+        geom_json = json.dumps(feature['geometry'], separators=(',', ':'))
+    
+    # Extract date from filename or properties
+    date = props.get('date', Path(file_path).stem.split('_')[0])
+    
+    prediction_record = (
+        date,
+        props['townvill'],
+        props['TOWN'],
+        props.get('COUNTY', '臺南市'),  # Default to Tainan
+        props.get('case_lag_future_14', 0),
+        props['predicted_case_lag_future_14'],
+        props['predicted_case_lag_future_14_binary'],
+        props['predicted_case_lag_future_14_percentage'],
+        props.get('X', 0),
+        props.get('Y', 0),
+        props.get('AREA', 0),
+        geom_json
+    )
+    
+    region_record = (
+        props['townvill'],
+        props.get('CODE1', ''),
+        props.get('CODE2', ''),
+        props.get('TOWN_ID', ''),
+        props['TOWN'],
+        props.get('COUNTY_ID', ''),
+        props.get('COUNTY', '臺南市'),
+        props.get('X', 0),
+        props.get('Y', 0),
+        props.get('AREA', 0),
+        geom_json
+    )
+    
+    return prediction_record, region_record
+
+
+def parse_geojson_batches(file_path, streaming, geometry_encoder, batch_size, batches):
+    """Parser process of a parallel import: send one file's rows to the ``batches`` queue
+
+    Puts ('rows', prediction_records, region_records) every ``batch_size``
+    rows, where region_records holds the regions first seen in that batch,
+    then ('done', content SHA-256 of the file) or ('error', exception).
+    """
+    try:
+        digest = hashlib.sha256()
+        prediction_records = []
+        region_records = {}
+        seen = set()
+        for feature in iter_file_features(file_path, streaming, digest):
+            prediction_record, region_record = feature_to_records(feature, file_path, geometry_encoder)
+            prediction_records.append(prediction_record)
+            if region_record[0] not in seen:
+                seen.add(region_record[0])
+                region_records[region_record[0]] = region_record
+            if len(prediction_records) >= batch_size:
+                batches.put(('rows', prediction_records, region_records))
+                prediction_records, region_records = [], {}
+        batches.put(('rows', prediction_records, region_records))
+        batches.put(('done', digest.hexdigest()))
+    except BaseException as error:
+        try:
+            pickle.dumps(error)
+        except Exception:
+            error = RuntimeError(f"{type(error).__name__}: {error}")
+        batches.put(('error', error))
+
+
+def _iter_parsed_batches(file_path, process, batches):
+    """Messages from one parser process; raises if it died without finishing"""
+    while True:
+        try:
+            message = batches.get(timeout=1)
+        except queue.Empty:
+            if process.is_alive():
+                continue
+            try:  # Anything it sent before exiting is readable now
+                message = batches.get(timeout=1)
+            except queue.Empty:
+                raise RuntimeError(f"Parser process for {file_path.name} exited with code {process.exitcode}")
+        if message[0] == 'error':
+            raise message[1]
+        yield message
+        if message[0] == 'done':
+            return
+
+
+def iter_import_records(geojson_files, streaming=False, workers=1, geometry_encoder=None, content_hashes=None,
+                        batch_size=DEFAULT_BATCH_SIZE):
+    """Yield (file_path, prediction_record, region_record) for files in the given order
+
+    With ``workers > 1`` up to ``workers`` files are parsed at once in parser
+    processes that send ``batch_size``-row batches back, while rows are still
+    yielded in file order, so the caller sees exactly the serial sequence.
+    With ``streaming`` each process queues at most STREAM_QUEUE_BATCHES
+    batches ahead, so memory stays bounded by batches rather than files.
+    A ``content_hashes`` dict receives each file's SHA-256 once its rows have
+    all been yielded; it is computed while parsing, not in a second read.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    
+    if workers <= 1:
+        for file_path in geojson_files:
+            print(f"Processing {file_path.name}...")
+            digest = hashlib.sha256() if content_hashes is not None else None
+            for feature in iter_file_features(file_path, streaming, digest):
+                yield (file_path,) + feature_to_records(feature, file_path, geometry_encoder)
+            if digest is not None:
+                content_hashes[file_path] = digest.hexdigest()
+        return
+    
+    remaining = iter(geojson_files)
+    in_flight = deque()  # (file_path, process, batches) in file order
+    
+    def start_next():
+        file_path = next(remaining, None)
+        if file_path is None:
+            return
+        batches = multiprocessing.Queue(STREAM_QUEUE_BATCHES if streaming else 0)
+        process = multiprocessing.Process(target=parse_geojson_batches, daemon=True,
+                                          args=(file_path, streaming, geometry_encoder, batch_size, batches))
+        process.start()
+        in_flight.append((file_path, process, batches))
+    
+    try:
+        for _ in range(workers):
+            start_next()
+        
+        while in_flight:
+            file_path, process, batches = in_flight[0]
+            print(f"Processing {file_path.name}...")
+            file_regions = {}
+            for message in _iter_parsed_batches(file_path, process, batches):
+                if message[0] == 'done':
+                    if content_hashes is not None:
+                        content_hashes[file_path] = message[1]
+                    break
+                _, prediction_records, region_records = message
+                file_regions.update(region_records)
+                for prediction_record in prediction_records:
+                    yield file_path, prediction_record, file_regions[prediction_record[1]]
+            
+            process.join()
+            in_flight.popleft()
+            start_next()
+    finally:
+        # Stop parsers left running when the import fails or is abandoned
+        for _, process, _ in in_flight:
+            process.terminate()
+            process.join()
+
+
+def manifest_key(file_path):
+    """Path under which a source file is recorded in import_manifest"""
+    return str(Path(file_path).resolve())
+
+
+def file_sha256(file_path, chunk_size=STREAM_CHUNK_SIZE):
+    """Content hash of a source file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def peak_memory_mb():
+    """Peak resident set size of this process in MB, or None if unavailable"""
+    if resource is None:
+        return None
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class DailyAggregate:
+    """Running per-date statistics so individual predictions need not be kept"""
+    
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max_value = None
+        self.min_value = None
+        self.risk_counts = [0, 0, 0]  # low, medium, high
+    
+    def add(self, pred_val, pred_percentage):
+        self.count += 1
+        self.total += pred_val
+        if self.max_value is None or pred_val > self.max_value:
+            self.max_value = pred_val
+        if self.min_value is None or pred_val < self.min_value:
+            self.min_value = pred_val
+        self.risk_counts[risk_level(pred_percentage)] += 1
+    
+    def summary_record(self, date):
+        """Row for the daily_summary table"""
+        return (
+            date,
+            self.count,
+            self.total,
+            self.total / self.count,
+            self.max_value,
+            self.min_value,
+            self.risk_counts[2],  # High risk
+            self.risk_counts[1],  # Medium risk
+            self.risk_counts[0]   # Low risk
+        )
+
 class DiseaseDataDatabase:
-    def __init__(self, db_path="output/database/disease_predictions.db"):
+    def __init__(self, db_path="output/database/disease_predictions.db",
+                 cache_size_kib=DEFAULT_CACHE_SIZE_KIB, mmap_size=DEFAULT_MMAP_SIZE,
+                 temp_store='MEMORY', query_cache_bytes=DEFAULT_QUERY_CACHE_BYTES,
+                 query_cache_entries=DEFAULT_QUERY_CACHE_ENTRIES, query_cache_ttl=None):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
         
-    def create_database_schema(self):
-        """Create optimized SQLite schema for fast queries"""
+        # Pragmas applied to every pooled read connection
+        self.cache_size_kib = cache_size_kib
+        self.mmap_size = mmap_size
+        self.temp_store = temp_store
+        
+        # One reusable read-only connection per thread, tracked for shutdown
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        
+        # townvill -> geometry_json, loaded on first use in normalized mode
+        self._region_geometry_cache = None
+        # tolerance -> {townvill: geometry_json} for the simplified levels
+        self._simplified_geometry_cache = {}
+        # townvill -> bbox for bbox filters on a database without a usable region R*Tree
+        # (None: not checked yet, False: the R*Tree answers them)
+        self._region_bbox_cache = None
+        # Dataset version the geometry caches were filled from
+        self._geometry_cache_version = None
+        
+        # Results of the get_* query methods keyed by dataset version (0 bytes disables)
+        self.query_cache = ResponseCache(
+            max_bytes=query_cache_bytes, max_entries=query_cache_entries,
+            ttl=query_cache_ttl, sizeof=result_size
+        ) if query_cache_bytes else None
+    
+    def _read_connection(self):
+        """Read-only connection owned by the calling thread, opened on first use
+        
+        A missing database file is created with the empty schema first, since
+        ``mode=ro`` cannot open a file that does not exist.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        
+        with self._connections_lock:
+            if not self.db_path.exists():
+                print(f"⚠️ Database not found, creating an empty one: {self.db_path}")
+                write_conn = self._write_connection()
+                self._create_tables(write_conn.cursor())
+                write_conn.commit()
+                write_conn.close()
+        
+        conn = sqlite3.connect(self.db_path.resolve().as_uri() + '?mode=ro', uri=True,
+                               check_same_thread=False)
+        conn.execute(f'PRAGMA cache_size = -{int(self.cache_size_kib)}')
+        conn.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        conn.execute(f'PRAGMA temp_store = {self.temp_store}')
+        
+        self._local.conn = conn
+        self._local.pid = os.getpid()  # Connections must not cross a fork
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+    
+    def _write_connection(self):
+        """Fresh read-write connection for schema changes and imports, in WAL mode"""
         conn = sqlite3.connect(str(self.db_path))
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        return conn
+    
+    def close(self):
+        """Close every pooled read connection (call on application shutdown)"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+    
+    @staticmethod
+    def _set_metadata(cursor, key, value):
+        cursor.execute('INSERT OR REPLACE INTO db_metadata (key, value) VALUES (?, ?)',
+                       (key, str(value)))
+    
+    @staticmethod
+    def _get_metadata(cursor, key, default=None):
+        """Read a db_metadata value; databases created before the table existed get the default"""
+        try:
+            cursor.execute('SELECT value FROM db_metadata WHERE key = ?', (key,))
+        except sqlite3.OperationalError:
+            return default
+        row = cursor.fetchone()
+        return row[0] if row else default
+    
+    def _bump_dataset_version(self, cursor):
+        """Give the data a new version stamp so version-keyed caches miss after a change"""
+        self._set_metadata(cursor, 'dataset_version', time.time_ns())
+    
+    def get_dataset_version(self):
+        """Version stamp of the current data (changes with every import)"""
+        return self._get_metadata(self._read_connection().cursor(), 'dataset_version', '0')
+    
+    def _clear_geometry_caches(self):
+        self._region_geometry_cache = None
+        self._simplified_geometry_cache = {}
+        self._region_bbox_cache = None
+        if self.query_cache is not None:
+            self.query_cache.clear()
+    
+    def _check_geometry_cache_version(self, cursor):
+        """Drop the geometry caches if another process has imported since they were filled"""
+        version = self._get_metadata(cursor, 'dataset_version', '0')
+        if version != self._geometry_cache_version:
+            self._region_geometry_cache = None
+            self._simplified_geometry_cache = {}
+            self._region_bbox_cache = None
+            self._geometry_cache_version = version
+    
+    def _bbox_filter(self, cursor, bbox):
+        """(SQL condition on townvill, parameters) keeping regions whose bounding box intersects ``bbox``
+
+        Uses the region R*Tree (BBOX_FILTER_SQL). A database without a filled
+        one (built before it existed, or never indexed) is filtered against
+        bounding boxes computed from region_info once per dataset version.
+        """
+        self._check_geometry_cache_version(cursor)
+        if self._region_bbox_cache is None:
+            if self._region_index_ready(cursor):
+                self._region_bbox_cache = False
+            else:
+                print("⚠️ No region R*Tree, filtering bounding boxes in Python (run --index-regions)")
+                cursor.execute('SELECT townvill, geometry_json FROM region_info WHERE geometry_json IS NOT NULL')
+                boxes = {}
+                for townvill, stored in cursor.fetchall():
+                    region_bbox = geometry_bbox(json.loads(geometry_text(stored)))
+                    if region_bbox is not None:
+                        boxes[townvill] = region_bbox
+                self._region_bbox_cache = boxes
+        
+        if self._region_bbox_cache is False:
+            return BBOX_FILTER_SQL, bbox_params(bbox)
+        min_x, min_y, max_x, max_y = bbox
+        inside = [townvill for townvill, (x0, y0, x1, y1) in self._region_bbox_cache.items()
+                  if x1 >= min_x and x0 <= max_x and y1 >= min_y and y0 <= max_y]
+        return 'townvill IN (SELECT value FROM json_each(?))', (json.dumps(inside),)
+    
+    def _region_geometries(self, cursor, tolerance=None):
+        """Cached townvill -> GeoJSON text mapping from region_info
+
+        With a ``tolerance`` that is a stored simplification level, the
+        mapping comes from ``region_geometry_levels`` instead. Both caches are
+        dropped when another process has imported since they were filled.
+        """
+        self._check_geometry_cache_version(cursor)
+        if tolerance is not None:
+            if tolerance not in self._simplified_geometry_cache:
+                cursor.execute('SELECT townvill, geometry_json FROM region_geometry_levels WHERE tolerance = ?',
+                               (tolerance,))
+                self._simplified_geometry_cache[tolerance] = {
+                    townvill: geometry_text(stored) for townvill, stored in cursor.fetchall()
+                }
+            return self._simplified_geometry_cache[tolerance]
+        
+        if self._region_geometry_cache is None:
+            cursor.execute('SELECT townvill, geometry_json FROM region_info')
+            self._region_geometry_cache = {
+                townvill: geometry_text(stored) for townvill, stored in cursor.fetchall()
+            }
+        return self._region_geometry_cache
+    
+    def _fill_geometry(self, cursor, rows, townvill_index, tolerance=None):
+        """Return rows with GeoJSON text geometry as the last column
+
+        Missing per-row geometry (normalized storage) is taken from the region
+        cache and encoded BLOBs are decoded. A ``tolerance`` replaces every
+        geometry with the coarsest precomputed simplification level within it.
+        """
+        level = pick_level(self._simplification_levels(cursor), tolerance) if tolerance is not None else None
+        if level is not None:
+            geometries = self._region_geometries(cursor, level)
+            return [row[:-1] + (geometries.get(row[townvill_index]),) for row in rows]
+        
+        if all(isinstance(row[-1], str) for row in rows):
+            return rows
+        geometries = None
+        filled = []
+        for row in rows:
+            stored = row[-1]
+            if stored is None:
+                if geometries is None:
+                    geometries = self._region_geometries(cursor)
+                row = row[:-1] + (geometries.get(row[townvill_index]),)
+            elif isinstance(stored, bytes):
+                row = row[:-1] + (decode_geometry_json(stored),)
+            filled.append(row)
+        return filled
+    
+    def _simplification_levels(self, cursor):
+        return json.loads(self._get_metadata(cursor, 'simplify_tolerances', '[]'))
+    
+    def get_simplification_levels(self):
+        """Tolerances (degrees) of the precomputed simplified geometry levels"""
+        return self._simplification_levels(self._read_connection().cursor())
+    
+    def simplification_level(self, tolerance):
+        """Stored level a requested tolerance resolves to, or None for full resolution"""
+        return pick_level(self.get_simplification_levels(), tolerance)
+    
+    def _geometry_encoder(self, cursor):
+        """Encoder for new geometry values per the database's metadata, or None for JSON text"""
+        if self._get_metadata(cursor, 'geometry_encoding', GEOMETRY_ENCODING_JSON) != GEOMETRY_ENCODING_QUANTIZED:
+            return None
+        return partial(
+            encode_geometry,
+            precision=int(self._get_metadata(cursor, 'geometry_precision', DEFAULT_GEOMETRY_PRECISION)),
+            compression=self._get_metadata(cursor, 'geometry_compression', 'zlib')
+        )
+        
+    def create_database_schema(self, normalized_geometry=False, geometry_encoding=GEOMETRY_ENCODING_JSON,
+                               geometry_precision=DEFAULT_GEOMETRY_PRECISION, geometry_compression='zlib'):
+        """Create optimized SQLite schema for fast queries
+
+        With ``normalized_geometry=True`` polygons are stored once per region
+        in ``region_info`` and prediction rows carry no geometry of their own.
+        
+        With ``geometry_encoding='quantized'`` the ``geometry_json`` columns
+        hold compact BLOBs (see ``encode_geometry``) instead of GeoJSON text;
+        query methods still return GeoJSON text.
+        """
+        if geometry_encoding not in (GEOMETRY_ENCODING_JSON, GEOMETRY_ENCODING_QUANTIZED):
+            raise ValueError(f"Unknown geometry encoding: {geometry_encoding}")
+        if geometry_compression not in _COMPRESSIONS:
+            raise ValueError(f"Unknown geometry compression: {geometry_compression}")
+        
+        conn = self._write_connection()
         cursor = conn.cursor()
         
         # Drop existing tables if they exist
         cursor.execute("DROP TABLE IF EXISTS predictions")
         cursor.execute("DROP TABLE IF EXISTS daily_summary")
         cursor.execute("DROP TABLE IF EXISTS region_info")
+        cursor.execute("DROP TABLE IF EXISTS db_metadata")
+        cursor.execute("DROP TABLE IF EXISTS import_manifest")
+        cursor.execute("DROP TABLE IF EXISTS region_geometry_levels")
+        cursor.execute("DROP TABLE IF EXISTS region_rtree")
+        cursor.execute("DROP TABLE IF EXISTS catalog_dates")
+        cursor.execute("DROP TABLE IF EXISTS catalog_regions")
+        cursor.execute("DROP TABLE IF EXISTS catalog_dataset")
+        cursor.execute("DROP TABLE IF EXISTS town_daily_summary")
+        cursor.execute("DROP TABLE IF EXISTS town_geometry")
+        cursor.execute("DROP TABLE IF EXISTS region_changes")
+        cursor.execute("DROP TABLE IF EXISTS region_change_pairs")
+        
+        self._create_tables(cursor)
+        self._set_metadata(cursor, 'geometry_storage',
+                           GEOMETRY_NORMALIZED if normalized_geometry else GEOMETRY_INLINE)
+        self._set_metadata(cursor, 'geometry_encoding', geometry_encoding)
+        self._set_metadata(cursor, 'geometry_precision', geometry_precision)
+        self._set_metadata(cursor, 'geometry_compression', geometry_compression)
+        self._bump_dataset_version(cursor)
+        
+        conn.commit()
+        conn.close()
+        self._clear_geometry_caches()
         
+        print(f"Database schema created: {self.db_path}")
+        if normalized_geometry:
+            print("Geometry storage: normalized (one polygon per region)")
+        if geometry_encoding == GEOMETRY_ENCODING_QUANTIZED:
+            print(f"Geometry encoding: quantized ({geometry_precision} decimals, {geometry_compression})")
+    
+    def _create_tables(self, cursor):
+        """Create any missing tables and indexes without touching existing data"""
         # Main predictions table
         cursor.execute('''
-            CREATE TABLE predictions (
+            CREATE TABLE IF NOT EXISTS predictions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 date TEXT NOT NULL,
                 townvill TEXT NOT NULL,
@@ -46,9 +973,11 @@ class DiseaseDataDatabase:
             )
         ''')
         
-        # Region information table (static data)
+        # Region information table (static data). Like predictions.geometry_json,
+        # its geometry column holds GeoJSON text or an encoded BLOB, depending on
+        # the 'geometry_encoding' metadata.
         cursor.execute('''
-            CREATE TABLE region_info (
+            CREATE TABLE IF NOT EXISTS region_info (
                 townvill TEXT PRIMARY KEY,
                 code1 TEXT,
                 code2 TEXT,
@@ -63,9 +992,27 @@ class DiseaseDataDatabase:
             )
         ''')
         
+        # Topology-preserving simplified region polygons, one row per
+        # (tolerance, region); same geometry encoding as region_info
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS region_geometry_levels (
+                tolerance REAL NOT NULL,
+                townvill TEXT NOT NULL,
+                geometry_json TEXT,
+                PRIMARY KEY (tolerance, townvill)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Spatial index of region bounding boxes, keyed by region_info.rowid
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS region_rtree USING rtree(
+                id, min_x, max_x, min_y, max_y
+            )
+        ''')
+        
         # Daily summary statistics
         cursor.execute('''
-            CREATE TABLE daily_summary (
+            CREATE TABLE IF NOT EXISTS daily_summary (
                 date TEXT PRIMARY KEY,
                 total_regions INTEGER,
                 total_predicted_cases REAL,
@@ -79,182 +1026,894 @@ class DiseaseDataDatabase:
             )
         ''')
         
+        # District (town) rollups per date, so the district view never reads
+        # village rows; risk bands as in risk_level()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS town_daily_summary (
+                date TEXT NOT NULL,
+                town TEXT NOT NULL,
+                county TEXT,
+                total_regions INTEGER,
+                total_predicted_cases REAL,
+                avg_prediction REAL,
+                max_prediction REAL,
+                avg_percentage REAL,
+                max_percentage REAL,
+                positive_regions INTEGER,
+                actual_cases INTEGER,
+                high_risk_regions INTEGER,
+                medium_risk_regions INTEGER,
+                low_risk_regions INTEGER,
+                PRIMARY KEY (date, town)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Dissolved district polygons at full resolution (tolerance 0) and at
+        # every simplification level; same geometry encoding as region_info
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS town_geometry (
+                tolerance REAL NOT NULL,
+                town TEXT NOT NULL,
+                county TEXT,
+                total_regions INTEGER,
+                geometry_json TEXT,
+                PRIMARY KEY (tolerance, town)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Precomputed changes between consecutive dates at the default
+        # tolerance (rows as returned by get_region_changes); a pair listed in
+        # region_change_pairs is complete even when it has no changed regions
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS region_changes (
+                from_date TEXT NOT NULL,
+                to_date TEXT NOT NULL,
+                townvill TEXT NOT NULL,
+                predicted_case_lag_future_14 REAL,
+                predicted_case_lag_future_14_percentage REAL,
+                predicted_case_lag_future_14_binary INTEGER,
+                case_lag_future_14 INTEGER,
+                PRIMARY KEY (from_date, to_date, townvill)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS region_change_pairs (
+                from_date TEXT NOT NULL,
+                to_date TEXT NOT NULL,
+                tolerance REAL NOT NULL,
+                changed_regions INTEGER NOT NULL,
+                PRIMARY KEY (from_date, to_date)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Dataset-level settings (key/value)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS db_metadata (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO db_metadata (key, value) VALUES (?, ?)',
+                       ('geometry_storage', GEOMETRY_INLINE))
+        
+        # Catalog maintained by imports so stats and the date list never scan
+        # predictions: rows and regions per date, rows per region (to count
+        # distinct regions), and a single dataset row with the totals
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS catalog_dates (
+                date TEXT PRIMARY KEY,
+                row_count INTEGER NOT NULL,
+                region_count INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS catalog_regions (
+                townvill TEXT PRIMARY KEY,
+                row_count INTEGER NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS catalog_dataset (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                total_predictions INTEGER NOT NULL,
+                total_dates INTEGER NOT NULL,
+                total_regions INTEGER NOT NULL,
+                min_date TEXT,
+                max_date TEXT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Source files already imported, for incremental re-imports
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS import_manifest (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                dates TEXT NOT NULL,
+                row_count INTEGER NOT NULL,
+                imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
         # Create indexes for fast queries
-        cursor.execute('CREATE INDEX idx_predictions_date ON predictions(date)')
-        cursor.execute('CREATE INDEX idx_predictions_town ON predictions(town)')
-        cursor.execute('CREATE INDEX idx_predictions_townvill ON predictions(townvill)')
-        cursor.execute('CREATE INDEX idx_predictions_date_town ON predictions(date, town)')
-        cursor.execute('CREATE INDEX idx_predictions_date_townvill ON predictions(date, townvill)')
-        cursor.execute('CREATE INDEX idx_predictions_binary ON predictions(predicted_case_lag_future_14_binary)')
-        cursor.execute('CREATE INDEX idx_predictions_percentage ON predictions(predicted_case_lag_future_14_percentage)')
+        self._create_indexes(cursor)
+    
+    @staticmethod
+    def _create_indexes(cursor):
+        for name in OBSOLETE_INDEXES:
+            cursor.execute(f'DROP INDEX IF EXISTS {name}')
+        for name, columns in PREDICTION_INDEXES:
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON predictions({columns})')
+    
+    @staticmethod
+    def _drop_indexes(cursor):
+        for name, _ in PREDICTION_INDEXES:
+            cursor.execute(f'DROP INDEX IF EXISTS {name}')
+    
+    @staticmethod
+    def _region_index_ready(cursor):
+        """Whether region_rtree exists and is filled (or there are no regions to index)"""
+        try:
+            cursor.execute('SELECT EXISTS (SELECT 1 FROM region_rtree) OR NOT EXISTS (SELECT 1 FROM region_info)')
+        except sqlite3.OperationalError:
+            return False
+        return bool(cursor.fetchone()[0])
+    
+    @staticmethod
+    def _catalog_ready(cursor):
+        """Whether the catalog describes the whole table (its dataset row exists)"""
+        try:
+            cursor.execute('SELECT 1 FROM catalog_dataset WHERE id = 1')
+        except sqlite3.OperationalError:
+            return False
+        return cursor.fetchone() is not None
+    
+    @staticmethod
+    def _catalog_remove_date(cursor, date):
+        """Take a date's rows out of the catalog; call before deleting them from predictions"""
+        cursor.execute('''
+            UPDATE catalog_regions
+            SET row_count = row_count - (
+                SELECT COUNT(*) FROM predictions
+                WHERE predictions.date = ? AND predictions.townvill = catalog_regions.townvill)
+            WHERE townvill IN (SELECT townvill FROM predictions WHERE date = ?)
+        ''', (date, date))
+        cursor.execute('DELETE FROM catalog_regions WHERE row_count <= 0')
+        cursor.execute('DELETE FROM catalog_dates WHERE date = ?', (date,))
+    
+    @staticmethod
+    def _catalog_add_dates(cursor, dates):
+        """Count the given dates' rows into the catalog (one grouped pass over them)"""
+        dates_json = json.dumps(sorted(dates))
+        cursor.execute('''
+            INSERT OR REPLACE INTO catalog_dates (date, row_count, region_count)
+            SELECT date, COUNT(*), COUNT(DISTINCT townvill) FROM predictions
+            WHERE date IN (SELECT value FROM json_each(?))
+            GROUP BY date
+        ''', (dates_json,))
+        cursor.execute('''
+            INSERT INTO catalog_regions (townvill, row_count)
+            SELECT townvill, COUNT(*) FROM predictions
+            WHERE date IN (SELECT value FROM json_each(?))
+            GROUP BY townvill
+            ON CONFLICT (townvill) DO UPDATE SET row_count = row_count + excluded.row_count
+        ''', (dates_json,))
+    
+    @staticmethod
+    def _catalog_update_dataset(cursor):
+        """Refresh the dataset row from the (small) catalog tables"""
+        cursor.execute('''
+            INSERT OR REPLACE INTO catalog_dataset
+            (id, total_predictions, total_dates, total_regions, min_date, max_date, updated_at)
+            SELECT 1, COALESCE(SUM(row_count), 0), COUNT(*),
+                   (SELECT COUNT(*) FROM catalog_regions), MIN(date), MAX(date), CURRENT_TIMESTAMP
+            FROM catalog_dates
+        ''')
+    
+    def _rebuild_catalog(self, cursor):
+        """Recompute the whole catalog from predictions"""
+        cursor.execute('DELETE FROM catalog_dates')
+        cursor.execute('DELETE FROM catalog_regions')
+        cursor.execute('SELECT DISTINCT date FROM predictions')
+        self._catalog_add_dates(cursor, [row[0] for row in cursor.fetchall()])
+        self._catalog_update_dataset(cursor)
+    
+    def rebuild_catalog(self):
+        """Create or recompute the catalog of an existing database"""
+        conn = self._write_connection()
+        cursor = conn.cursor()
+        self._create_tables(cursor)
+        self._rebuild_catalog(cursor)
+        self._bump_dataset_version(cursor)
+        conn.commit()
+        conn.close()
+        self._clear_geometry_caches()
+        print("✅ Catalog rebuilt")
+    
+    def check_catalog(self):
+        """Compare the catalog with counts recomputed from predictions
+
+        Returns {'ok', 'mismatches'}; every mismatch is printed.
+        """
+        cursor = self._read_connection().cursor()
+        mismatches = []
+        if not self._catalog_ready(cursor):
+            mismatches.append('catalog is missing (run --rebuild-catalog)')
+        else:
+            cursor.execute('''
+                SELECT date, COUNT(*), COUNT(DISTINCT townvill) FROM predictions GROUP BY date
+            ''')
+            actual_dates = {date: (rows, regions) for date, rows, regions in cursor.fetchall()}
+            cursor.execute('SELECT date, row_count, region_count FROM catalog_dates')
+            catalog_dates = {date: (rows, regions) for date, rows, regions in cursor.fetchall()}
+            for date in sorted(set(actual_dates) | set(catalog_dates)):
+                if actual_dates.get(date) != catalog_dates.get(date):
+                    mismatches.append(f"{date}: catalog {catalog_dates.get(date)}, "
+                                      f"predictions {actual_dates.get(date)} (rows, regions)")
+            
+            cursor.execute('SELECT townvill, COUNT(*) FROM predictions GROUP BY townvill')
+            actual_regions = dict(cursor.fetchall())
+            cursor.execute('SELECT townvill, row_count FROM catalog_regions')
+            catalog_regions = dict(cursor.fetchall())
+            for townvill in sorted(set(actual_regions) | set(catalog_regions)):
+                if actual_regions.get(townvill) != catalog_regions.get(townvill):
+                    mismatches.append(f"{townvill}: catalog {catalog_regions.get(townvill)} rows, "
+                                      f"predictions {actual_regions.get(townvill)}")
+            
+            expected = self._scanned_stats(cursor)
+            cataloged = self._cataloged_stats(cursor)
+            if expected != cataloged:
+                mismatches.append(f"dataset row: catalog {cataloged}, predictions {expected}")
+        
+        for mismatch in mismatches:
+            print(f"❌ {mismatch}")
+        if not mismatches:
+            print("✅ Catalog matches predictions")
+        return {'ok': not mismatches, 'mismatches': mismatches}
+    
+    @staticmethod
+    def _add_town_rollups(cursor, dates=None):
+        """(Re)compute district rollups of the given dates, or of every date"""
+        if dates is None:
+            cursor.execute(f'INSERT OR REPLACE INTO town_daily_summary {TOWN_ROLLUP_SELECT} GROUP BY date, town')
+        else:
+            cursor.execute(f'''
+                INSERT OR REPLACE INTO town_daily_summary {TOWN_ROLLUP_SELECT}
+                WHERE date IN (SELECT value FROM json_each(?))
+                GROUP BY date, town
+            ''', (json.dumps(sorted(dates)),))
+    
+    def _rebuild_town_rollups(self, cursor):
+        cursor.execute('DELETE FROM town_daily_summary')
+        self._add_town_rollups(cursor)
+        self._set_metadata(cursor, 'town_rollups', 'ready')
+    
+    def _build_town_geometries(self, cursor, geometry_encoder, force=False):
+        """Rebuild ``town_geometry`` if region polygons or their districts changed
+
+        Each district is dissolved from the shared-arc topology of its regions
+        (see ``RegionTopology.merged``), at full resolution and at every stored
+        simplification level, so district outlines line up with the region
+        layer. Returns (tolerance, town, county, total_regions, GeoJSON text)
+        rows, or None when the stored polygons are current.
+        """
+        cursor.execute('''
+            SELECT townvill, town, county, geometry_json FROM region_info
+            WHERE geometry_json IS NOT NULL ORDER BY townvill
+        ''')
+        regions = [(townvill, town, county, geometry_text(stored))
+                   for townvill, town, county, stored in cursor.fetchall()]
+        tolerances = [0.0] + self._simplification_levels(cursor)
         
+        digest = hashlib.sha256(json.dumps(tolerances).encode('utf-8'))
+        for region in regions:
+            digest.update(json.dumps(region, ensure_ascii=False).encode('utf-8'))
+        source_hash = digest.hexdigest()
+        if not force and self._get_metadata(cursor, 'town_geometry_source_hash') == source_hash:
+            return None
+        
+        towns = {}
+        for townvill, town, county, _ in regions:
+            towns.setdefault(town, (county, []))[1].append(townvill)
+        print(f"Dissolving {len(regions)} regions into {len(towns)} districts...")
+        topology = RegionTopology({townvill: json.loads(text) for townvill, _, _, text in regions})
+        
+        rows = []
+        for tolerance in tolerances:
+            arcs = topology.simplified_arcs(tolerance) if tolerance else None
+            for town, (county, townvills) in sorted(towns.items()):
+                geometry = topology.merged(townvills, arcs)
+                rows.append((tolerance, town, county, len(townvills), json.dumps(geometry, separators=(',', ':'))))
+        
+        cursor.execute('DELETE FROM town_geometry')
+        cursor.executemany(
+            'INSERT INTO town_geometry (tolerance, town, county, total_regions, geometry_json) VALUES (?, ?, ?, ?, ?)',
+            [row[:-1] + (geometry_encoder(json.loads(row[-1])) if geometry_encoder is not None else row[-1],)
+             for row in rows]
+        )
+        self._set_metadata(cursor, 'town_geometry_source_hash', source_hash)
+        return rows
+    
+    def build_town_rollups(self):
+        """Create or recompute district rollups and polygons of an existing database"""
+        conn = self._write_connection()
+        cursor = conn.cursor()
+        self._create_tables(cursor)
+        self._rebuild_town_rollups(cursor)
+        rows = self._build_town_geometries(cursor, self._geometry_encoder(cursor), force=True)
+        self._bump_dataset_version(cursor)
         conn.commit()
         conn.close()
+        self._clear_geometry_caches()
+        print(f"✅ District rollups and {len({row[1] for row in rows})} district polygons rebuilt")
+    
+    @staticmethod
+    def _update_region_changes(cursor, changed_dates=None):
+        """Bring the precomputed consecutive-date changes in line with the catalog's dates
+
+        Pairs that are new, touch one of ``changed_dates`` (every pair when
+        None) or were computed at another tolerance are recomputed; pairs that
+        are no longer consecutive are dropped. Returns the number recomputed.
+        """
+        cursor.execute('SELECT date FROM catalog_dates ORDER BY date')
+        dates = [row[0] for row in cursor.fetchall()]
+        pairs = set(zip(dates, dates[1:]))
+        cursor.execute('SELECT from_date, to_date, tolerance FROM region_change_pairs')
+        stored = {(from_date, to_date): tolerance for from_date, to_date, tolerance in cursor.fetchall()}
         
-        print(f"Database schema created: {self.db_path}")
+        refresh = {
+            pair for pair in pairs
+            if stored.get(pair) != DEFAULT_CHANGE_TOLERANCE or changed_dates is None
+            or pair[0] in changed_dates or pair[1] in changed_dates
+        }
+        for from_date, to_date in set(stored) - (pairs - refresh):
+            cursor.execute('DELETE FROM region_changes WHERE from_date = ? AND to_date = ?', (from_date, to_date))
+            cursor.execute('DELETE FROM region_change_pairs WHERE from_date = ? AND to_date = ?',
+                           (from_date, to_date))
+        
+        for from_date, to_date in sorted(refresh):
+            params = {'from_date': from_date, 'to_date': to_date, 'tolerance': DEFAULT_CHANGE_TOLERANCE}
+            cursor.execute(f'''
+                INSERT INTO region_changes
+                SELECT :from_date, :to_date, changes.* FROM ({REGION_CHANGES_SQL}) AS changes
+            ''', params)
+            cursor.execute('''
+                INSERT INTO region_change_pairs (from_date, to_date, tolerance, changed_regions)
+                SELECT :from_date, :to_date, :tolerance, COUNT(*) FROM region_changes
+                WHERE from_date = :from_date AND to_date = :to_date
+            ''', params)
+        return len(refresh)
     
-    def import_geojson_files(self, data_dir="data"):
-        """Import all GeoJSON files from data directory"""
+    def build_region_changes(self):
+        """Precompute consecutive-date changes for an existing database"""
+        conn = self._write_connection()
+        cursor = conn.cursor()
+        self._create_tables(cursor)
+        if not self._catalog_ready(cursor):
+            self._rebuild_catalog(cursor)
+        count = self._update_region_changes(cursor)
+        self._bump_dataset_version(cursor)
+        conn.commit()
+        conn.close()
+        self._clear_geometry_caches()
+        print(f"✅ Precomputed changes for {count} consecutive date pairs")
+        return count
+    
+    def _abort_bulk_load(self, conn):
+        """Put a failed bulk load's database back into its normal mode: indexes, WAL, NORMAL
+
+        Without a journal the partial load cannot be rolled back, so the rows
+        written so far stay (re-run the import); the safe settings and the
+        indexes are restored either way.
+        """
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            pass
+        self._create_indexes(conn.cursor())
+        conn.commit()
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        print("❌ Bulk load failed: indexes and WAL journaling restored, re-run the import")
+    
+    def _changed_files(self, cursor, geojson_files):
+        """Split files into (changed, unchanged) against the import manifest
+
+        Size and mtime are checked first; the content hash is only computed
+        when they differ, and a touched-but-identical file just refreshes its
+        manifest entry. Changed files come back as (path, stat) pairs.
+        """
+        changed, unchanged = [], []
+        for file_path in geojson_files:
+            stat = file_path.stat()
+            cursor.execute('SELECT size, mtime_ns, content_hash FROM import_manifest WHERE path = ?',
+                           (manifest_key(file_path),))
+            entry = cursor.fetchone()
+            
+            if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+                unchanged.append(file_path)
+                continue
+            
+            content_hash = file_sha256(file_path)
+            if entry and entry[2] == content_hash:
+                cursor.execute('UPDATE import_manifest SET size = ?, mtime_ns = ? WHERE path = ?',
+                               (stat.st_size, stat.st_mtime_ns, manifest_key(file_path)))
+                unchanged.append(file_path)
+                continue
+            
+            changed.append((file_path, stat))
+        return changed, unchanged
+    
+    def import_geojson_files(self, data_dir="data", streaming=False, batch_size=DEFAULT_BATCH_SIZE,
+                             workers=1, incremental=False, bulk_load=False, columnar_dir=None):
+        """Import all GeoJSON files from data directory
+
+        With ``streaming=True`` features are parsed incrementally and flushed
+        to SQLite every ``batch_size`` rows, so memory stays bounded by one
+        batch plus the per-region and per-date aggregates.
+        
+        With ``workers > 1`` (or ``None`` for one per CPU) files are parsed in
+        worker processes and this connection remains the single writer; the
+        resulting database is identical to a serial import. Combined with
+        ``streaming`` each worker holds at most a few batches, so memory stays
+        bounded by ``workers`` x ``batch_size`` rather than by file size.
+        
+        With ``incremental=True`` existing tables are kept and only files that
+        are new or changed according to ``import_manifest`` are ingested. The
+        dates they contain are replaced (rows and summary) in one transaction.
+        Each source file is expected to hold whole dates.
+        
+        With ``bulk_load=True`` (full imports only) journaling and fsync are
+        switched off and the predictions indexes are dropped for the load, then
+        rebuilt, analyzed and the safe settings restored at the end.
+        
+        With ``columnar_dir`` the same rows are also written as a date-partitioned
+        Parquet dataset (see ``columnar_store``) for the columnar backend.
+        """
+        if bulk_load and incremental:
+            raise ValueError("bulk_load rebuilds indexes and cannot be combined with incremental")
+        
         data_path = Path(data_dir)
-        geojson_files = list(data_path.glob("*_case_results.geojson"))
+        geojson_files = sorted(data_path.glob("*_case_results.geojson"))
         
         if not geojson_files:
             print(f"No GeoJSON files found in {data_path}")
-            return
+            return self._import_stats(0, 0.0, 0, 0, 0, 0.0)
         
         print(f"Found {len(geojson_files)} GeoJSON files to import")
+        if streaming:
+            print(f"Streaming mode: flushing every {batch_size:,} rows")
+        if workers is None or workers > 1:
+            print(f"Parallel mode: {workers or os.cpu_count()} parser processes")
         
-        conn = sqlite3.connect(str(self.db_path))
+        started = time.perf_counter()
+        conn = self._write_connection()
         cursor = conn.cursor()
         
-        # Prepare batch data
-        prediction_records = []
-        region_records = {}
-        daily_stats = defaultdict(lambda: {
-            'count': 0, 'predictions': [], 'binary_counts': [0, 0, 0]
-        })
+        if incremental:
+            self._create_tables(cursor)
+            changed, unchanged = self._changed_files(cursor, geojson_files)
+            print(f"Incremental mode: {len(changed)} new or changed, {len(unchanged)} unchanged")
+            if not changed:
+                conn.commit()
+                conn.close()
+                print("✅ Database is up to date")
+                return self._import_stats(0, 0.0, 0, 0, 0, time.perf_counter() - started)
+        else:
+            # Record every file so later incremental runs can skip them; the
+            # manifest hashes are computed by the parse pass itself
+            changed = [(file_path, file_path.stat()) for file_path in geojson_files]
         
-        for file_path in sorted(geojson_files):
-            print(f"Processing {file_path.name}...")
+        try:
+            if bulk_load:
+                print("Bulk-load mode: journaling off, indexes deferred")
+                conn.execute('PRAGMA journal_mode = OFF')
+                conn.execute('PRAGMA synchronous = OFF')
+                self._drop_indexes(cursor)
             
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            normalized = self._get_metadata(cursor, 'geometry_storage') == GEOMETRY_NORMALIZED
+            geometry_encoder = self._geometry_encoder(cursor)
             
-            for feature in data['features']:
-                props = feature['properties']
-                geom_json = json.dumps(feature['geometry'], separators=(',', ':'))
-                
-                # Extract date from filename or properties
-                date = props.get('date', file_path.stem.split('_')[0])
+            # An incremental import keeps an existing catalog up to date; anything
+            # else (full import, database from before the catalog) rebuilds it
+            catalog_ready = incremental and self._catalog_ready(cursor)
+            
+            columnar = None
+            if columnar_dir is not None:
+                from columnar_store import ColumnarDatasetWriter
+                columnar = ColumnarDatasetWriter(columnar_dir, overwrite=not incremental)
+                print(f"Columnar output: {columnar_dir}")
+            
+            # Only the pending batch is held in memory; everything else is aggregated
+            pending_records = []
+            total_predictions = 0
+            region_records = {}
+            daily_stats = defaultdict(DailyAggregate)
+            file_dates = defaultdict(set)
+            file_rows = defaultdict(int)
+            
+            content_hashes = {}
+            records = iter_import_records([file_path for file_path, _ in changed], streaming, workers,
+                                          geometry_encoder, content_hashes, batch_size)
+            for file_path, prediction_record, region_record in records:
+                date = prediction_record[0]
+                if incremental and date not in daily_stats:
+                    # First time this date is seen in the run: drop its previous rows
+                    if catalog_ready:
+                        self._catalog_remove_date(cursor, date)
+                    cursor.execute('DELETE FROM predictions WHERE date = ?', (date,))
+                    cursor.execute('DELETE FROM daily_summary WHERE date = ?', (date,))
+                    cursor.execute('DELETE FROM town_daily_summary WHERE date = ?', (date,))
                 
-                # Prediction record
-                prediction_record = (
-                    date,
-                    props['townvill'],
-                    props['TOWN'],
-                    props.get('COUNTY', '臺南市'),  # Default to Tainan
-                    props.get('case_lag_future_14', 0),
-                    props['predicted_case_lag_future_14'],
-                    props['predicted_case_lag_future_14_binary'],
-                    props['predicted_case_lag_future_14_percentage'],
-                    props.get('X', 0),
-                    props.get('Y', 0),
-                    props.get('AREA', 0),
-                    geom_json
-                )
-                prediction_records.append(prediction_record)
+                if normalized:
+                    # Geometry lives in region_info only
+                    prediction_record = prediction_record[:-1] + (None,)
+                pending_records.append(prediction_record)
+                file_dates[file_path].add(date)
+                file_rows[file_path] += 1
                 
                 # Region info (unique regions only)
-                townvill = props['townvill']
+                townvill = region_record[0]
                 if townvill not in region_records:
-                    region_records[townvill] = (
-                        townvill,
-                        props.get('CODE1', ''),
-                        props.get('CODE2', ''),
-                        props.get('TOWN_ID', ''),
-                        props['TOWN'],
-                        props.get('COUNTY_ID', ''),
-                        props.get('COUNTY', '臺南市'),
-                        props.get('X', 0),
-                        props.get('Y', 0),
-                        props.get('AREA', 0),
-                        geom_json
-                    )
+                    region_records[townvill] = region_record
                 
                 # Daily statistics
-                pred_val = props['predicted_case_lag_future_14']
-                pred_percentage = props['predicted_case_lag_future_14_percentage']
+                daily_stats[date].add(prediction_record[5], prediction_record[7])
                 
-                daily_stats[date]['count'] += 1
-                daily_stats[date]['predictions'].append(pred_val)
-                
-                # Risk categorization based on percentage
-                if pred_percentage >= 50:
-                    daily_stats[date]['binary_counts'][2] += 1  # High risk
-                elif pred_percentage >= 20:
-                    daily_stats[date]['binary_counts'][1] += 1  # Medium risk
+                if streaming and len(pending_records) >= batch_size:
+                    cursor.executemany(PREDICTION_INSERT_SQL, pending_records)
+                    if columnar is not None:
+                        columnar.add_predictions(pending_records)
+                    total_predictions += len(pending_records)
+                    pending_records = []
+            
+            print(f"Importing {total_predictions + len(pending_records)} prediction records...")
+            
+            # Batch insert predictions
+            cursor.executemany(PREDICTION_INSERT_SQL, pending_records)
+            if columnar is not None:
+                columnar.add_predictions(pending_records)
+            total_predictions += len(pending_records)
+            pending_records = []
+            
+            print(f"Importing {len(region_records)} unique regions...")
+            
+            # Insert unique regions
+            cursor.executemany(REGION_INSERT_SQL, list(region_records.values()))
+            simplified_levels = self._build_simplified_geometries(cursor, geometry_encoder,
+                                                                  force=columnar is not None)
+            self._build_region_index(cursor)
+            town_geometries = self._build_town_geometries(cursor, geometry_encoder, force=columnar is not None)
+            
+            # Insert daily summaries
+            summary_records = [
+                stats.summary_record(date)
+                for date, stats in daily_stats.items() if stats.count
+            ]
+            
+            print(f"Importing {len(summary_records)} daily summaries...")
+            
+            cursor.executemany(SUMMARY_INSERT_SQL, summary_records)
+            
+            # Dates a changed file no longer contains are removed as well
+            removed_dates = set()
+            for file_path, _ in changed:
+                cursor.execute('SELECT dates FROM import_manifest WHERE path = ?', (manifest_key(file_path),))
+                entry = cursor.fetchone()
+                for stale_date in set(json.loads(entry[0]) if entry else []) - set(daily_stats):
+                    if catalog_ready:
+                        self._catalog_remove_date(cursor, stale_date)
+                    cursor.execute('DELETE FROM predictions WHERE date = ?', (stale_date,))
+                    cursor.execute('DELETE FROM daily_summary WHERE date = ?', (stale_date,))
+                    cursor.execute('DELETE FROM town_daily_summary WHERE date = ?', (stale_date,))
+                    removed_dates.add(stale_date)
+                    if columnar is not None:
+                        columnar.remove_date(stale_date)
+            
+            # District rollups: just the imported dates when they are already
+            # maintained, otherwise (full import, older database) all of them
+            rollup_dates = None
+            if incremental and self._get_metadata(cursor, 'town_rollups') == 'ready':
+                rollup_dates = set(daily_stats)
+                self._add_town_rollups(cursor, rollup_dates)
+            else:
+                self._rebuild_town_rollups(cursor)
+            
+            if columnar is not None:
+                columnar.write_regions(region_records.values())
+                columnar.write_region_levels(simplified_levels)
+                columnar.write_town_geometries(town_geometries)
+                if rollup_dates is None:
+                    cursor.execute('SELECT * FROM town_daily_summary')
+                    columnar.write_town_summaries(cursor.fetchall())
                 else:
-                    daily_stats[date]['binary_counts'][0] += 1  # Low risk
-        
-        print(f"Importing {len(prediction_records)} prediction records...")
-        
-        # Batch insert predictions
-        cursor.executemany('''
-            INSERT INTO predictions 
-            (date, townvill, town, county, case_lag_future_14, 
-             predicted_case_lag_future_14, predicted_case_lag_future_14_binary,
-             predicted_case_lag_future_14_percentage, x_coord, y_coord, area, geometry_json)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', prediction_records)
-        
-        print(f"Importing {len(region_records)} unique regions...")
-        
-        # Insert unique regions
-        cursor.executemany('''
-            INSERT OR REPLACE INTO region_info 
-            (townvill, code1, code2, town_id, town, county_id, county, 
-             x_coord, y_coord, area, geometry_json)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', list(region_records.values()))
-        
-        # Insert daily summaries
-        summary_records = []
-        for date, stats in daily_stats.items():
-            preds = stats['predictions']
-            if preds:
-                summary_records.append((
-                    date,
-                    stats['count'],
-                    sum(preds),
-                    sum(preds) / len(preds),
-                    max(preds),
-                    min(preds),
-                    stats['binary_counts'][2],  # High risk
-                    stats['binary_counts'][1],  # Medium risk
-                    stats['binary_counts'][0]   # Low risk
-                ))
-        
-        print(f"Importing {len(summary_records)} daily summaries...")
-        
-        cursor.executemany('''
-            INSERT INTO daily_summary 
-            (date, total_regions, total_predicted_cases, avg_prediction, 
-             max_prediction, min_prediction, high_risk_regions, 
-             medium_risk_regions, low_risk_regions)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', summary_records)
+                    cursor.execute('SELECT * FROM town_daily_summary WHERE date IN (SELECT value FROM json_each(?))',
+                                   (json.dumps(sorted(rollup_dates)),))
+                    columnar.write_town_summaries(cursor.fetchall(), rollup_dates | removed_dates)
+                columnar.write_daily_summaries(summary_records)
+                columnar.close()
+            
+            if catalog_ready:
+                self._catalog_add_dates(cursor, daily_stats)
+                self._catalog_update_dataset(cursor)
+            else:
+                self._create_tables(cursor)
+                self._rebuild_catalog(cursor)
+            
+            # Consecutive-date changes next to the imported dates; bulk loads wait
+            # for the indexes, since every pair is a join on (date, townvill)
+            if not bulk_load:
+                self._update_region_changes(cursor, set(daily_stats) | removed_dates if incremental else None)
+            
+            cursor.executemany(MANIFEST_UPSERT_SQL, [
+                (manifest_key(file_path), stat.st_size, stat.st_mtime_ns, content_hashes[file_path],
+                 json.dumps(sorted(file_dates[file_path])), file_rows[file_path])
+                for file_path, stat in changed
+            ])
+            self._bump_dataset_version(cursor)
+            
+            conn.commit()
+            
+            index_seconds = 0.0
+            if bulk_load:
+                print("Building indexes...")
+                index_started = time.perf_counter()
+                self._create_indexes(cursor)
+                self._update_region_changes(cursor)
+                conn.commit()
+                conn.execute('ANALYZE')
+                conn.execute('PRAGMA journal_mode = WAL')
+                conn.execute('PRAGMA synchronous = NORMAL')
+                index_seconds = time.perf_counter() - index_started
+        except BaseException:
+            if bulk_load:
+                self._abort_bulk_load(conn)
+            conn.close()
+            raise
         
-        conn.commit()
         conn.close()
+        self._clear_geometry_caches()
+        
+        elapsed = time.perf_counter() - started
+        import_stats = self._import_stats(len(changed), index_seconds, total_predictions,
+                                          len(region_records), len(daily_stats), elapsed)
         
         print(f"✅ Import complete!")
-        print(f"- Predictions: {len(prediction_records)}")
-        print(f"- Unique regions: {len(region_records)}")  
-        print(f"- Date range: {len(daily_stats)} days")
+        print(f"- Predictions: {import_stats['predictions']}")
+        print(f"- Unique regions: {import_stats['regions']}")  
+        print(f"- Date range: {import_stats['dates']} days")
+        print(f"- Elapsed: {elapsed:.1f}s ({import_stats['rows_per_second']:,.0f} rows/sec)")
+        if bulk_load:
+            print(f"- Index build + ANALYZE: {index_seconds:.1f}s")
+        if import_stats['peak_rss_mb'] is not None:
+            print(f"- Peak memory: {import_stats['peak_rss_mb']:.1f} MB")
+        
+        return import_stats
     
-    def get_predictions_by_date(self, date):
-        """Get all predictions for a specific date"""
-        conn = sqlite3.connect(str(self.db_path))
+    @staticmethod
+    def _import_stats(files, index_seconds, predictions, regions, dates, elapsed):
+        """Statistics dict returned by import_geojson_files (zero counts when nothing was imported)"""
+        return {
+            'files': files,
+            'index_seconds': index_seconds,
+            'predictions': predictions,
+            'regions': regions,
+            'dates': dates,
+            'elapsed_seconds': elapsed,
+            'rows_per_second': predictions / elapsed if elapsed > 0 else 0.0,
+            'peak_rss_mb': peak_memory_mb()
+        }
+    
+    def _build_simplified_geometries(self, cursor, geometry_encoder, tolerances=SIMPLIFY_TOLERANCES, force=False):
+        """Rebuild ``region_geometry_levels`` from region_info if the polygons changed
+
+        All regions are simplified together on shared-border arcs (see
+        ``region_topology``), so neighbours stay gap-free at every level.
+        Returns {tolerance: {townvill: GeoJSON text}}, or None when the stored
+        levels already match the current polygons.
+        """
+        cursor.execute('''
+            SELECT townvill, geometry_json FROM region_info
+            WHERE geometry_json IS NOT NULL ORDER BY townvill
+        ''')
+        texts = {townvill: geometry_text(stored) for townvill, stored in cursor.fetchall()}
+        
+        digest = hashlib.sha256(json.dumps(list(tolerances)).encode('utf-8'))
+        for townvill, text in texts.items():
+            digest.update(townvill.encode('utf-8'))
+            digest.update(text.encode('utf-8'))
+        source_hash = digest.hexdigest()
+        if not force and self._get_metadata(cursor, 'simplified_source_hash') == source_hash:
+            return None
+        
+        print(f"Simplifying {len(texts)} regions at {len(tolerances)} levels...")
+        topology = RegionTopology({townvill: json.loads(text) for townvill, text in texts.items()})
+        full_vertices = sum(len(arc) for arc in topology.arcs)
+        
+        cursor.execute('DELETE FROM region_geometry_levels')
+        levels = {}
+        for tolerance in tolerances:
+            arcs = topology.simplified_arcs(tolerance)
+            geometries = {townvill: topology.geometry(townvill, arcs) for townvill in texts}
+            levels[tolerance] = {
+                townvill: json.dumps(geometry, separators=(',', ':')) for townvill, geometry in geometries.items()
+            }
+            cursor.executemany(
+                'INSERT INTO region_geometry_levels (tolerance, townvill, geometry_json) VALUES (?, ?, ?)',
+                [(tolerance, townvill,
+                  geometry_encoder(geometries[townvill]) if geometry_encoder is not None else text)
+                 for townvill, text in levels[tolerance].items()]
+            )
+            vertices = sum(len(arc) for arc in arcs)
+            print(f"- tolerance {tolerance:g}°: {vertices:,} shared-arc vertices "
+                  f"({vertices / max(full_vertices, 1):.0%} of full)")
+        
+        self._set_metadata(cursor, 'simplify_tolerances', json.dumps(list(tolerances)))
+        self._set_metadata(cursor, 'simplified_source_hash', source_hash)
+        self._simplified_geometry_cache = {}
+        return levels
+    
+    @staticmethod
+    def _build_region_index(cursor):
+        """Refill region_rtree from region_info (REPLACE gives regions new rowids on import)"""
+        cursor.execute('SELECT rowid, geometry_json FROM region_info WHERE geometry_json IS NOT NULL')
+        entries = []
+        for rowid, stored in cursor.fetchall():
+            bbox = geometry_bbox(json.loads(geometry_text(stored)))
+            if bbox is not None:
+                entries.append((rowid,) + bbox_params(bbox))
+        
+        cursor.execute('DELETE FROM region_rtree')
+        cursor.executemany('INSERT INTO region_rtree (id, min_x, max_x, min_y, max_y) VALUES (?, ?, ?, ?, ?)',
+                           entries)
+        return len(entries)
+    
+    def build_region_index(self):
+        """Create or refresh the region R*Tree for an existing database"""
+        conn = self._write_connection()
+        cursor = conn.cursor()
+        self._create_tables(cursor)
+        count = self._build_region_index(cursor)
+        self._bump_dataset_version(cursor)  # bbox query results may change
+        conn.commit()
+        conn.close()
+        self._clear_geometry_caches()
+        print(f"✅ Indexed bounding boxes of {count} regions")
+        return count
+    
+    def build_simplified_geometries(self, tolerances=SIMPLIFY_TOLERANCES):
+        """Precompute simplified region polygons for an existing database"""
+        conn = self._write_connection()
+        cursor = conn.cursor()
+        self._create_tables(cursor)
+        levels = self._build_simplified_geometries(cursor, self._geometry_encoder(cursor), tolerances, force=True)
+        self._build_town_geometries(cursor, self._geometry_encoder(cursor), force=True)
+        self._bump_dataset_version(cursor)
+        conn.commit()
+        conn.close()
+        self._clear_geometry_caches()
+        return levels
+    
+    def normalize_geometry_storage(self, vacuum=True):
+        """Upgrade an existing database to normalized geometry storage
+
+        Makes sure every region has its polygon in ``region_info``, clears the
+        per-row copies in ``predictions`` and reclaims the space.
+        """
+        size_before = self.db_path.stat().st_size
+        conn = self._write_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
+            CREATE TABLE IF NOT EXISTS db_metadata (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        
+        # Regions that only exist in predictions (or lack a polygon) take one from there
+        cursor.execute('''
+            INSERT OR IGNORE INTO region_info (townvill, town, county, x_coord, y_coord, area)
+            SELECT townvill, town, county, x_coord, y_coord, area
+            FROM predictions GROUP BY townvill
+        ''')
+        cursor.execute('''
+            UPDATE region_info SET geometry_json = (
+                SELECT p.geometry_json FROM predictions p
+                WHERE p.townvill = region_info.townvill AND p.geometry_json IS NOT NULL
+                ORDER BY p.id LIMIT 1
+            )
+            WHERE geometry_json IS NULL
+        ''')
+        
+        cursor.execute('UPDATE predictions SET geometry_json = NULL WHERE geometry_json IS NOT NULL')
+        cleared = cursor.rowcount
+        self._set_metadata(cursor, 'geometry_storage', GEOMETRY_NORMALIZED)
+        self._bump_dataset_version(cursor)
+        conn.commit()
+        
+        if vacuum:
+            conn.execute('VACUUM')
+        conn.close()
+        self._clear_geometry_caches()
+        
+        size_after = self.db_path.stat().st_size
+        print(f"✅ Geometry normalized: cleared {cleared:,} per-row copies")
+        print(f"- Database size: {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB")
+        
+        return {'cleared_rows': cleared, 'size_before': size_before, 'size_after': size_after}
+    
+    def geometry_storage_report(self, precision=DEFAULT_GEOMETRY_PRECISION, compressions=('none', 'zlib', 'zstd')):
+        """Compare region geometry size and decode time: JSON text vs. the quantized codec"""
+        cursor = self._read_connection().cursor()
+        geometries = list(self._region_geometries(cursor).values())
+        if not geometries:
+            print("No region geometry to report on")
+            return {}
+        
+        def timed(function, items):
+            started = time.perf_counter()
+            for item in items:
+                function(item)
+            return time.perf_counter() - started
+        
+        report = {
+            'json': {
+                'bytes': sum(len(text.encode('utf-8')) for text in geometries),
+                'decode_seconds': timed(json.loads, geometries)
+            }
+        }
+        parsed = [json.loads(text) for text in geometries]
+        for compression in compressions:
+            if compression == 'zstd' and zstandard is None:
+                continue
+            blobs = [encode_geometry(geometry, precision, compression) for geometry in parsed]
+            report[f'quantized/{compression}'] = {
+                'bytes': sum(len(blob) for blob in blobs),
+                'decode_seconds': timed(decode_geometry, blobs),
+                'decode_json_seconds': timed(decode_geometry_json, blobs)
+            }
+        
+        json_bytes = report['json']['bytes']
+        print(f"📐 Geometry storage for {len(geometries)} regions (precision {precision}):")
+        for name, entry in report.items():
+            line = (f"  - {name:<16} {entry['bytes'] / 1e6:8.2f} MB "
+                    f"({entry['bytes'] / json_bytes:6.1%})  decode {entry['decode_seconds'] * 1000:8.1f} ms")
+            if 'decode_json_seconds' in entry:
+                line += f", to JSON text {entry['decode_json_seconds'] * 1000:8.1f} ms"
+            print(line)
+        
+        return report
+    
+    @cached_query
+    def get_predictions_by_date(self, date, tolerance=None, bbox=None):
+        """Get all predictions for a specific date
+
+        ``tolerance`` (degrees) picks a precomputed simplified geometry level.
+        ``bbox`` (min_x, min_y, max_x, max_y) keeps only regions whose bounding
+        box intersects it (see _bbox_filter).
+        """
+        cursor = self._read_connection().cursor()
+        bbox_sql, bbox_args = self._bbox_filter(cursor, bbox) if bbox else ('', ())
+        
+        cursor.execute(f'''
             SELECT date, townvill, town, predicted_case_lag_future_14,
                    predicted_case_lag_future_14_percentage, predicted_case_lag_future_14_binary,
                    case_lag_future_14, geometry_json
             FROM predictions 
-            WHERE date = ?
+            WHERE date = ?{' AND ' + bbox_sql if bbox else ''}
             ORDER BY predicted_case_lag_future_14_percentage DESC
-        ''', (date,))
-        
-        results = cursor.fetchall()
-        conn.close()
+        ''', (date,) + bbox_args)
         
+        results = self._fill_geometry(cursor, cursor.fetchall(), 1, tolerance)
         return results
     
+    @cached_query
     def get_predictions_by_region(self, townvill, start_date=None, end_date=None):
         """Get predictions for a specific region with optional date range"""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
+        cursor = self._read_connection().cursor()
         
         if start_date and end_date:
             cursor.execute('''
@@ -274,58 +1933,350 @@ class DiseaseDataDatabase:
             ''', (townvill,))
         
         results = cursor.fetchall()
-        conn.close()
+        return results
+
+    @cached_query
+    def get_predictions_by_regions(self, townvills, start_date=None, end_date=None):
+        """Get timelines for many regions in one query
+
+        Returns (townvill, date, predicted, percentage) rows ordered by
+        townvill then date. The ids are bound as one JSON array, so the query
+        is a single townvill index search whatever the number of regions.
+        """
+        cursor = self._read_connection().cursor()
+        date_filter = start_date and end_date
+
+        cursor.execute(f'''
+            SELECT townvill, date, predicted_case_lag_future_14,
+                   predicted_case_lag_future_14_percentage
+            FROM predictions
+            WHERE townvill IN (SELECT value FROM json_each(?)){' AND date BETWEEN ? AND ?' if date_filter else ''}
+            ORDER BY townvill, date
+        ''', (json.dumps(list(townvills)),) + ((start_date, end_date) if date_filter else ()))
+
+        results = cursor.fetchall()
+        return results
+
+    def iter_predictions(self, start_date=None, end_date=None, townvill=None, geometry=False,
+                         tolerance=None, bbox=None, chunk_size=DEFAULT_BATCH_SIZE):
+        """Yield prediction rows in chunks of ``chunk_size``, ordered by date then townvill
+
+        Rows hold EXPORT_COLUMNS, plus GeoJSON text when ``geometry`` is set
+        (``tolerance``/``bbox`` as in get_predictions_by_date). Only one chunk
+        is in memory at a time, and the open read statement keeps a consistent
+        snapshot for the whole iteration.
+        """
+        conditions = []
+        params = []
+        if start_date and end_date:
+            conditions.append('date BETWEEN ? AND ?')
+            params.extend([start_date, end_date])
+        if townvill:
+            conditions.append('townvill = ?')
+            params.append(townvill)
+        connection = self._read_connection()
+        cursor = connection.cursor()
+        if bbox:
+            bbox_sql, bbox_args = self._bbox_filter(cursor, bbox)
+            conditions.append(bbox_sql)
+            params.extend(bbox_args)
+        
+        cursor.execute(f'''
+            SELECT {', '.join(EXPORT_COLUMNS)}{', geometry_json' if geometry else ''}
+            FROM predictions
+            {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+            ORDER BY date, townvill
+        ''', params)
+        
+        # Geometry lookups need their own cursor so the scan is not reset
+        geometry_cursor = connection.cursor() if geometry else None
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield self._fill_geometry(geometry_cursor, rows, 1, tolerance) if geometry else rows
+        finally:
+            cursor.close()
+    
+    @cached_query
+    def get_series(self, start_date, end_date, field='percentage'):
+        """Dense date x region matrix of one attribute over a date range
+
+        Returns (dates, townvills, rows) where rows[i][j] is the value for
+        dates[i] and townvills[j], or None where a region has no row that day.
+        Built from a single scan of the date index.
+        """
+        column = SERIES_FIELDS[field]
+        cursor = self._read_connection().cursor()
+        
+        cursor.execute(f'''
+            SELECT date, townvill, {column}
+            FROM predictions
+            WHERE date BETWEEN ? AND ?
+            ORDER BY date
+        ''', (start_date, end_date))
+        
+        values = defaultdict(dict)
+        for date, townvill, value in cursor:
+            values[date][townvill] = value
         
+        dates = sorted(values)
+        townvills = sorted({townvill for by_region in values.values() for townvill in by_region})
+        rows = [[values[date].get(townvill) for townvill in townvills] for date in dates]
+        return dates, townvills, rows
+    
+    @staticmethod
+    def _ranked_regions_query(date, limit, after=None, town=None, min_percentage=None):
+        """SQL and parameters for get_ranked_regions"""
+        conditions = ['date = ?']
+        params = [date]
+        if town is not None:
+            conditions.append('town = ?')
+            params.append(town)
+        if min_percentage is not None:
+            conditions.append('predicted_case_lag_future_14_percentage >= ?')
+            params.append(min_percentage)
+        else:
+            conditions.append('predicted_case_lag_future_14_percentage IS NOT NULL')
+        if after is not None:
+            # Keyset: strictly after the last row of the previous page in (percentage DESC, townvill) order
+            conditions.append('predicted_case_lag_future_14_percentage <= ? '
+                              'AND (predicted_case_lag_future_14_percentage < ? OR townvill > ?)')
+            params.extend([after[0], after[0], after[1]])
+        
+        sql = f'''
+            SELECT townvill, town, predicted_case_lag_future_14_percentage,
+                   predicted_case_lag_future_14, predicted_case_lag_future_14_binary,
+                   case_lag_future_14
+            FROM predictions
+            WHERE {' AND '.join(conditions)}
+            ORDER BY predicted_case_lag_future_14_percentage DESC, townvill
+            LIMIT ?
+        '''
+        return sql, params + [limit]
+    
+    @cached_query
+    def get_ranked_regions(self, date, limit=50, after=None, town=None, min_percentage=None):
+        """Regions of a date ranked by predicted percentage, one page at a time
+
+        Returns (townvill, town, percentage, predicted, binary, actual) rows in
+        (percentage DESC, townvill) order. ``after`` is the (percentage,
+        townvill) of the previous page's last row. The rank index delivers rows
+        in this order and covers every selected column, so no sort runs and only
+        ``limit`` index entries are read.
+        """
+        cursor = self._read_connection().cursor()
+        cursor.execute(*self._ranked_regions_query(date, limit, after, town, min_percentage))
+        
+        results = cursor.fetchall()
         return results
     
-    def get_high_risk_regions(self, date, threshold=50):
-        """Get high-risk regions for a specific date"""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
+    def explain_ranking_plans(self):
+        """Print EXPLAIN QUERY PLAN for the ranking queries and check each reads a covering index without a temp B-tree sort
+
+        Missing prediction indexes are created first, so an older database
+        can be checked (and upgraded) in place.
+        """
+        conn = self._write_connection()
+        self._create_indexes(conn.cursor())
+        conn.commit()
+        conn.close()
         
-        cursor.execute('''
+        cursor = self._read_connection().cursor()
+        cursor.execute('SELECT date, town FROM predictions LIMIT 1')
+        date, town = cursor.fetchone() or ('', '')
+        queries = {
+            'top-k': self._ranked_regions_query(date, 50),
+            'top-k >= threshold': self._ranked_regions_query(date, 50, min_percentage=50),
+            'next page': self._ranked_regions_query(date, 50, after=(50.0, '')),
+            'town, next page': self._ranked_regions_query(date, 50, after=(50.0, ''), town=town),
+        }
+        
+        plans = {}
+        for name, (sql, params) in queries.items():
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plans[name] = [row[-1] for row in cursor.fetchall()]
+            sorts = any('TEMP B-TREE' in detail for detail in plans[name])
+            covered = any('COVERING INDEX' in detail for detail in plans[name])
+            print(f"{'✅' if covered and not sorts else '❌'} {name}: {'; '.join(plans[name])}")
+        
+        # What the covering index costs on disk (dbstat is an optional SQLite build feature)
+        try:
+            cursor.execute('''
+                SELECT name, SUM(pgsize) FROM dbstat
+                WHERE name = 'predictions' OR name = 'idx_predictions_rank'
+                GROUP BY name
+            ''')
+            sizes = dict(cursor.fetchall())
+            print(f"📦 idx_predictions_rank: {sizes.get('idx_predictions_rank', 0) / 1e6:.1f} MB "
+                  f"(predictions table: {sizes.get('predictions', 0) / 1e6:.1f} MB)")
+        except sqlite3.OperationalError:
+            pass
+        return plans
+    
+    @cached_query
+    def get_high_risk_regions(self, date, threshold=50, tolerance=None, bbox=None):
+        """Get high-risk regions for a specific date (``tolerance``/``bbox`` as in get_predictions_by_date)"""
+        cursor = self._read_connection().cursor()
+        bbox_sql, bbox_args = self._bbox_filter(cursor, bbox) if bbox else ('', ())
+        
+        cursor.execute(f'''
             SELECT townvill, town, predicted_case_lag_future_14_percentage,
                    geometry_json
             FROM predictions 
-            WHERE date = ? AND predicted_case_lag_future_14_percentage >= ?
+            WHERE date = ? AND predicted_case_lag_future_14_percentage >= ?{' AND ' + bbox_sql if bbox else ''}
             ORDER BY predicted_case_lag_future_14_percentage DESC
-        ''', (date, threshold))
+        ''', (date, threshold) + bbox_args)
         
-        results = cursor.fetchall()
-        conn.close()
+        results = self._fill_geometry(cursor, cursor.fetchall(), 0, tolerance)
+        return results
+    
+    @cached_query
+    def get_region_geometries(self, tolerance=None, bbox=None):
+        """Get the static region layer: (townvill, town, geometry_json) for every region (or those in ``bbox``)"""
+        cursor = self._read_connection().cursor()
+        bbox_sql, bbox_args = self._bbox_filter(cursor, bbox) if bbox else ('', ())
+        
+        cursor.execute(f'''
+            SELECT townvill, town, geometry_json
+            FROM region_info{' WHERE ' + bbox_sql if bbox else ''}
+            ORDER BY townvill
+        ''', bbox_args)
+        
+        results = self._fill_geometry(cursor, cursor.fetchall(), 0, tolerance)
+        return results
+    
+    @cached_query
+    def get_region_attributes_by_date(self, date, bbox=None):
+        """Get per-region prediction attributes for a date, without geometry"""
+        cursor = self._read_connection().cursor()
+        bbox_sql, bbox_args = self._bbox_filter(cursor, bbox) if bbox else ('', ())
         
+        cursor.execute(f'''
+            SELECT townvill, predicted_case_lag_future_14,
+                   predicted_case_lag_future_14_percentage, predicted_case_lag_future_14_binary,
+                   case_lag_future_14
+            FROM predictions
+            WHERE date = ?{' AND ' + bbox_sql if bbox else ''}
+            ORDER BY townvill
+        ''', (date,) + bbox_args)
+        
+        results = cursor.fetchall()
         return results
     
+    @cached_query
     def get_daily_summary(self, date):
         """Get daily summary statistics"""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
+        cursor = self._read_connection().cursor()
         
         cursor.execute('''
             SELECT * FROM daily_summary WHERE date = ?
         ''', (date,))
         
         result = cursor.fetchone()
-        conn.close()
-        
         return result
     
-    def get_available_dates(self):
-        """Get all available dates in the database"""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
+    @cached_query
+    def get_town_summaries(self, date):
+        """District rollups of a date: (town, *TOWN_SUMMARY_COLUMNS) rows ordered by town
+
+        Read from town_daily_summary; a database imported before the rollups
+        existed aggregates the date's predictions instead.
+        """
+        cursor = self._read_connection().cursor()
         
-        cursor.execute('SELECT DISTINCT date FROM predictions ORDER BY date')
-        results = [row[0] for row in cursor.fetchall()]
+        if self._get_metadata(cursor, 'town_rollups') == 'ready':
+            cursor.execute(f'''
+                SELECT town, {', '.join(TOWN_SUMMARY_COLUMNS)} FROM town_daily_summary
+                WHERE date = ? ORDER BY town
+            ''', (date,))
+            return cursor.fetchall()
+        cursor.execute(f'{TOWN_ROLLUP_SELECT} WHERE date = ? GROUP BY date, town ORDER BY town', (date,))
+        return [row[1:] for row in cursor.fetchall()]
+    
+    @cached_query
+    def get_town_geometries(self, tolerance=None):
+        """Dissolved district polygons: (town, county, total_regions, geometry_json) rows ordered by town
+
+        ``tolerance`` picks a simplification level as in get_predictions_by_date.
+        Empty until the polygons are built (import or --build-town-rollups).
+        """
+        cursor = self._read_connection().cursor()
         
-        conn.close()
+        level = pick_level(self._simplification_levels(cursor), tolerance)
+        try:
+            cursor.execute('''
+                SELECT town, county, total_regions, geometry_json FROM town_geometry
+                WHERE tolerance = ? ORDER BY town
+            ''', (level or 0.0,))
+        except sqlite3.OperationalError:
+            return []
+        results = [row[:-1] + (geometry_text(row[-1]),) for row in cursor.fetchall()]
         return results
     
-    def get_database_stats(self):
-        """Get database statistics"""
-        conn = sqlite3.connect(str(self.db_path))
-        cursor = conn.cursor()
+    @cached_query
+    def get_region_changes(self, from_date, to_date, tolerance=DEFAULT_CHANGE_TOLERANCE):
+        """Regions whose prediction changed between two dates, ordered by townvill
+
+        Rows are (townvill, predicted, percentage, binary, actual) as of
+        ``to_date``, with None values for regions missing on ``to_date``; see
+        region_changed() for what counts as a change. Consecutive dates at the
+        default tolerance come from the precomputed region_changes table.
+        """
+        cursor = self._read_connection().cursor()
+        
+        try:
+            cursor.execute('''
+                SELECT 1 FROM region_change_pairs WHERE from_date = ? AND to_date = ? AND tolerance = ?
+            ''', (from_date, to_date, tolerance))
+            precomputed = cursor.fetchone() is not None
+        except sqlite3.OperationalError:
+            precomputed = False
+        
+        if precomputed:
+            cursor.execute('''
+                SELECT townvill, predicted_case_lag_future_14, predicted_case_lag_future_14_percentage,
+                       predicted_case_lag_future_14_binary, case_lag_future_14
+                FROM region_changes WHERE from_date = ? AND to_date = ?
+                ORDER BY townvill
+            ''', (from_date, to_date))
+        else:
+            cursor.execute(f'{REGION_CHANGES_SQL} ORDER BY 1',
+                           {'from_date': from_date, 'to_date': to_date, 'tolerance': tolerance})
+        results = cursor.fetchall()
+        return results
+    
+    @cached_query
+    def get_available_dates(self):
+        """Get all available dates in the database (from the catalog when it exists)"""
+        cursor = self._read_connection().cursor()
         
+        if self._catalog_ready(cursor):
+            cursor.execute('SELECT date FROM catalog_dates ORDER BY date')
+        else:
+            cursor.execute('SELECT DISTINCT date FROM predictions ORDER BY date')
+        results = [row[0] for row in cursor.fetchall()]
+        return results
+    
+    @staticmethod
+    def _cataloged_stats(cursor):
+        """get_database_stats from the catalog's dataset row (one primary key lookup)"""
+        cursor.execute('''
+            SELECT total_predictions, total_dates, total_regions, min_date, max_date
+            FROM catalog_dataset WHERE id = 1
+        ''')
+        total_predictions, total_dates, total_regions, min_date, max_date = cursor.fetchone()
+        return {
+            'total_predictions': total_predictions,
+            'total_dates': total_dates,
+            'total_regions': total_regions,
+            'date_range': (min_date, max_date)
+        }
+    
+    @staticmethod
+    def _scanned_stats(cursor):
+        """get_database_stats counted from predictions (full scans)"""
         cursor.execute('SELECT COUNT(*) FROM predictions')
         total_predictions = cursor.fetchone()[0]
         
@@ -338,19 +2289,94 @@ class DiseaseDataDatabase:
         cursor.execute('SELECT MIN(date), MAX(date) FROM predictions')
         date_range = cursor.fetchone()
         
-        conn.close()
-        
         return {
             'total_predictions': total_predictions,
             'total_dates': total_dates,
             'total_regions': total_regions,
             'date_range': date_range
         }
+    
+    @cached_query
+    def get_database_stats(self):
+        """Get database statistics (from the catalog when it exists, else by scanning)"""
+        cursor = self._read_connection().cursor()
+        
+        if self._catalog_ready(cursor):
+            return self._cataloged_stats(cursor)
+        return self._scanned_stats(cursor)
+
+
+def benchmark_bulk_load(data_dir="data", work_dir="output/database", **import_options):
+    """Import the same files with and without bulk-load mode and report both timings"""
+    timings = {}
+    for bulk_load in (False, True):
+        label = 'bulk' if bulk_load else 'regular'
+        db_path = Path(work_dir) / f"benchmark_{label}.db"
+        for suffix in ('', '-wal', '-shm'):
+            Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+        
+        db = DiseaseDataDatabase(db_path)
+        db.create_database_schema()
+        timings[label] = db.import_geojson_files(data_dir, bulk_load=bulk_load, **import_options)['elapsed_seconds']
+    
+    print(f"\n⏱️  Import time: regular {timings['regular']:.1f}s, "
+          f"bulk-load {timings['bulk']:.1f}s "
+          f"({timings['regular'] / max(timings['bulk'], 1e-9):.2f}x)")
+    return timings
+
+
+# Maintenance commands: flag -> (description, handler called with the database)
+COMMANDS = {
+    '--normalize-geometry': ("Upgrade the database to normalized geometry storage in place",
+                             lambda db: db.normalize_geometry_storage()),
+    '--simplify-geometry': ("Precompute the simplified geometry levels",
+                            lambda db: db.build_simplified_geometries()),
+    '--index-regions': ("Build the region bounding-box R*Tree for bbox queries",
+                        lambda db: db.build_region_index()),
+    '--explain-ranking': ("Show the ranking query plans and the rank index size",
+                          lambda db: db.explain_ranking_plans()),
+    '--rebuild-catalog': ("Rebuild the catalog tables from predictions",
+                          lambda db: db.rebuild_catalog()),
+    '--build-town-rollups': ("Recompute district rollups and dissolved district polygons",
+                             lambda db: db.build_town_rollups()),
+    '--build-region-changes': ("Precompute the changes between consecutive dates",
+                               lambda db: db.build_region_changes()),
+    '--check-catalog': ("Check the catalog against predictions (exit status 1 on mismatch)",
+                        lambda db: sys.exit(0 if db.check_catalog()['ok'] else 1)),
+    '--geometry-report': ("Compare geometry storage size and decode time per encoding",
+                          lambda db: db.geometry_storage_report()),
+    '--benchmark-bulk-load': ("Time a regular and a bulk-load import of data/ into output/database",
+                              lambda db: benchmark_bulk_load(streaming=True)),
+}
+
+
+def print_usage(file=None):
+    width = max(len(flag) for flag in COMMANDS)
+    print("Usage: python database_manager.py [command]", file=file)
+    print("Without a command, rebuilds the database from data/*.geojson.", file=file)
+    print("\nCommands:", file=file)
+    for flag, (description, _) in COMMANDS.items():
+        print(f"  {flag:<{width}}  {description}", file=file)
+
 
 def main():
-    """Example usage"""
+    """Rebuild the database from data/*.geojson, or run one maintenance command (see --help)"""
+    args = sys.argv[1:]
+    if args in (['-h'], ['--help']):
+        print_usage()
+        return
+    if len(args) > 1 or (args and args[0] not in COMMANDS):
+        # Never fall through to a full rebuild on a mistyped flag
+        print(f"❌ Unknown arguments: {' '.join(args)}", file=sys.stderr)
+        print_usage(sys.stderr)
+        sys.exit(2)
+    
     db = DiseaseDataDatabase()
     
+    if args:
+        COMMANDS[args[0]][1](db)
+        return
+    
     # Create database schema
     db.create_database_schema()
     
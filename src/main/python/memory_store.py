@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+In-memory prediction store for multi-worker serving
+Holds every prediction attribute as a dates x regions numpy matrix and answers
+the per-date and per-region queries from it, delegating geometry and summaries
+to the wrapped backend (DiseaseDataDatabase or ColumnarDiseaseData).
+
+Workers share one copy of the matrices in either of two ways:
+- with a snapshot directory (e.g. under /dev/shm) the matrices are written
+  once per dataset version as .npy files and memory-mapped read-only, so every
+  process maps the same pages;
+- without one, load the app before forking (``gunicorn --preload``) and the
+  arrays are shared copy-on-write, since numpy buffers are never written.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:  # Optional: only needed for the in-memory store
+    np = None
+
+from database_manager import DEFAULT_CHANGE_TOLERANCE, SERIES_FIELDS, geometry_bbox
+
+# Seconds between dataset version checks against the backend
+DEFAULT_CHECK_INTERVAL = 5.0
+
+# Stored value for a NULL in the integer matrices: int8 binary flags and
+# int32 actual case counts (counts are never negative)
+INT_NULL = -1
+
+MATRIX_FILES = ['present', 'predicted', 'percentage', 'binary', 'actual', 'bbox']
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("The in-memory store requires the 'numpy' package")
+
+
+def _int_value(value):
+    return None if value == INT_NULL else value
+
+
+def _float_value(value):
+    return None if value != value else value  # NaN marks NULL
+
+
+class PredictionMatrix:
+    """One dataset version: dates x regions attribute matrices plus the axis labels
+
+    Never modified after construction, so readers need no locking and a reload
+    only swaps the reference.
+    """
+
+    def __init__(self, version, dates, townvills, towns, arrays):
+        self.version = version
+        self.dates = dates
+        self.townvills = townvills
+        self.towns = towns
+        self.date_index = {date: i for i, date in enumerate(dates)}
+        self.region_index = {townvill: j for j, townvill in enumerate(townvills)}
+        for name in MATRIX_FILES:
+            setattr(self, name, arrays[name])
+        self.geometries = {}  # simplification level -> {townvill: GeoJSON text}
+
+    @classmethod
+    def from_backend(cls, backend, version):
+        """Build the matrices from one series scan per attribute
+
+        A region counts as present on a date when any attribute is non-NULL.
+        """
+        dates = backend.get_available_dates()
+        start, end = (dates[0], dates[-1]) if dates else ('', '')
+        series = {field: backend.get_series(start, end, field) for field in SERIES_FIELDS}
+        series_dates, townvills, _ = series['percentage']
+
+        values = {field: np.array(rows, dtype=float).reshape(len(series_dates), len(townvills))
+                  for field, (_, _, rows) in series.items()}
+        arrays = {
+            'present': np.logical_or.reduce([~np.isnan(matrix) for matrix in values.values()]),
+            'predicted': values['predicted'],
+            'percentage': values['percentage'],
+            'binary': np.nan_to_num(values['binary'], nan=INT_NULL).astype(np.int8),
+            'actual': np.nan_to_num(values['actual'], nan=INT_NULL).astype(np.int32),
+            'bbox': np.full((len(townvills), 4), np.nan)
+        }
+
+        regions = {townvill: (town, geometry_json) for townvill, town, geometry_json in backend.get_region_geometries()}
+        towns = []
+        for j, townvill in enumerate(townvills):
+            town, geometry_json = regions.get(townvill, (None, None))
+            towns.append(town)
+            bbox = geometry_bbox(json.loads(geometry_json)) if geometry_json else None
+            if bbox:
+                arrays['bbox'][j] = bbox
+        return cls(version, series_dates, townvills, towns, arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map a snapshot written by save()"""
+        with open(path / "index.json", encoding='utf-8') as f:
+            index = json.load(f)
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode='r') for name in MATRIX_FILES}
+        return cls(index['version'], index['dates'], index['townvills'], index['towns'], arrays)
+
+    def save(self, path):
+        """Write the snapshot to a temporary directory and rename it into place
+
+        The rename is atomic, so other processes either see the complete
+        snapshot or none. If another process got there first its copy is kept.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=f".{path.name}-", dir=path.parent))
+        try:
+            for name in MATRIX_FILES:
+                np.save(staging / f"{name}.npy", getattr(self, name))
+            with open(staging / "index.json", 'w', encoding='utf-8') as f:
+                json.dump({'version': self.version, 'dates': self.dates,
+                           'townvills': self.townvills, 'towns': self.towns}, f, ensure_ascii=False)
+            os.rename(staging, path)
+        except OSError:
+            if not (path / "index.json").exists():
+                raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def region_mask(self, bbox):
+        """Boolean mask of regions whose bounding box intersects (min_x, min_y, max_x, max_y)"""
+        min_x, min_y, max_x, max_y = bbox
+        boxes = self.bbox
+        return (boxes[:, 2] >= min_x) & (boxes[:, 0] <= max_x) & (boxes[:, 3] >= min_y) & (boxes[:, 1] <= max_y)
+
+
+class InMemoryDiseaseData:
+    """DiseaseDataDatabase method surface answered from a PredictionMatrix
+
+    Methods not defined here (geometry levels, summaries, imports) go to the
+    wrapped backend. Every ``check_interval`` seconds the backend's dataset
+    version is compared with the loaded one; on a change a new matrix is built
+    (or mapped from ``snapshot_dir``) and swapped in, while requests already
+    running finish on the old one.
+    """
+
+    def __init__(self, backend, snapshot_dir=None, check_interval=DEFAULT_CHECK_INTERVAL):
+        _require_numpy()
+        self.backend = backend
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir else None
+        self.check_interval = check_interval
+        self._matrix = None
+        self._checked_at = 0.0
+        self._reload_lock = threading.Lock()
+        self._matrix = self._load(backend.get_dataset_version())
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def _load(self, version):
+        """Map this version's snapshot if another process already wrote it, otherwise build it"""
+        start_time = time.time()
+        if self.snapshot_dir is None:
+            matrix = PredictionMatrix.from_backend(self.backend, version)
+        else:
+            path = self.snapshot_dir / str(version)
+            if not (path / "index.json").exists():
+                PredictionMatrix.from_backend(self.backend, version).save(path)
+            matrix = PredictionMatrix.load(path)
+            for old in self.snapshot_dir.iterdir():
+                if old.is_dir() and old.name != path.name and not old.name.startswith('.'):
+                    shutil.rmtree(old, ignore_errors=True)
+
+        self._checked_at = time.monotonic()
+        print(f"🧠 Loaded {len(matrix.dates)} dates x {len(matrix.townvills)} regions into memory "
+              f"(version {version}) in {time.time() - start_time:.2f}s")
+        return matrix
+
+    def _current(self):
+        """The loaded matrix, reloaded first if the backend's dataset version moved on"""
+        matrix = self._matrix
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return matrix
+
+        with self._reload_lock:
+            matrix = self._matrix
+            if time.monotonic() - self._checked_at >= self.check_interval:
+                version = self.backend.get_dataset_version()
+                if version != matrix.version:
+                    matrix = self._matrix = self._load(version)
+                self._checked_at = time.monotonic()
+        return matrix
+
+    def reload(self):
+        """Check the dataset version now instead of waiting for the next interval"""
+        self._checked_at = 0.0
+        return self._current().version
+
+    def _geometries(self, matrix, tolerance):
+        level = self.backend.simplification_level(tolerance)
+        if level not in matrix.geometries:
+            matrix.geometries[level] = {
+                townvill: geometry_json for townvill, _, geometry_json in self.backend.get_region_geometries(level)
+            }
+        return matrix.geometries[level]
+
+    def _date_columns(self, matrix, date, bbox=None):
+        """Row index and the region columns present on a date (optionally within bbox)"""
+        i = matrix.date_index.get(date)
+        if i is None:
+            return None, np.empty(0, dtype=np.intp)
+        mask = np.asarray(matrix.present[i])
+        if bbox:
+            mask = mask & matrix.region_mask(bbox)
+        return i, np.flatnonzero(mask)
+
+    def get_dataset_version(self):
+        """Version of the loaded matrix (checks the backend for a newer one)"""
+        return self._current().version
+
+    def get_predictions_by_date(self, date, tolerance=None, bbox=None):
+        """Get all predictions for a specific date (see DiseaseDataDatabase.get_predictions_by_date)"""
+        matrix = self._current()
+        i, columns = self._date_columns(matrix, date, bbox)
+        if not len(columns):
+            return []
+
+        percentage = np.asarray(matrix.percentage[i, columns])
+        columns = columns[np.argsort(-np.nan_to_num(percentage, nan=-np.inf), kind='stable')]
+        geometries = self._geometries(matrix, tolerance)
+        return [
+            (date, matrix.townvills[j], matrix.towns[j], _float_value(predicted), _float_value(percentage),
+             _int_value(binary), _int_value(actual), geometries.get(matrix.townvills[j]))
+            for j, predicted, percentage, binary, actual in zip(
+                columns.tolist(), matrix.predicted[i, columns].tolist(), matrix.percentage[i, columns].tolist(),
+                matrix.binary[i, columns].tolist(), matrix.actual[i, columns].tolist())
+        ]
+
+    @staticmethod
+    def _region_rows(matrix, townvill, start_date, end_date):
+        """(date, predicted, percentage) rows of one region, ordered by date"""
+        j = matrix.region_index.get(townvill)
+        if j is None:
+            return []
+
+        rows = np.flatnonzero(matrix.present[:, j])
+        return [
+            (matrix.dates[i], _float_value(predicted), _float_value(percentage))
+            for i, predicted, percentage in zip(
+                rows.tolist(), matrix.predicted[rows, j].tolist(), matrix.percentage[rows, j].tolist())
+            if not (start_date and end_date) or start_date <= matrix.dates[i] <= end_date
+        ]
+
+    def get_predictions_by_region(self, townvill, start_date=None, end_date=None):
+        """Get predictions for a specific region with optional date range"""
+        return self._region_rows(self._current(), townvill, start_date, end_date)
+
+    def get_predictions_by_regions(self, townvills, start_date=None, end_date=None):
+        """Get timelines for many regions: (townvill, date, predicted, percentage) rows by townvill, date"""
+        matrix = self._current()
+        return [
+            (townvill,) + row
+            for townvill in sorted(set(townvills))
+            for row in self._region_rows(matrix, townvill, start_date, end_date)
+        ]
+
+    def get_series(self, start_date, end_date, field='percentage'):
+        """Dense date x region matrix of one attribute (see DiseaseDataDatabase.get_series)"""
+        matrix = self._current()
+        rows = [i for i, date in enumerate(matrix.dates) if start_date <= date <= end_date]
+        present = np.asarray(matrix.present[rows])
+        columns = np.flatnonzero(present.any(axis=0))
+        present = present[:, columns]
+
+        values = np.asarray(getattr(matrix, field)[rows][:, columns])
+        convert = _int_value if np.issubdtype(values.dtype, np.integer) else _float_value
+        return (
+            [matrix.dates[i] for i in rows],
+            [matrix.townvills[j] for j in columns.tolist()],
+            [
+                [convert(value) if has_row else None for value, has_row in zip(value_row, present_row)]
+                for value_row, present_row in zip(values.tolist(), present.tolist())
+            ]
+        )
+
+    def get_high_risk_regions(self, date, threshold=50, tolerance=None, bbox=None):
+        """Get high-risk regions for a specific date (``tolerance``/``bbox`` as in get_predictions_by_date)"""
+        return [
+            (townvill, town, percentage, geometry_json)
+            for _, townvill, town, _, percentage, _, _, geometry_json
+            in self.get_predictions_by_date(date, tolerance, bbox)
+            if percentage is not None and percentage >= threshold
+        ]
+
+    def get_ranked_regions(self, date, limit=50, after=None, town=None, min_percentage=None):
+        """Regions of a date ranked by percentage (see DiseaseDataDatabase.get_ranked_regions)"""
+        matrix = self._current()
+        i, columns = self._date_columns(matrix, date)
+        percentage = np.asarray(matrix.percentage[i, columns]) if len(columns) else np.empty(0)
+        keep = ~np.isnan(percentage)
+        if min_percentage is not None:
+            keep &= percentage >= min_percentage
+        if after is not None:
+            # Columns are in townvill order, so comparing townvill is comparing column positions
+            after_column = np.searchsorted(matrix.townvills, after[1], side='right')
+            keep &= (percentage < after[0]) | ((percentage == after[0]) & (columns >= after_column))
+        if town is not None:
+            keep &= np.array([matrix.towns[j] == town for j in columns.tolist()], dtype=bool)
+        columns, percentage = columns[keep], percentage[keep]
+        columns = columns[np.lexsort((columns, -percentage))][:limit]
+
+        return [
+            (matrix.townvills[j], matrix.towns[j], percentage, _float_value(predicted),
+             _int_value(binary), _int_value(actual))
+            for j, percentage, predicted, binary, actual in zip(
+                columns.tolist(), matrix.percentage[i, columns].tolist(), matrix.predicted[i, columns].tolist(),
+                matrix.binary[i, columns].tolist(), matrix.actual[i, columns].tolist())
+        ]
+
+    def get_region_attributes_by_date(self, date, bbox=None):
+        """Get per-region prediction attributes for a date, without geometry"""
+        matrix = self._current()
+        i, columns = self._date_columns(matrix, date, bbox)
+        return [
+            (matrix.townvills[j], _float_value(predicted), _float_value(percentage),
+             _int_value(binary), _int_value(actual))
+            for j, predicted, percentage, binary, actual in zip(
+                columns.tolist(), matrix.predicted[i, columns].tolist(), matrix.percentage[i, columns].tolist(),
+                matrix.binary[i, columns].tolist(), matrix.actual[i, columns].tolist())
+        ] if len(columns) else []
+
+    def get_region_changes(self, from_date, to_date, tolerance=DEFAULT_CHANGE_TOLERANCE):
+        """Regions whose prediction changed between two dates (see DiseaseDataDatabase.get_region_changes)
+
+        Both date rows are compared column-wise in one vectorized pass.
+        """
+        matrix = self._current()
+        i, k = matrix.date_index.get(from_date), matrix.date_index.get(to_date)
+        absent = np.zeros(len(matrix.townvills), dtype=bool)
+        before = np.asarray(matrix.present[i]) if i is not None else absent
+        after = np.asarray(matrix.present[k]) if k is not None else absent
+
+        changed = before != after
+        if i is not None and k is not None:
+            old, new = np.asarray(matrix.percentage[i]), np.asarray(matrix.percentage[k])
+            with np.errstate(invalid='ignore'):
+                changed |= before & after & (
+                    (np.asarray(matrix.binary[i]) != np.asarray(matrix.binary[k]))
+                    | (np.asarray(matrix.actual[i]) != np.asarray(matrix.actual[k]))
+                    | ((old >= 50) != (new >= 50)) | ((old >= 20) != (new >= 20))
+                    | (np.abs(new - old) > tolerance) | (np.isnan(old) != np.isnan(new))
+                )
+
+        columns = np.flatnonzero(changed)
+        rows = []
+        for j in columns.tolist():
+            if after[j]:
+                rows.append((matrix.townvills[j], _float_value(float(matrix.predicted[k, j])),
+                             _float_value(float(matrix.percentage[k, j])), _int_value(int(matrix.binary[k, j])),
+                             _int_value(int(matrix.actual[k, j]))))
+            else:
+                rows.append((matrix.townvills[j], None, None, None, None))
+        return rows
+
+    def get_available_dates(self):
+        """Get all available dates"""
+        return list(self._current().dates)
+
+    def get_database_stats(self):
+        """Get dataset statistics from the loaded matrix"""
+        matrix = self._current()
+        present = np.asarray(matrix.present)
+        return {
+            'total_predictions': int(present.sum()),
+            'total_dates': len(matrix.dates),
+            'total_regions': int(present.any(axis=0).sum()),
+            'date_range': (matrix.dates[0], matrix.dates[-1]) if matrix.dates else (None, None)
+        }
+
+    def close(self):
+        """Drop the matrix and close the wrapped backend"""
+        self._matrix = None
+        self.backend.close()
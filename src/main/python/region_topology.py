@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""
+Shared-border topology for region polygons
+Splits every region ring into arcs that are stored once and shared by the
+neighbours on either side, so simplification never opens gaps or slivers
+between regions, and TopoJSON output encodes each border once
+"""
+import json
+
+# Simplification levels precomputed at import, in degrees (roughly 1 m, 4 m,
+# 18 m and 70 m at Tainan's latitude)
+SIMPLIFY_TOLERANCES = (0.00001, 0.00004, 0.00016, 0.00064)
+
+# Allowed deviation in screen pixels when a zoom level picks its tolerance
+TOLERANCE_PIXELS = 0.5
+
+
+def tolerance_for_zoom(zoom):
+    """Tolerance in degrees that stays under TOLERANCE_PIXELS at a web-map zoom"""
+    return 360.0 / (256 << int(zoom)) * TOLERANCE_PIXELS
+
+
+def pick_level(levels, tolerance):
+    """Coarsest stored level not exceeding the requested tolerance, or None for full resolution"""
+    if tolerance is None:
+        return None
+    usable = [level for level in levels if level <= tolerance]
+    return max(usable) if usable else None
+
+
+def _segment_distance2(point, start, end):
+    """Squared distance from point to the segment start-end"""
+    px, py = point
+    sx, sy = start
+    dx, dy = end[0] - sx, end[1] - sy
+    length2 = dx * dx + dy * dy
+    if length2 == 0:
+        return (px - sx) ** 2 + (py - sy) ** 2
+    t = max(0.0, min(1.0, ((px - sx) * dx + (py - sy) * dy) / length2))
+    return (px - sx - t * dx) ** 2 + (py - sy - t * dy) ** 2
+
+
+def simplify_arc(points, tolerance):
+    """Douglas-Peucker simplification of an arc with fixed end points
+
+    The farthest interior point is always kept (two for closed arcs), so a
+    ring built from simplified arcs keeps at least three distinct vertices.
+    """
+    count = len(points)
+    if count <= 3:
+        return list(points)
+    if points[0] == points[-1]:
+        start = points[0]
+        split = max(range(1, count - 1),
+                    key=lambda i: (points[i][0] - start[0]) ** 2 + (points[i][1] - start[1]) ** 2)
+        return simplify_arc(points[:split + 1], tolerance)[:-1] + simplify_arc(points[split:], tolerance)
+
+    tolerance2 = tolerance * tolerance
+    keep = [False] * count
+    keep[0] = keep[-1] = True
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        index, max_distance = None, -1.0
+        for i in range(first + 1, last):
+            distance = _segment_distance2(points[i], points[first], points[last])
+            if distance > max_distance:
+                index, max_distance = i, distance
+        if index is None:
+            continue
+        if max_distance > tolerance2 or (first == 0 and last == count - 1):
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def geometry_polygons(geometry):
+    """List of polygons (lists of rings) from a Polygon/MultiPolygon geometry dict"""
+    if not geometry:
+        return []
+    if geometry.get('type') == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry.get('type') == 'MultiPolygon':
+        return geometry['coordinates']
+    return []
+
+
+def _open_ring(ring):
+    """Ring as (x, y) tuples without the closing point or repeated vertices"""
+    points = []
+    for coordinate in ring:
+        point = (coordinate[0], coordinate[1])
+        if not points or point != points[-1]:
+            points.append(point)
+    while len(points) > 1 and points[0] == points[-1]:
+        points.pop()
+    return points
+
+
+class RegionTopology:
+    """Arc topology of a set of region geometries
+
+    ``arcs`` holds each border once as a list of (x, y) points; a region ring
+    is a list of arc references, where ``~i`` means arc ``i`` reversed (the
+    TopoJSON convention). Shared vertices are matched exactly, which holds for
+    polygons cut from the same survey.
+    """
+
+    def __init__(self, geometries):
+        """``geometries`` maps a region id to its GeoJSON geometry dict"""
+        self.arcs = []
+        self._arc_index = {}
+        self.regions = {}
+
+        rings = {
+            region_id: [[_open_ring(ring) for ring in polygon] for polygon in geometry_polygons(geometry)]
+            for region_id, geometry in geometries.items()
+        }
+
+        # A vertex is a junction where more than two distinct neighbours meet
+        neighbours = {}
+        for polygons in rings.values():
+            for polygon in polygons:
+                for ring in polygon:
+                    for i, point in enumerate(ring):
+                        adjacent = neighbours.setdefault(point, set())
+                        adjacent.add(ring[i - 1])
+                        adjacent.add(ring[(i + 1) % len(ring)])
+        junctions = {point for point, adjacent in neighbours.items() if len(adjacent) > 2}
+
+        for region_id, polygons in rings.items():
+            self.regions[region_id] = (
+                geometries[region_id].get('type'),
+                [[self._ring_arcs(ring, junctions) for ring in polygon if len(ring) >= 3]
+                 for polygon in polygons]
+            )
+
+    def _arc_ref(self, points):
+        """Index of an arc, adding it if new; reversed duplicates share one arc"""
+        key = tuple(points)
+        if key in self._arc_index:
+            return self._arc_index[key]
+        reversed_key = key[::-1]
+        if reversed_key in self._arc_index:
+            return ~self._arc_index[reversed_key]
+        self._arc_index[key] = len(self.arcs)
+        self.arcs.append(list(points))
+        return len(self.arcs) - 1
+
+    def _ring_arcs(self, ring, junctions):
+        cuts = [i for i, point in enumerate(ring) if point in junctions]
+        if not cuts:
+            # Free-standing ring: one closed arc, rotated to a canonical start
+            start = ring.index(min(ring))
+            rotated = ring[start:] + ring[:start]
+            return [self._arc_ref(rotated + [rotated[0]])]
+
+        rotated = ring[cuts[0]:] + ring[:cuts[0]]
+        offsets = [i - cuts[0] for i in cuts] + [len(ring)]
+        closed = rotated + [rotated[0]]
+        return [self._arc_ref(closed[offsets[k]:offsets[k + 1] + 1]) for k in range(len(cuts))]
+
+    def arc_points(self, ref, arcs=None):
+        arcs = self.arcs if arcs is None else arcs
+        return arcs[ref] if ref >= 0 else arcs[~ref][::-1]
+
+    def ring_coordinates(self, refs, arcs=None):
+        """Closed coordinate ring from arc references"""
+        coordinates = []
+        for ref in refs:
+            points = self.arc_points(ref, arcs)
+            coordinates.extend(points if not coordinates else points[1:])
+        return [list(point) for point in coordinates]
+
+    def geometry(self, region_id, arcs=None):
+        """GeoJSON geometry dict of a region, optionally from substituted (e.g. simplified) arcs"""
+        geometry_type, polygons = self.regions[region_id]
+        coordinates = []
+        for polygon in polygons:
+            rings = [self.ring_coordinates(refs, arcs) for refs in polygon]
+            rings = [ring for ring in rings if len(ring) >= 4]
+            if rings:
+                coordinates.append(rings)
+        if geometry_type == 'MultiPolygon':
+            return {"type": "MultiPolygon", "coordinates": coordinates}
+        return {"type": "Polygon", "coordinates": coordinates[0] if coordinates else []}
+
+    def simplified_arcs(self, tolerance):
+        return [simplify_arc(arc, tolerance) for arc in self.arcs]
+
+    def simplified(self, tolerance):
+        """region id -> geometry with every shared border simplified once"""
+        arcs = self.simplified_arcs(tolerance)
+        return {region_id: self.geometry(region_id, arcs) for region_id in self.regions}
+
+    def merged(self, region_ids, arcs=None):
+        """Dissolved GeoJSON geometry of a group of regions (e.g. the villages of a district)
+
+        Arcs used twice within the group are internal borders and dropped; the
+        remaining arcs are chained end to end into rings, which are sorted into
+        shells (counter-clockwise) and holes (clockwise) by containment.
+        """
+        uses = {}
+        for region_id in region_ids:
+            for polygon in self.regions[region_id][1]:
+                for refs in polygon:
+                    for ref in refs:
+                        index = ref if ref >= 0 else ~ref
+                        uses[index] = uses.get(index, 0) + 1
+        outline = [index for index, count in uses.items() if count == 1]
+
+        ends = {}
+        for index in outline:
+            points = self.arc_points(index, arcs)
+            ends.setdefault(points[0], []).append(index)
+            ends.setdefault(points[-1], []).append(index)
+
+        rings = []
+        remaining = set(outline)
+        for index in outline:
+            if index not in remaining:
+                continue
+            remaining.discard(index)
+            ring = list(self.arc_points(index, arcs))
+            while ring[-1] != ring[0]:
+                following = next((i for i in ends[ring[-1]] if i in remaining), None)
+                if following is None:
+                    break  # Open chain: borders were not matched exactly
+                remaining.discard(following)
+                points = self.arc_points(following, arcs)
+                ring.extend((points if points[0] == ring[-1] else points[::-1])[1:])
+            if ring[-1] == ring[0] and len(ring) >= 4:
+                rings.append(ring)
+
+        # Nesting depth decides shell (even) or hole (odd); a hole belongs to
+        # the smallest shell around it
+        areas = [abs(_ring_area(ring)) for ring in rings]
+        containers = [
+            [j for j, other in enumerate(rings) if j != i and areas[j] > areas[i] and _ring_inside(ring, other)]
+            for i, ring in enumerate(rings)
+        ]
+        shells = {}
+        for i, ring in enumerate(rings):
+            if len(containers[i]) % 2 == 0:
+                shells[i] = [_oriented(ring, counter_clockwise=True)]
+        for i, ring in enumerate(rings):
+            if len(containers[i]) % 2 == 1:
+                owner = min((j for j in containers[i] if j in shells), key=areas.__getitem__, default=None)
+                if owner is not None:
+                    shells[owner].append(_oriented(ring, counter_clockwise=False))
+
+        coordinates = [[[list(point) for point in ring] for ring in polygon] for polygon in shells.values()]
+        if len(coordinates) == 1:
+            return {"type": "Polygon", "coordinates": coordinates[0]}
+        return {"type": "MultiPolygon", "coordinates": coordinates}
+
+
+def _ring_area(ring):
+    """Signed shoelace area of a closed ring (positive when counter-clockwise)"""
+    return sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring, ring[1:])) / 2.0
+
+
+def _oriented(ring, counter_clockwise):
+    return ring if (_ring_area(ring) > 0) == counter_clockwise else ring[::-1]
+
+
+def _point_in_ring(point, ring):
+    """Even-odd ray casting test"""
+    x, y = point
+    inside = False
+    for (x0, y0), (x1, y1) in zip(ring, ring[1:]):
+        if (y0 > y) != (y1 > y) and x < x0 + (y - y0) * (x1 - x0) / (y1 - y0):
+            inside = not inside
+    return inside
+
+
+def _ring_inside(ring, other):
+    """Whether ``ring`` lies inside ``other``, judged by its vertices not on ``other``
+
+    Every such vertex must be inside, so a ring that only grazes ``other``
+    (borders a rounding error apart) is not taken for a hole.
+    """
+    shared = set(other)
+    points = [point for point in ring if point not in shared]
+    return bool(points) and all(_point_in_ring(point, other) for point in points)
+
+
+# TopoJSON grid size per axis when no quantization is requested
+DEFAULT_QUANTIZATION = 100000
+
+
+def _quantize_arc(arc, transform):
+    """Delta-encoded integer arc; repeated points are dropped unless the arc would degenerate"""
+    (kx, ky), (x0, y0) = transform
+    points = [(round((x - x0) / kx), round((y - y0) / ky)) for x, y in arc]
+    deduped = [point for i, point in enumerate(points) if i == 0 or point != points[i - 1]]
+    minimum = 4 if arc[0] == arc[-1] else 2
+    if len(deduped) >= minimum:
+        points = deduped
+    deltas = [list(points[0])]
+    deltas += [[x - px, y - py] for (px, py), (x, y) in zip(points, points[1:])]
+    return deltas
+
+
+class TopoJSONEncoder:
+    """Encode region features as TopoJSON against a prebuilt RegionTopology
+
+    Arcs are quantized and serialized once; each response only references
+    the arcs its regions use and attaches properties. ``quantization`` is the
+    grid size per axis; 0 or None writes absolute coordinates without a
+    transform.
+    """
+
+    def __init__(self, topology, quantization=DEFAULT_QUANTIZATION):
+        self.topology = topology
+        self.quantization = quantization
+        self.transform = None
+
+        points = [point for arc in topology.arcs for point in arc]
+        if quantization and points:
+            xs, ys = zip(*points)
+            x0, y0 = min(xs), min(ys)
+            kx = (max(xs) - x0) / (quantization - 1) or 1.0
+            ky = (max(ys) - y0) / (quantization - 1) or 1.0
+            self.transform = ((kx, ky), (x0, y0))
+            arcs = [_quantize_arc(arc, self.transform) for arc in topology.arcs]
+        else:
+            arcs = [[list(point) for point in arc] for arc in topology.arcs]
+        self._arc_json = [json.dumps(arc, separators=(',', ':')) for arc in arcs]
+
+    def _geometry_object(self, region_id, properties, arc_map):
+        def remap(ref):
+            index = ref if ref >= 0 else ~ref
+            if index not in arc_map:
+                arc_map[index] = len(arc_map)
+            return arc_map[index] if ref >= 0 else ~arc_map[index]
+
+        entry = self.topology.regions.get(region_id)
+        if entry is None:
+            return {"type": None, "properties": properties}
+        geometry_type, polygons = entry
+        arcs = [[[remap(ref) for ref in ring] for ring in polygon] for polygon in polygons]
+        if geometry_type == 'MultiPolygon':
+            return {"type": "MultiPolygon", "arcs": arcs, "properties": properties}
+        return {"type": "Polygon", "arcs": arcs[0] if arcs else [], "properties": properties}
+
+    def encode(self, features, object_name="regions"):
+        """TopoJSON bytes for (region id, properties) pairs, in the given order"""
+        arc_map = {}
+        geometries = [
+            self._geometry_object(region_id, properties, arc_map)
+            for region_id, properties in features
+        ]
+        used = sorted(arc_map, key=arc_map.get)
+
+        head = {"type": "Topology"}
+        if self.transform is not None:
+            (kx, ky), (x0, y0) = self.transform
+            head["transform"] = {"scale": [kx, ky], "translate": [x0, y0]}
+        head_json = json.dumps(head, separators=(',', ':'))[:-1]
+        objects_json = json.dumps(
+            {object_name: {"type": "GeometryCollection", "geometries": geometries}},
+            ensure_ascii=False, separators=(',', ':')
+        )
+        return (head_json + ',"objects":' + objects_json + ',"arcs":['
+                + ','.join(self._arc_json[index] for index in used) + ']}').encode('utf-8')
+
+
+def decode_topojson(data, object_name="regions"):
+    """[(properties, GeoJSON geometry dict)] from a TopoJSON document (dict)"""
+    transform = data.get("transform")
+    arcs = []
+    for arc in data["arcs"]:
+        if transform:
+            (kx, ky), (x0, y0) = transform["scale"], transform["translate"]
+            x = y = 0
+            points = []
+            for dx, dy in arc:
+                x, y = x + dx, y + dy
+                points.append((x * kx + x0, y * ky + y0))
+        else:
+            points = [tuple(point) for point in arc]
+        arcs.append(points)
+
+    def ring(refs):
+        coordinates = []
+        for ref in refs:
+            points = arcs[ref] if ref >= 0 else arcs[~ref][::-1]
+            coordinates.extend(points if not coordinates else points[1:])
+        return [list(point) for point in coordinates]
+
+    features = []
+    for geometry in data["objects"][object_name]["geometries"]:
+        if geometry.get("type") == "Polygon":
+            decoded = {"type": "Polygon", "coordinates": [ring(refs) for refs in geometry["arcs"]]}
+        elif geometry.get("type") == "MultiPolygon":
+            decoded = {"type": "MultiPolygon",
+                       "coordinates": [[ring(refs) for refs in polygon] for polygon in geometry["arcs"]]}
+        else:
+            decoded = None
+        features.append((geometry.get("properties", {}), decoded))
+    return features
+
+
+def _cyclic_equal(first, second):
+    """Whether two rings (without closing points) hold the same vertex cycle"""
+    if len(first) != len(second):
+        return False
+    if not first:
+        return True
+    return any(
+        second[k:] + second[:k] == first
+        for k, point in enumerate(second) if point == first[0]
+    )
+
+
+def validate_topojson_round_trip(geometries, quantization=DEFAULT_QUANTIZATION):
+    """Encode and decode region geometries as TopoJSON and compare them to the originals
+
+    Every decoded ring must visit the same vertices in the same order as the
+    original, after both are snapped to the quantization grid, and no vertex
+    may move by more than half a grid step. Returns a report dict with the
+    mismatched region ids and the largest coordinate error.
+    """
+    topology = RegionTopology(geometries)
+    encoder = TopoJSONEncoder(topology, quantization)
+    region_ids = list(geometries)
+    decoded = decode_topojson(json.loads(encoder.encode((region_id, {"id": region_id}) for region_id in region_ids)))
+
+    if encoder.transform is not None:
+        (kx, ky), (x0, y0) = encoder.transform
+        tolerance = max(kx, ky) / 2
+        cell = lambda point: (round((point[0] - x0) / kx), round((point[1] - y0) / ky))
+    else:
+        tolerance = 0.0
+        cell = lambda point: (point[0], point[1])
+
+    def rings(geometry):
+        return [
+            [point for i, point in enumerate(cells) if i == 0 or point != cells[i - 1]][:-1]
+            for cells in ([cell(point) for point in ring]
+                          for polygon in geometry_polygons(geometry) for ring in polygon)
+        ]
+
+    mismatched = []
+    max_error = 0.0
+    for region_id, (properties, geometry) in zip(region_ids, decoded):
+        original = geometries[region_id]
+        expected, actual = rings(original), rings(geometry)
+        if len(expected) != len(actual) or not all(map(_cyclic_equal, expected, actual)):
+            mismatched.append(region_id)
+            continue
+        decoded_points = {cell(point): point for polygon in geometry_polygons(geometry)
+                          for ring in polygon for point in ring}
+        for polygon in geometry_polygons(original):
+            for ring in polygon:
+                for point in ring:
+                    nearest = decoded_points[cell(point)]
+                    max_error = max(max_error, abs(nearest[0] - point[0]), abs(nearest[1] - point[1]))
+
+    return {
+        'regions': len(region_ids),
+        'arcs': len(topology.arcs),
+        'mismatched': mismatched,
+        'max_error': max_error,
+        'tolerance': tolerance,
+        'ok': not mismatched and max_error <= tolerance * (1 + 1e-9) + 1e-12
+    }
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Size-bounded LRU caches for finished API payloads and database query results
+"""
+import functools
+import gzip
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # Optional: brotli variants are skipped without it
+    brotli = None
+
+# Defaults: total payload bytes and number of entries kept
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 256
+
+# Query result cache defaults (see cached_query)
+DEFAULT_QUERY_CACHE_BYTES = 64 * 1024 * 1024
+DEFAULT_QUERY_CACHE_ENTRIES = 1024
+
+# Payloads smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 1024
+
+
+class CachedPayload:
+    """A finished response body with its content hash and precompressed variants
+
+    ``len()`` is the total size of all variants, which is what ResponseCache
+    accounts for.
+    """
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.gzip = None
+        self.brotli = None
+        if len(body) >= MIN_COMPRESS_BYTES:
+            self.gzip = gzip.compress(body, compresslevel=9)
+            if brotli is not None:
+                self.brotli = brotli.compress(body, quality=9)
+
+    def __len__(self):
+        return len(self.body) + len(self.gzip or b'') + len(self.brotli or b'')
+
+    def variant_etag(self, encoding):
+        """Strong ETag of one representation: the content hash, suffixed by its content coding"""
+        return f"{self.etag}-{encoding}" if encoding else self.etag
+
+    def matches(self, tag):
+        """Whether an entity tag names any representation of this payload"""
+        return tag == self.etag or tag.startswith(self.etag + '-')
+
+    def variant(self, accepts):
+        """(content_encoding, body) of the best variant; ``accepts(name)`` is the client's q-value"""
+        if self.brotli is not None and accepts('br'):
+            return 'br', self.brotli
+        if self.gzip is not None and accepts('gzip'):
+            return 'gzip', self.gzip
+        return None, self.body
+
+
+class ResponseCache:
+    """Thread-safe LRU bounded by total size and entry count, with an optional TTL
+
+    Sizes come from ``sizeof`` (``len()`` by default, which suits payloads).
+    Keys should include the dataset version so a re-import naturally misses;
+    ``ttl`` (seconds) additionally bounds how long any entry is served.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_entries=DEFAULT_MAX_ENTRIES, ttl=None, sizeof=len):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._total_bytes -= size
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, payload):
+        size = self.sizeof(payload)
+        if size > self.max_bytes:
+            return  # Never worth evicting everything for one oversized payload
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (payload, size, expires_at)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes or len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def get_or_build(self, key, build):
+        """Cached payload for key, building and storing it on a miss
+
+        ``build`` returns the payload, or None for results that should not be
+        cached (e.g. not found).
+        """
+        payload = self.get(key)
+        if payload is None:
+            payload = build()
+            if payload is not None:
+                self.put(key, payload)
+        return payload
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        """Counters and current usage, for monitoring"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl
+            }
+
+
+def result_size(value):
+    """Approximate bytes held by a query result: containers plus their rows' fields
+
+    Strings shared with other caches (e.g. geometry text) are counted again,
+    so this errs on the large side.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        items = list(value.keys()) + list(value.values())
+    elif isinstance(value, (list, tuple)):
+        items = value
+    else:
+        return size
+    for item in items:
+        size += sys.getsizeof(item)
+        if isinstance(item, (list, tuple)):
+            size += sum(sys.getsizeof(field) for field in item)
+    return size
+
+
+def _hashable(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _hashable(item)) for key, item in value.items()))
+    if isinstance(value, set):
+        return tuple(sorted(value))
+    return value
+
+
+def cached_query(method):
+    """Serve a query method from ``self.query_cache`` keyed by (name, dataset version, arguments)
+
+    The version comes from ``self.get_dataset_version()``, which every import
+    bumps, so results never outlive the data they were read from. Without a
+    cache (``self.query_cache`` is None) the method runs directly. Cached
+    results are shared between callers and must not be modified.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cache = self.query_cache
+        if cache is None:
+            return method(self, *args, **kwargs)
+        key = (method.__name__, self.get_dataset_version(), _hashable(args), _hashable(kwargs))
+        return cache.get_or_build(key, lambda: method(self, *args, **kwargs))
+    return wrapper
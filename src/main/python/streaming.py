@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Incremental encoders for streamed responses
+Turn chunks of prediction rows (DiseaseDataDatabase.iter_predictions) into
+CSV, NDJSON or GeoJSON bytes a piece at a time, so a response of any size is
+sent with chunked transfer while the server holds only one chunk.
+"""
+import csv
+import io
+import json
+
+from database_manager import EXPORT_COLUMNS
+
+# Rows fetched per chunk: with geometry, 1000 rows keep the peak around 5 MB
+STREAM_CHUNK_ROWS = 1000
+
+# Encoded bytes collected before a chunk is handed to the server
+STREAM_FLUSH_BYTES = 64 * 1024
+
+# format -> (mimetype, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'geojson': ('application/geo+json', 'geojson'),
+}
+
+
+def _json_text(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def buffered(pieces, flush_bytes=STREAM_FLUSH_BYTES):
+    """Join small byte pieces into chunks of about ``flush_bytes``"""
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= flush_bytes:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _feature_text(properties, geometry_json):
+    return '{"type":"Feature","properties":%s,"geometry":%s}' % (
+        _json_text(properties), geometry_json if geometry_json is not None else 'null'
+    )
+
+
+def iter_csv(chunks, geometry=False):
+    """CSV with an EXPORT_COLUMNS header (plus a GeoJSON text column with ``geometry``)"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(EXPORT_COLUMNS + (['geometry'] if geometry else []))
+    for rows in chunks:
+        writer.writerows(rows)
+        yield output.getvalue().encode('utf-8')
+        output.seek(0)
+        output.truncate()
+    if output.tell():
+        yield output.getvalue().encode('utf-8')
+
+
+def iter_ndjson(chunks, geometry=False):
+    """One JSON object per line: a flat record, or a GeoJSON Feature with ``geometry``"""
+    width = len(EXPORT_COLUMNS)
+    for rows in chunks:
+        if geometry:
+            lines = [_feature_text(dict(zip(EXPORT_COLUMNS, row[:width])), row[width]) for row in rows]
+        else:
+            lines = [_json_text(dict(zip(EXPORT_COLUMNS, row))) for row in rows]
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def iter_feature_collection(chunks, properties_of=None):
+    """GeoJSON FeatureCollection of rows whose last column is geometry text
+
+    ``properties_of(row)`` builds each feature's properties (default: the
+    EXPORT_COLUMNS values by name).
+    """
+    if properties_of is None:
+        properties_of = lambda row: dict(zip(EXPORT_COLUMNS, row[:-1]))
+    yield b'{"type":"FeatureCollection","features":['
+    separator = ''
+    for rows in chunks:
+        if rows:
+            yield (separator + ','.join(_feature_text(properties_of(row), row[-1]) for row in rows)).encode('utf-8')
+            separator = ','
+    yield b']}'
+
+
+def iter_export(chunks, export_format, geometry=False):
+    """Encoded pieces of an export in one of EXPORT_FORMATS (GeoJSON always carries geometry)"""
+    if export_format == 'csv':
+        return iter_csv(chunks, geometry)
+    if export_format == 'ndjson':
+        return iter_ndjson(chunks, geometry)
+    return iter_feature_collection(chunks)
+
+
+def iter_json_array(items):
+    """A JSON array written one element at a time"""
+    yield b'['
+    separator = b''
+    for item in items:
+        yield separator + _json_text(item).encode('utf-8')
+        separator = b','
+    yield b']'
@@ -2,7 +2,14 @@
 """
 Test script for the database functionality
 """
-from database_manager import DiseaseDataDatabase
+import importlib
+import json
+import sqlite3
+
+import pytest
+
+from database_manager import DiseaseDataDatabase, decode_geometry, decode_geometry_json, encode_geometry
+from region_topology import validate_topojson_round_trip
 
 def test_database():
     print("🧪 Testing Database Functionality\n")
@@ -90,7 +97,751 @@ def test_database():
     except Exception as e:
         print(f"  ❌ Error getting region timeline: {e}")
     
+    print()
+    
+    # Test 7: TopoJSON round trip
+    print("🗺️  TopoJSON Round Trip:")
+    try:
+        geometries = {
+            townvill: json.loads(geometry_json)
+            for townvill, _, geometry_json in db.get_region_geometries() if geometry_json
+        }
+        report = validate_topojson_round_trip(geometries)
+        print(f"  - Regions: {report['regions']}, shared arcs: {report['arcs']}")
+        print(f"  - Max coordinate error: {report['max_error']:.2e} (tolerance {report['tolerance']:.2e})")
+        print(f"  - {'✅ Polygons match' if report['ok'] else '❌ Mismatched: ' + ', '.join(report['mismatched'][:5])}")
+    except Exception as e:
+        print(f"  ❌ Error validating TopoJSON: {e}")
+    
+    print()
+    
+    # Test 8: Top-K ranking pages
+    print(f"🏆 Top 5 Regions for {test_date}:")
+    try:
+        first_page = db.get_ranked_regions(test_date, 5)
+        for townvill, town, percentage, *_ in first_page:
+            print(f"  - {town} ({townvill}): {percentage:.2f}%")
+        if first_page:
+            last = first_page[-1]
+            next_page = db.get_ranked_regions(test_date, 5, after=(last[2], last[0]))
+            print(f"  - Next page starts at: {next_page[0][0] if next_page else 'end of ranking'}")
+    except Exception as e:
+        print(f"  ❌ Error getting ranking: {e}")
+    
+    print()
+    
+    # Test 9: District rollups
+    print(f"🏙️  District Rollups for {test_date}:")
+    try:
+        polygons = {town: geometry_json for town, _, _, geometry_json in db.get_town_geometries()}
+        for town, county, total_regions, total_cases, *_ in db.get_town_summaries(test_date):
+            print(f"  - {town}: {total_regions} regions, {total_cases:.2f} predicted cases, "
+                  f"{'polygon' if polygons.get(town) else 'no polygon'}")
+    except Exception as e:
+        print(f"  ❌ Error getting district rollups: {e}")
+    
+    print()
+    
+    # Test 10: Changes between consecutive dates
+    print("🔀 Regions Changed Between Consecutive Dates:")
+    try:
+        dates = db.get_available_dates()
+        for from_date, to_date in list(zip(dates, dates[1:]))[:3]:
+            changes = db.get_region_changes(from_date, to_date)
+            print(f"  - {from_date} → {to_date}: {len(changes)} changed")
+    except Exception as e:
+        print(f"  ❌ Error getting changes: {e}")
+    
     print("\n✅ Database testing complete!")
 
+
+# Synthetic dataset for the assert-based tests: a 3 x 3 grid of square regions over three dates
+TEST_DATES = ["2023-06-01", "2023-06-02", "2023-06-03"]
+GRID_SIZE = 3
+CELL_DEGREES = 0.0123457
+
+
+def square(column, row):
+    # Neighbours share bit-identical border coordinates, as in the survey data
+    x0, x1 = 120.1 + column * CELL_DEGREES, 120.1 + (column + 1) * CELL_DEGREES
+    y0, y1 = 22.9 + row * CELL_DEGREES, 22.9 + (row + 1) * CELL_DEGREES
+    return {"type": "Polygon", "coordinates": [[[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]]}
+
+
+def synthetic_features(date, day):
+    features = []
+    for column in range(GRID_SIZE):
+        for row in range(GRID_SIZE):
+            index = column * GRID_SIZE + row
+            percentage = round((index * 11.3 + day * 7.1) % 100, 4)
+            features.append({
+                "type": "Feature",
+                "properties": {
+                    "date": date,
+                    "townvill": f"A{index:04d}",
+                    "TOWN": f"Town {column}",
+                    "COUNTY": "臺南市",
+                    # Actual counts beyond the int8/uint8 range must survive every backend
+                    "case_lag_future_14": 300 if index == 0 else 200 if index == 1 else index + day,
+                    "predicted_case_lag_future_14": round(percentage / 25, 4),
+                    "predicted_case_lag_future_14_binary": int(percentage >= 50),
+                    "predicted_case_lag_future_14_percentage": percentage,
+                    "X": 120.1 + column * CELL_DEGREES,
+                    "Y": 22.9 + row * CELL_DEGREES,
+                    "AREA": 1000.0 + index,
+                },
+                "geometry": square(column, row),
+            })
+    return features
+
+
+def write_dataset(data_dir, dates=TEST_DATES):
+    data_dir.mkdir(parents=True, exist_ok=True)
+    for day, date in enumerate(dates):
+        path = data_dir / f"{date.replace('-', '')}_case_results.geojson"
+        path.write_text(json.dumps({"type": "FeatureCollection", "features": synthetic_features(date, day)}),
+                        encoding='utf-8')
+    return data_dir
+
+
+def imported_database(tmp_path, name="test.db", schema_options=None, **import_options):
+    data_dir = tmp_path / "data"
+    if not data_dir.exists():
+        write_dataset(data_dir)
+    db = DiseaseDataDatabase(tmp_path / name)
+    db.create_database_schema(**(schema_options or {}))
+    db.import_geojson_files(data_dir, **import_options)
+    return db
+
+
+def test_topojson_round_trip():
+    geometries = {f"A{column}{row}": square(column, row) for column in range(GRID_SIZE) for row in range(GRID_SIZE)}
+    report = validate_topojson_round_trip(geometries)
+    assert report["ok"], report["mismatched"]
+    assert report["regions"] == len(geometries)
+
+
+
+def flat_points(coordinates):
+    if isinstance(coordinates[0], (int, float)):
+        return [coordinates]
+    return [point for item in coordinates for point in flat_points(item)]
+
+
+@pytest.mark.parametrize("compression", ["none", "zlib"])
+def test_geometry_codec_round_trip(compression):
+    multipolygon = {"type": "MultiPolygon", "coordinates": [square(0, 0)["coordinates"], square(2, 1)["coordinates"]]}
+    for geometry in (square(1, 2), multipolygon):
+        blob = encode_geometry(geometry, precision=6, compression=compression)
+        decoded = decode_geometry(blob)
+        assert decoded["type"] == geometry["type"]
+        assert json.loads(decode_geometry_json(blob)) == decoded
+
+        original, restored = flat_points(geometry["coordinates"]), flat_points(decoded["coordinates"])
+        assert len(original) == len(restored)
+        assert max(abs(a - b) for p, q in zip(original, restored) for a, b in zip(p, q)) <= 0.5e-6 + 1e-12
+
+
+
+def table_contents(db_path):
+    """Every imported table's rows in a stable order, without autoincrement ids"""
+    conn = sqlite3.connect(db_path)
+    try:
+        return {
+            'predictions': conn.execute('''
+                SELECT date, townvill, town, county, case_lag_future_14, predicted_case_lag_future_14,
+                       predicted_case_lag_future_14_binary, predicted_case_lag_future_14_percentage,
+                       x_coord, y_coord, area, geometry_json
+                FROM predictions ORDER BY date, townvill
+            ''').fetchall(),
+            # created_at is left out: two imports may straddle a second boundary
+            'daily_summary': conn.execute('''
+                SELECT date, total_regions, total_predicted_cases, avg_prediction, max_prediction,
+                       min_prediction, high_risk_regions, medium_risk_regions, low_risk_regions
+                FROM daily_summary ORDER BY date
+            ''').fetchall(),
+            'region_info': conn.execute('SELECT * FROM region_info ORDER BY townvill').fetchall(),
+        }
+    finally:
+        conn.close()
+
+
+def assert_import_matches_serial(tmp_path, **import_options):
+    """Import the synthetic dataset serially and with ``import_options``; the tables must be identical"""
+    reference = imported_database(tmp_path, "serial.db")
+    expected = table_contents(reference.db_path)
+    assert len(expected['predictions']) == len(TEST_DATES) * GRID_SIZE ** 2
+    reference.close()
+
+    db = imported_database(tmp_path, "other.db", **import_options)
+    assert table_contents(db.db_path) == expected
+    db.close()
+
+
+def test_streaming_import_matches_serial(tmp_path):
+    assert_import_matches_serial(tmp_path, streaming=True, batch_size=4)
+
+
+
+def test_parallel_import_matches_serial(tmp_path):
+    assert_import_matches_serial(tmp_path, workers=2)
+
+
+
+def test_bulk_import_matches_serial(tmp_path):
+    assert_import_matches_serial(tmp_path, bulk_load=True)
+
+
+
+def test_catalog_stays_consistent(tmp_path):
+    db = imported_database(tmp_path)
+    assert db.check_catalog() == {'ok': True, 'mismatches': []}
+    stats = db.get_database_stats()
+    assert stats['total_predictions'] == len(TEST_DATES) * GRID_SIZE ** 2
+    assert stats['total_dates'] == len(TEST_DATES)
+    assert stats['total_regions'] == GRID_SIZE ** 2
+    assert db.get_available_dates() == TEST_DATES
+
+    # An incremental import that drops regions from one date must update the catalog with it
+    path = tmp_path / "data" / "20230602_case_results.geojson"
+    data = json.loads(path.read_text(encoding='utf-8'))
+    data["features"] = data["features"][:4]
+    path.write_text(json.dumps(data), encoding='utf-8')
+    db.import_geojson_files(tmp_path / "data", incremental=True)
+    assert db.check_catalog()['ok']
+    assert db.get_database_stats()['total_predictions'] == (len(TEST_DATES) - 1) * GRID_SIZE ** 2 + 4
+    db.close()
+
+
+
+def test_incremental_import_replaces_changed_dates_only(tmp_path):
+    db = imported_database(tmp_path)
+    path = tmp_path / "data" / "20230602_case_results.geojson"
+    data = json.loads(path.read_text(encoding='utf-8'))
+    for feature in data["features"]:
+        feature["properties"]["predicted_case_lag_future_14_percentage"] = 99.0
+    path.write_text(json.dumps(data), encoding='utf-8')
+
+    stats = db.import_geojson_files(tmp_path / "data", incremental=True)
+    assert stats['files'] == 1 and stats['dates'] == 1
+    assert {row[4] for row in db.get_predictions_by_date("2023-06-02")} == {99.0}
+    assert len(db.get_predictions_by_date("2023-06-01")) == GRID_SIZE ** 2
+
+    # Nothing left to import: still a statistics dict with zero counts
+    stats = db.import_geojson_files(tmp_path / "data", incremental=True)
+    assert stats['files'] == 0 and stats['predictions'] == 0
+    assert 'elapsed_seconds' in stats
+    db.close()
+
+
+
+def test_memory_store_keeps_large_actual_counts(tmp_path):
+    pytest.importorskip("numpy")
+    from memory_store import InMemoryDiseaseData
+
+    db = imported_database(tmp_path)
+    memory = InMemoryDiseaseData(db)
+    start, end = TEST_DATES[0], TEST_DATES[-1]
+    assert memory.get_series(start, end, 'actual') == db.get_series(start, end, 'actual')
+    assert memory.get_series(start, end, 'binary') == db.get_series(start, end, 'binary')
+    _, townvills, rows = memory.get_series(start, end, 'actual')
+    assert rows[0][townvills.index("A0000")] == 300
+    assert rows[0][townvills.index("A0001")] == 200
+    db.close()
+
+
+
+@pytest.fixture
+def api_client(tmp_path, monkeypatch):
+    """Flask test client serving the synthetic dataset"""
+    pytest.importorskip("flask")
+    db = imported_database(tmp_path)
+    monkeypatch.chdir(tmp_path)  # app creates its default database and tile directories under the cwd
+    app_module = importlib.import_module("app")
+    from response_cache import ResponseCache
+    monkeypatch.setattr(app_module, "db", db)
+    monkeypatch.setattr(app_module, "response_cache", ResponseCache())
+    yield app_module.app.test_client()
+    db.close()
+
+
+def test_etags_and_not_modified(api_client):
+    url = f"/api/data?date={TEST_DATES[0]}"
+    identity = api_client.get(url)
+    gzipped = api_client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert identity.status_code == gzipped.status_code == 200
+    assert "Content-Encoding" not in identity.headers
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+
+    # Each representation has its own strong ETag, derived from the content hash
+    base_tag = identity.headers["ETag"].strip('"')
+    assert gzipped.headers["ETag"] == f'"{base_tag}-gzip"'
+    assert "Accept-Encoding" in identity.headers["Vary"]
+
+    response = api_client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": gzipped.headers["ETag"]})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == gzipped.headers["ETag"]
+    assert "Accept-Encoding" in response.headers["Vary"]
+
+    # A tag of any representation of the same content still validates; the 304 names this client's variant
+    response = api_client.get(url, headers={"If-None-Match": gzipped.headers["ETag"]})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == identity.headers["ETag"]
+    assert api_client.get(url, headers={"If-None-Match": f'W/"{base_tag}"'}).status_code == 304
+
+    assert api_client.get(url, headers={"If-None-Match": '"0123456789abcdef"'}).status_code == 200
+    other = api_client.get(f"/api/data?date={TEST_DATES[1]}", headers={"If-None-Match": identity.headers["ETag"]})
+    assert other.status_code == 200
+    assert other.headers["ETag"] != identity.headers["ETag"]
+
+
+
+def test_bbox_filter_returns_intersecting_regions(tmp_path):
+    db = imported_database(tmp_path)
+    date = TEST_DATES[0]
+    # Covers the middle column of the grid plus the edges it shares with its neighbours
+    bbox = (120.1 + CELL_DEGREES * 1.2, 22.9, 120.1 + CELL_DEGREES * 1.8, 22.9 + CELL_DEGREES * GRID_SIZE)
+    full = {row[1] for row in db.get_predictions_by_date(date)}
+    inside = [row[1] for row in db.get_predictions_by_date(date, bbox=bbox)]
+    assert set(inside) < full
+    assert set(inside) == {f"A{GRID_SIZE + row:04d}" for row in range(GRID_SIZE)}
+    assert [row[0] for row in db.get_region_geometries(bbox=bbox)] == sorted(inside)
+    assert [row[0] for row in db.get_region_attributes_by_date(date, bbox=bbox)] == sorted(inside)
+    db.close()
+
+    # A database without a filled R*Tree (older schema, never indexed) gives the same answer
+    for statement in ('DELETE FROM region_rtree', 'DROP TABLE region_rtree'):
+        conn = sqlite3.connect(db.db_path)
+        conn.execute(statement)
+        conn.commit()
+        conn.close()
+        legacy = DiseaseDataDatabase(db.db_path, query_cache_bytes=0)
+        assert [row[1] for row in legacy.get_predictions_by_date(date, bbox=bbox)] == inside
+        assert len(legacy.get_high_risk_regions(date, 0, bbox=bbox)) == len(inside)
+        legacy.close()
+
+
+
+@pytest.mark.parametrize("import_options", [{}, {"streaming": True}, {"workers": 2}])
+def test_manifest_hashes_come_from_the_parse_pass(tmp_path, import_options):
+    from database_manager import file_sha256, manifest_key
+
+    data_dir = write_dataset(tmp_path / "data")
+    # Bytes after the features array are part of the file's hash too
+    path = data_dir / "20230601_case_results.geojson"
+    path.write_bytes(path.read_bytes() + b"\n")
+    db = imported_database(tmp_path, **import_options)
+
+    conn = sqlite3.connect(db.db_path)
+    manifest = dict(conn.execute('SELECT path, content_hash FROM import_manifest'))
+    conn.close()
+    assert manifest == {manifest_key(path): file_sha256(path) for path in data_dir.glob("*.geojson")}
+    db.close()
+
+
+
+def test_parallel_streaming_import_matches_serial(tmp_path):
+    # Batches smaller than a file: rows arrive from the parser processes in several messages
+    assert_import_matches_serial(tmp_path, workers=2, streaming=True, batch_size=4)
+
+
+
+def decode_series(payload):
+    """(header, values with None for missing) of an /api/series body"""
+    import struct
+    from array import array
+
+    header_length = struct.unpack_from('<I', payload)[0]
+    header = json.loads(payload[4:4 + header_length])
+    body = payload[4 + header_length:]
+    stored = array({'uint8': 'B', 'uint16': 'H', 'uint32': 'I'}[header['dtype']], body)
+    values = [None if value == header['missing'] else value * header['scale'] + header['offset'] for value in stored]
+    return header, values
+
+
+def test_series_keeps_integer_counts_exact(api_client):
+    header, values = decode_series(api_client.get("/api/series?field=actual").data)
+    assert header['dtype'] == 'uint16'
+    dates, regions = header['dates'], header['regions']
+    assert values[regions.index("A0000")] == 300
+    assert values[len(regions) + regions.index("A0001")] == 200
+    assert all(isinstance(value, int) for value in values)
+
+    # Percentages are still quantized into single bytes, within half a step
+    header, values = decode_series(api_client.get("/api/series?field=percentage").data)
+    assert header['dtype'] == 'uint8'
+    expected = {feature["properties"]["townvill"]: feature["properties"]["predicted_case_lag_future_14_percentage"]
+                for feature in synthetic_features(TEST_DATES[0], 0)}
+    for townvill, value in zip(header['regions'], values):
+        assert abs(value - expected[townvill]) <= header['scale'] / 2 + 1e-9
+
+
+
+def test_tiles_carry_region_features_and_attributes(tmp_path):
+    mapbox_vector_tile = pytest.importorskip("mapbox_vector_tile")
+    from vector_tiles import DEFAULT_BUFFER, DEFAULT_EXTENT, LAYER_NAME, TILE_ATTRIBUTE_FIELDS, RegionTileSource, \
+        lonlat_to_world, tile_range
+
+    db = imported_database(tmp_path)
+    source = RegionTileSource(db, tmp_path / "tiles")
+    date, zoom = TEST_DATES[1], 14
+    attributes = {row[0]: row[1:] for row in db.get_region_attributes_by_date(date)}
+    boxes = {
+        f"A{column * GRID_SIZE + row:04d}": lonlat_to_world(*square(column, row)["coordinates"][0][3])
+        + lonlat_to_world(*square(column, row)["coordinates"][0][1])
+        for column in range(GRID_SIZE) for row in range(GRID_SIZE)
+    }
+
+    seen = set()
+    x_min, y_min, x_max, y_max = tile_range(source.bounds(), zoom)
+    assert (x_min, y_min) != (x_max, y_max)  # the grid spans several tiles at this zoom
+    for x in range(x_min, x_max + 1):
+        for y in range(y_min, y_max + 1):
+            layers = mapbox_vector_tile.decode(source.get_tile(date, zoom, x, y))
+            assert list(layers) == [LAYER_NAME]
+            features = layers[LAYER_NAME]["features"]
+
+            # Every region overlapping the tile (plus its clip buffer) and no other
+            n = 1 << zoom
+            margin = DEFAULT_BUFFER / DEFAULT_EXTENT / n
+            expected = {
+                townvill for townvill, (west, north, east, south) in boxes.items()
+                if west < (x + 1) / n + margin and east > x / n - margin
+                and north < (y + 1) / n + margin and south > y / n - margin
+            }
+            assert sorted(feature["properties"]["townvill"] for feature in features) == sorted(expected)
+
+            for feature in features:
+                townvill = feature["properties"]["townvill"]
+                assert feature["type"] == "Feature" and feature["geometry"]["type"] == "Polygon"
+                assert feature["properties"] == {
+                    "townvill": townvill,
+                    "town": f"Town {int(townvill[1:]) // GRID_SIZE}",
+                    "date": date,
+                    **dict(zip(TILE_ATTRIBUTE_FIELDS, attributes[townvill])),
+                }
+            seen |= expected
+    assert seen == set(attributes)
+    assert source.get_tile("1999-01-01", zoom, x_min, y_min) is None
+    db.close()
+
+
+def test_tile_cache_drops_older_dataset_versions(tmp_path):
+    from vector_tiles import RegionTileSource, lonlat_to_world
+
+    db = imported_database(tmp_path)
+    cache_dir = tmp_path / "tiles"
+    source = RegionTileSource(db, cache_dir)
+    zoom = 12
+    # The tile holding region A0000, whose prediction is changed below
+    x, y = (int(value * (1 << zoom)) for value in lonlat_to_world(120.1 + CELL_DEGREES / 2, 22.9 + CELL_DEGREES / 2))
+    first_version = db.get_dataset_version()
+    tile = source.get_tile(TEST_DATES[0], zoom, x, y)
+    assert (cache_dir / first_version / TEST_DATES[0] / str(zoom) / str(x) / f"{y}.pbf").read_bytes() == tile
+
+    # Re-import a changed file: the new version's tiles replace the old directory
+    newer = str(int(first_version) * 10)
+    (cache_dir / newer).mkdir()
+    (cache_dir / "notes").mkdir()
+    path = tmp_path / "data" / "20230601_case_results.geojson"
+    collection = json.loads(path.read_text(encoding="utf-8"))
+    collection["features"][0]["properties"]["predicted_case_lag_future_14_percentage"] = 99.0
+    path.write_text(json.dumps(collection), encoding="utf-8")
+    db.import_geojson_files(tmp_path / "data", incremental=True)
+    second_version = db.get_dataset_version()
+    assert second_version != first_version
+
+    assert source.get_tile(TEST_DATES[0], zoom, x, y) != tile
+    assert not (cache_dir / first_version).exists()
+    assert (cache_dir / second_version).is_dir()
+    assert (cache_dir / newer).is_dir() and (cache_dir / "notes").is_dir()
+    db.close()
+
+
+
+def test_streamed_responses_match_buffered_ones(api_client):
+    from database_manager import EXPORT_COLUMNS
+
+    db = importlib.import_module("app").db
+    rows = [row for chunk in db.iter_predictions(chunk_size=4) for row in chunk]
+    assert len(rows) == len(TEST_DATES) * GRID_SIZE ** 2
+    assert rows == [row for chunk in db.iter_predictions() for row in chunk]
+
+    date = TEST_DATES[1]
+    by_region = lambda features: {feature["properties"]["townvill"]: feature for feature in features}
+    streamed = api_client.get(f"/api/data?date={date}&stream=1")
+    assert streamed.is_streamed and streamed.headers["Cache-Control"] == "no-store"
+    assert by_region(json.loads(streamed.get_data())["features"]) == \
+        by_region(api_client.get(f"/api/data?date={date}").get_json()["features"])
+
+    lines = api_client.get("/api/export?format=ndjson").get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == [dict(zip(EXPORT_COLUMNS, row)) for row in rows]
+
+    csv_text = api_client.get(f"/api/export?format=csv&start={date}&end={date}").get_data(as_text=True)
+    header, *records = csv_text.splitlines()
+    assert header.split(",") == EXPORT_COLUMNS
+    assert [record.split(",")[1] for record in records] == [row[1] for row in rows if row[0] == date]
+
+    collection = api_client.get("/api/export?format=geojson&townvill=A0004").get_json()
+    assert [feature["properties"]["date"] for feature in collection["features"]] == TEST_DATES
+    assert all(feature["geometry"]["type"] == "Polygon" for feature in collection["features"])
+
+
+
+def test_query_cache_misses_after_an_import(tmp_path):
+    importer = imported_database(tmp_path)
+    # A second instance, as in another worker process, only sees the new version stamp
+    reader = DiseaseDataDatabase(importer.db_path)
+    assert reader.get_available_dates() == TEST_DATES
+    assert reader.get_available_dates() == TEST_DATES
+    stats = reader.query_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+    summary = reader.get_daily_summary(TEST_DATES[0])
+    write_dataset(tmp_path / "data", TEST_DATES + ["2023-06-04"])
+    importer.import_geojson_files(tmp_path / "data", incremental=True)
+
+    assert reader.get_available_dates() == TEST_DATES + ["2023-06-04"]
+    assert reader.get_daily_summary("2023-06-04") is not None
+    assert reader.get_daily_summary(TEST_DATES[0]) == summary
+    assert reader.query_cache.stats()["hits"] == 1
+    importer.close()
+    reader.close()
+
+
+
+def expected_town_rollups(db, date):
+    """TOWN_SUMMARY_COLUMNS per town, aggregated in Python from the date's village rows"""
+    from database_manager import risk_level
+
+    towns = {}
+    for _, _, town, predicted, percentage, binary, actual, _ in db.get_predictions_by_date(date):
+        towns.setdefault(town, []).append((predicted, percentage, binary, actual))
+    rollups = {}
+    for town, rows in towns.items():
+        predicted, percentage, binary, actual = zip(*rows)
+        bands = [risk_level(value) for value in percentage]
+        rollups[town] = ("臺南市", len(rows), sum(predicted), sum(predicted) / len(rows), max(predicted),
+                         sum(percentage) / len(rows), max(percentage), sum(binary), sum(actual),
+                         bands.count(2), bands.count(1), bands.count(0))
+    return rollups
+
+
+def test_town_rollups_match_village_rows(tmp_path):
+    db = imported_database(tmp_path)
+    write_dataset(tmp_path / "data", TEST_DATES + ["2023-06-04"])
+    db.import_geojson_files(tmp_path / "data", incremental=True)
+
+    for date in TEST_DATES + ["2023-06-04"]:
+        summaries = {row[0]: row[1:] for row in db.get_town_summaries(date)}
+        expected = expected_town_rollups(db, date)
+        assert summaries.keys() == expected.keys() == {f"Town {column}" for column in range(GRID_SIZE)}
+        for town, row in summaries.items():
+            assert row == pytest.approx(expected[town])
+
+    # One dissolved polygon per district, covering exactly its villages
+    geometries = db.get_town_geometries()
+    assert [row[:3] for row in geometries] == [(f"Town {column}", "臺南市", GRID_SIZE) for column in range(GRID_SIZE)]
+    for town, _, _, geometry_json in geometries:
+        geometry = json.loads(geometry_json)
+        assert geometry["type"] == "Polygon" and len(geometry["coordinates"]) == 1
+        ring = geometry["coordinates"][0]
+        area = abs(sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(ring, ring[1:]))) / 2
+        assert area == pytest.approx(GRID_SIZE * CELL_DEGREES ** 2, rel=1e-4)
+    db.close()
+
+
+def test_dissolve_keeps_grazing_rings_as_separate_shells():
+    from region_topology import RegionTopology
+
+    # Two cells whose shared border is off by a rounding error: no internal arc,
+    # and the upper cell must not become a hole of the lower one
+    lower = {"type": "Polygon", "coordinates": [[[0.0, 0.0], [2.0, 0.0], [2.0, 1.0], [0.0, 1.0], [0.0, 0.0]]]}
+    upper = {"type": "Polygon", "coordinates": [[[0.0, 1.0 - 1e-15], [1.0, 1.0 - 1e-15], [1.0, 2.0], [0.0, 2.0],
+                                                 [0.0, 1.0 - 1e-15]]]}
+    merged = RegionTopology({"lower": lower, "upper": upper}).merged(["lower", "upper"])
+    assert merged["type"] == "MultiPolygon"
+    assert [len(polygon) for polygon in merged["coordinates"]] == [1, 1]
+
+
+
+def test_diff_patches_one_date_into_the_next(api_client, tmp_path):
+    from database_manager import DEFAULT_CHANGE_TOLERANCE, REGION_CHANGES_SQL, region_changed
+
+    # A day on which most regions stay put: one moves within the tolerance, one
+    # jumps a risk band and one disappears
+    features = synthetic_features("2023-06-04", len(TEST_DATES) - 1)
+    for feature in features:
+        properties = feature["properties"]
+        properties["predicted_case_lag_future_14_percentage"] += {"A0004": 0.5, "A0005": 30.0}.get(
+            properties["townvill"], 0.0)
+    features = [feature for feature in features if feature["properties"]["townvill"] != "A0002"]
+    (tmp_path / "data" / "20230604_case_results.geojson").write_text(
+        json.dumps({"type": "FeatureCollection", "features": features}), encoding="utf-8")
+    db = importlib.import_module("app").db
+    db.import_geojson_files(tmp_path / "data", incremental=True)
+    dates = TEST_DATES + ["2023-06-04"]
+
+    conn = sqlite3.connect(db.db_path)
+    keyed = lambda date: api_client.get(f"/api/attributes?date={date}&layout=keyed").get_json()["regions"]
+    for from_date, to_date in zip(dates, dates[1:]):
+        before, after = keyed(from_date), keyed(to_date)
+
+        # With no tolerance the patch reproduces the target date exactly
+        patch = api_client.get(f"/api/diff?from={from_date}&to={to_date}&tolerance=0").get_json()
+        patched = dict(before, **patch["changed"])
+        for townvill in patch["removed"]:
+            del patched[townvill]
+        assert patched == after
+        assert set(patch["changed"]) == {townvill for townvill in after if after[townvill] != before.get(townvill)}
+        if to_date == "2023-06-04":
+            assert (sorted(patch["changed"]), patch["removed"]) == (["A0004", "A0005"], ["A0002"])
+
+        # Consecutive dates come precomputed and agree with region_changed()
+        assert conn.execute('SELECT changed_regions FROM region_change_pairs WHERE from_date = ? AND to_date = ?',
+                            (from_date, to_date)).fetchone() is not None
+        precomputed = db.get_region_changes(from_date, to_date)
+        params = {'from_date': from_date, 'to_date': to_date, 'tolerance': DEFAULT_CHANGE_TOLERANCE}
+        assert precomputed == conn.execute(f'{REGION_CHANGES_SQL} ORDER BY 1', params).fetchall()
+        assert [row[0] for row in precomputed] == sorted(
+            townvill for townvill in before.keys() | after.keys()
+            if region_changed(before.get(townvill), after.get(townvill)))
+    assert [row[0] for row in db.get_region_changes("2023-06-03", "2023-06-04")] == ["A0002", "A0005"]
+    conn.close()
+
+
+
+def test_normalized_upgrade_keeps_responses_identical(api_client, tmp_path):
+    db = importlib.import_module("app").db
+    urls = [f"/api/data?date={date}" for date in TEST_DATES] + [
+        f"/api/high-risk?date={TEST_DATES[0]}&threshold=0",
+        f"/api/data?date={TEST_DATES[1]}&format=topojson",
+        f"/api/data?date={TEST_DATES[2]}&bbox=120.1,22.9,120.11,22.91",
+    ]
+    responses = [api_client.get(url) for url in urls]
+    assert all(response.status_code == 200 for response in responses)
+    before = [response.get_data() for response in responses]
+    version = db.get_dataset_version()
+
+    report = db.normalize_geometry_storage()
+    assert report["cleared_rows"] == len(TEST_DATES) * GRID_SIZE ** 2
+    assert db.get_dataset_version() != version
+    conn = sqlite3.connect(db.db_path)
+    assert conn.execute('SELECT COUNT(*) FROM predictions WHERE geometry_json IS NOT NULL').fetchone() == (0,)
+    conn.close()
+    assert [api_client.get(url).get_data() for url in urls] == before
+
+    # A database created normalized answers the same as the upgraded one
+    fresh = imported_database(tmp_path, "normalized.db", schema_options={"normalized_geometry": True})
+    for date in TEST_DATES:
+        assert fresh.get_predictions_by_date(date) == db.get_predictions_by_date(date)
+        assert fresh.get_high_risk_regions(date, 0) == db.get_high_risk_regions(date, 0)
+    fresh.close()
+
+
+
+def test_geometry_and_attributes_recombine_to_data(api_client):
+    from app import ATTRIBUTE_FIELDS, IMMUTABLE_CACHE_CONTROL
+
+    redirect = api_client.get("/api/geometry")
+    assert redirect.status_code == 302 and redirect.headers["Cache-Control"] == "no-cache"
+    layer = api_client.get(redirect.headers["Location"])
+    assert layer.status_code == 200 and layer.headers["Cache-Control"] == IMMUTABLE_CACHE_CONTROL
+    geometries = {feature["properties"]["townvill"]: feature for feature in layer.get_json()["features"]}
+    # An outdated hash leads back to the current layer
+    assert api_client.get("/api/geometry/outdated").headers["Location"] == redirect.headers["Location"]
+
+    for date in TEST_DATES:
+        attributes = api_client.get(f"/api/attributes?date={date}").get_json()
+        joined = {}
+        for index, townvill in enumerate(attributes["townvill"]):
+            region = geometries[townvill]
+            properties = dict(region["properties"], date=date)
+            properties.update((field, attributes[field][index]) for field in ATTRIBUTE_FIELDS)
+            joined[townvill] = {"type": "Feature", "properties": properties, "geometry": region["geometry"]}
+
+        data = api_client.get(f"/api/data?date={date}").get_json()
+        assert joined == {feature["properties"]["townvill"]: feature for feature in data["features"]}
+        keyed = api_client.get(f"/api/attributes?date={date}&layout=keyed").get_json()
+        assert keyed["fields"] == ATTRIBUTE_FIELDS
+        assert keyed["regions"] == {townvill: [attributes[field][index] for field in ATTRIBUTE_FIELDS]
+                                    for index, townvill in enumerate(attributes["townvill"])}
+
+
+
+def test_simplified_levels_shrink_without_opening_borders(tmp_path):
+    import math
+    from region_topology import SIMPLIFY_TOLERANCES, tolerance_for_zoom
+
+    # Two regions split by a finely wiggling border of 200 vertices
+    west, middle, east, south, north = 120.1, 120.11, 120.12, 22.9, 22.92
+    border = [
+        [middle + 0.0003 * math.sin(step / 7) + 0.00002 * math.sin(step * 1.7), south + (north - south) * step / 199]
+        for step in range(200)
+    ]
+    left = [[west, south]] + border + [[west, north], [west, south]]
+    right = [[east, south], [east, north]] + border[::-1] + [[east, south]]
+    features = synthetic_features(TEST_DATES[0], 0)[:2]
+    for feature, ring in zip(features, (left, right)):
+        feature["geometry"] = {"type": "Polygon", "coordinates": [ring]}
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "20230601_case_results.geojson").write_text(
+        json.dumps({"type": "FeatureCollection", "features": features}), encoding="utf-8")
+    db = imported_database(tmp_path)
+
+    levels = db.get_simplification_levels()
+    assert levels == list(SIMPLIFY_TOLERANCES)
+    previous = None
+    for level in [None] + levels:
+        geometries = {townvill: geometry_json for townvill, _, geometry_json in db.get_region_geometries(level)}
+        assert {row[1]: row[-1] for row in db.get_predictions_by_date(TEST_DATES[0], level)} == geometries
+        rings = {townvill: json.loads(geometry_json)["coordinates"][0] for townvill, geometry_json in geometries.items()}
+        vertices = sum(len(ring) for ring in rings.values())
+        assert previous is None or vertices <= previous
+        previous = vertices
+        # Both sides keep exactly the same border vertices, so no gap or sliver opens
+        assert {tuple(point) for point in rings["A0000"] if point[0] != west} == \
+            {tuple(point) for point in rings["A0001"] if point[0] != east}
+    assert previous < (len(left) + len(right)) / 4
+
+    # A requested tolerance resolves to the coarsest level not above it
+    assert db.simplification_level(None) is None
+    assert db.simplification_level(levels[0] / 2) is None
+    assert db.simplification_level(levels[1] * 1.5) == levels[1]
+    assert db.simplification_level(1.0) == levels[-1]
+    assert db.simplification_level(tolerance_for_zoom(10)) == levels[-1]
+    db.close()
+
+
+
+def test_command_line_rejects_unknown_flags(tmp_path, monkeypatch, capsys):
+    import database_manager
+
+    monkeypatch.chdir(tmp_path)
+    write_dataset(tmp_path / "data")
+    for args in (["--bogus"], ["--check-catalog", "extra"]):
+        monkeypatch.setattr("sys.argv", ["database_manager.py"] + args)
+        with pytest.raises(SystemExit) as exit_info:
+            database_manager.main()
+        assert exit_info.value.code == 2
+        assert "Unknown arguments" in capsys.readouterr().err
+    assert not (tmp_path / "output").exists()  # nothing was imported
+
+    monkeypatch.setattr("sys.argv", ["database_manager.py", "--help"])
+    database_manager.main()
+    usage = capsys.readouterr().out
+    assert all(flag in usage for flag in database_manager.COMMANDS)
+
+    # No command rebuilds the database; a command runs its handler
+    monkeypatch.setattr("sys.argv", ["database_manager.py"])
+    database_manager.main()
+    assert f"Total predictions: {len(TEST_DATES) * GRID_SIZE ** 2}" in capsys.readouterr().out
+    monkeypatch.setattr("sys.argv", ["database_manager.py", "--check-catalog"])
+    with pytest.raises(SystemExit) as exit_info:
+        database_manager.main()
+    assert exit_info.value.code == 0
+
+
 if __name__ == "__main__":
     test_database()
\ No newline at end of file
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Timeline downsampling for charting
+Reduces a long daily series to a target number of points while keeping its
+visual shape: Largest-Triangle-Three-Buckets (LTTB) or per-bucket min/max.
+"""
+from datetime import date as Date
+
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+
+def lttb_indices(xs, ys, threshold):
+    """Indices of the points LTTB keeps (always the first and last)
+
+    Each of the ``threshold - 2`` middle buckets contributes the point forming
+    the largest triangle with the previous pick and the next bucket's mean.
+    """
+    n = len(xs)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1]
+
+    bucket_size = (n - 2) / (threshold - 2)
+    picked = [0]
+    a = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        # Mean of the next bucket (just the last point after the final bucket)
+        next_end = min(int((bucket + 2) * bucket_size) + 1, n)
+        count = next_end - end
+        mean_x = sum(xs[end:next_end]) / count
+        mean_y = sum(ys[end:next_end]) / count
+
+        best, best_area = start, -1.0
+        for i in range(start, end):
+            area = abs((xs[a] - mean_x) * (ys[i] - ys[a]) - (xs[a] - xs[i]) * (mean_y - ys[a]))
+            if area > best_area:
+                best, best_area = i, area
+        picked.append(best)
+        a = best
+
+    picked.append(n - 1)
+    return picked
+
+
+def minmax_indices(ys, threshold):
+    """Indices of each bucket's minimum and maximum, in order (first and last always kept)
+
+    The interior points are split into ``(threshold - 2) // 2`` buckets that
+    keep up to two points each, so spikes survive even when most of a bucket
+    is flat and the result never exceeds ``threshold`` (or the two endpoints).
+    """
+    n = len(ys)
+    if threshold >= n:
+        return list(range(n))
+    buckets = (threshold - 2) // 2
+    picked = {0, n - 1}
+    for bucket in range(buckets):
+        start = 1 + bucket * (n - 2) // buckets
+        end = 1 + (bucket + 1) * (n - 2) // buckets
+        if start >= end:
+            continue
+        members = range(start, end)
+        picked.add(min(members, key=ys.__getitem__))
+        picked.add(max(members, key=ys.__getitem__))
+    return sorted(picked)
+
+
+def downsample_timeline(rows, threshold, method='lttb', value_index=2):
+    """Keep at most about ``threshold`` of a region's (date, ...) rows, ordered by date
+
+    x is the day number, so gaps between dates are respected; y is the column
+    at ``value_index`` (NULL counts as 0).
+    """
+    if not threshold or len(rows) <= threshold:
+        return rows
+    ys = [row[value_index] or 0.0 for row in rows]
+    if method == 'minmax':
+        indices = minmax_indices(ys, threshold)
+    else:
+        indices = lttb_indices([Date.fromisoformat(str(row[0])).toordinal() for row in rows], ys, threshold)
+    return [rows[i] for i in indices]
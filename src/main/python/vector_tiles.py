@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Mapbox Vector Tile (MVT) generation for the region layer
+Builds /tiles/<date>/<z>/<x>/<y>.pbf from region_info geometry joined with a
+date's prediction attributes, with an on-disk tile cache and a seeding command
+"""
+import json
+import math
+import os
+import shutil
+import struct
+import sys
+import threading
+from pathlib import Path
+
+from region_topology import geometry_polygons, tolerance_for_zoom
+
+# Tile grid resolution and the clip margin (in tile units) around each tile
+DEFAULT_EXTENT = 4096
+DEFAULT_BUFFER = 64
+
+LAYER_NAME = "regions"
+DEFAULT_TILE_CACHE_DIR = "output/tiles"
+
+# Zoom range pre-rendered by --seed (city overview down to street level)
+DEFAULT_SEED_MIN_ZOOM = 10
+DEFAULT_SEED_MAX_ZOOM = 14
+
+# Attributes carried on every feature, in the order returned by
+# DiseaseDataDatabase.get_region_attributes_by_date after townvill
+TILE_ATTRIBUTE_FIELDS = [
+    "predicted_case_lag_future_14",
+    "predicted_case_lag_future_14_percentage",
+    "predicted_case_lag_future_14_binary",
+    "case_lag_future_14"
+]
+
+# MVT geometry commands and feature type
+CMD_MOVE_TO = 1
+CMD_LINE_TO = 2
+CMD_CLOSE_PATH = 7
+GEOM_POLYGON = 3
+
+MAX_LATITUDE = 85.0511287798
+
+
+def lonlat_to_world(lon, lat):
+    """Web Mercator position of a lon/lat in [0, 1] world units (y grows southwards)"""
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    sin_lat = math.sin(math.radians(lat))
+    x = (lon + 180.0) / 360.0
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return x, y
+
+
+def tile_range(bounds, zoom):
+    """(x_min, y_min, x_max, y_max) tile indices covering world-unit bounds at a zoom"""
+    n = 1 << zoom
+    min_x, min_y, max_x, max_y = bounds
+    return (
+        max(0, int(min_x * n)), max(0, int(min_y * n)),
+        min(n - 1, int(max_x * n)), min(n - 1, int(max_y * n))
+    )
+
+
+# --- Protocol buffer encoding (just the subset vector_tile.proto needs) ---
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _field_varint(field, value):
+    return _varint(field << 3) + _varint(value)
+
+
+def _field_bytes(field, payload):
+    return _varint((field << 3) | 2) + _varint(len(payload)) + payload
+
+
+def _packed(field, values):
+    return _field_bytes(field, b''.join(_varint(v) for v in values))
+
+
+def _encode_value(value):
+    """vector_tile.Tile.Value message for a property value"""
+    if isinstance(value, bool):
+        return _field_varint(7, int(value))
+    if isinstance(value, int):
+        if value < 0:
+            return _field_varint(6, _zigzag(value))
+        return _field_varint(5, value)
+    if isinstance(value, float):
+        return _varint((3 << 3) | 1) + struct.pack('<d', value)
+    return _field_bytes(1, str(value).encode('utf-8'))
+
+
+# --- Geometry processing in tile coordinates ---
+
+def _clip_ring(ring, low, high):
+    """Sutherland-Hodgman clip of a closed ring (no repeated end point) to a square
+
+    Concave rings can gain zero-width spans along the clip edge; they lie in
+    the tile buffer, outside the visible area.
+    """
+    for axis, bound, keep_above in ((0, low, True), (0, high, False), (1, low, True), (1, high, False)):
+        if not ring:
+            break
+        clipped = []
+        previous = ring[-1]
+        previous_inside = previous[axis] >= bound if keep_above else previous[axis] <= bound
+        for point in ring:
+            inside = point[axis] >= bound if keep_above else point[axis] <= bound
+            if inside != previous_inside:
+                t = (bound - previous[axis]) / (point[axis] - previous[axis])
+                crossing = [previous[0] + t * (point[0] - previous[0]),
+                            previous[1] + t * (point[1] - previous[1])]
+                crossing[axis] = bound
+                clipped.append(tuple(crossing))
+            if inside:
+                clipped.append(point)
+            previous, previous_inside = point, inside
+        ring = clipped
+    return ring
+
+
+def _snap_ring(ring):
+    """Snap to the integer tile grid, dropping repeated and exactly collinear points
+
+    Shared borders snap to identical integer vertices in both neighbours, so
+    the zoom-dependent loss of detail never opens gaps between regions.
+    """
+    snapped = []
+    for x, y in ring:
+        point = (int(round(x)), int(round(y)))
+        if not snapped or point != snapped[-1]:
+            snapped.append(point)
+    while len(snapped) > 1 and snapped[0] == snapped[-1]:
+        snapped.pop()
+
+    changed = True
+    while changed and len(snapped) >= 3:
+        changed = False
+        kept = []
+        count = len(snapped)
+        for i, (x, y) in enumerate(snapped):
+            px, py = kept[-1] if kept else snapped[i - 1]
+            nx, ny = snapped[(i + 1) % count]
+            if (x - px) * (ny - y) == (y - py) * (nx - x):
+                changed = True
+                continue
+            kept.append((x, y))
+        snapped = kept
+    return snapped
+
+
+def _ring_area(ring):
+    """Twice the signed surveyor's-formula area in tile coordinates"""
+    return sum(
+        ring[i - 1][0] * ring[i][1] - ring[i][0] * ring[i - 1][1]
+        for i in range(len(ring))
+    )
+
+
+def _polygon_commands(rings, cursor):
+    """MVT command integers for prepared rings (exterior first), updating cursor"""
+    commands = []
+    for ring in rings:
+        commands.append(CMD_MOVE_TO | (1 << 3))
+        x, y = ring[0]
+        commands += [_zigzag(x - cursor[0]), _zigzag(y - cursor[1])]
+        cursor[0], cursor[1] = x, y
+
+        commands.append(CMD_LINE_TO | ((len(ring) - 1) << 3))
+        for x, y in ring[1:]:
+            commands += [_zigzag(x - cursor[0]), _zigzag(y - cursor[1])]
+            cursor[0], cursor[1] = x, y
+        commands.append(CMD_CLOSE_PATH | (1 << 3))
+    return commands
+
+
+def tile_geometry(world_polygons, zoom, x, y, extent=DEFAULT_EXTENT, buffer=DEFAULT_BUFFER):
+    """MVT command list for world-unit polygons clipped to one tile, or None if nothing remains"""
+    scale = (1 << zoom) * extent
+    offset_x, offset_y = x * extent, y * extent
+    low, high = -buffer, extent + buffer
+
+    commands = []
+    cursor = [0, 0]
+    for polygon in world_polygons:
+        rings = []
+        for index, ring in enumerate(polygon):
+            local = [(wx * scale - offset_x, wy * scale - offset_y) for wx, wy in ring]
+            local = _snap_ring(_clip_ring(local, low, high))
+            if len(local) < 3:
+                if index == 0:
+                    break  # Exterior vanished: skip the polygon and its holes
+                continue
+            area = _ring_area(local)
+            if area == 0:
+                if index == 0:
+                    break
+                continue
+            # Exterior rings must have positive area, holes negative (MVT 2.1)
+            if (index == 0) != (area > 0):
+                local.reverse()
+            rings.append(local)
+        if rings:
+            commands += _polygon_commands(rings, cursor)
+    return commands or None
+
+
+def encode_tile(features, layer_name=LAYER_NAME, extent=DEFAULT_EXTENT):
+    """Encode (properties, commands) features into a single-layer MVT tile"""
+    keys, key_index = [], {}
+    values, value_index = [], {}
+
+    encoded_features = []
+    for feature_id, (properties, commands) in enumerate(features, start=1):
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            if key not in key_index:
+                key_index[key] = len(keys)
+                keys.append(key)
+            value_key = (type(value).__name__, value)
+            if value_key not in value_index:
+                value_index[value_key] = len(values)
+                values.append(value)
+            tags += [key_index[key], value_index[value_key]]
+
+        encoded_features.append(_field_bytes(2,
+            _field_varint(1, feature_id) + _packed(2, tags)
+            + _field_varint(3, GEOM_POLYGON) + _packed(4, commands)
+        ))
+
+    if not encoded_features:
+        return b''
+
+    layer = (
+        _field_varint(15, 2)
+        + _field_bytes(1, layer_name.encode('utf-8'))
+        + b''.join(encoded_features)
+        + b''.join(_field_bytes(3, key.encode('utf-8')) for key in keys)
+        + b''.join(_field_bytes(4, _encode_value(value)) for value in values)
+        + _field_varint(5, extent)
+    )
+    return _field_bytes(3, layer)
+
+
+class RegionTileSource:
+    """Build and cache region MVT tiles for any backend with the DiseaseDataDatabase query surface
+
+    Projected region geometry is kept in memory per dataset version and
+    simplification level (each zoom uses the level its pixel size allows); finished
+    tiles are written under ``cache_dir/<version>/<date>/<z>/<x>/<y>.pbf`` so a
+    re-import never serves stale tiles. Directories of older versions are
+    deleted when a new version is first seen.
+    """
+
+    def __init__(self, db, cache_dir=DEFAULT_TILE_CACHE_DIR, extent=DEFAULT_EXTENT, buffer=DEFAULT_BUFFER):
+        self.db = db
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.extent = extent
+        self.buffer = buffer
+        self._regions = {}
+        self._regions_version = None
+        self._lock = threading.Lock()
+
+    def _load_regions(self, zoom=None):
+        """([(townvill, town, world polygons, bbox)], version) at the level suited to a zoom"""
+        version = self.db.get_dataset_version()
+        level = self.db.simplification_level(tolerance_for_zoom(zoom)) if zoom is not None else None
+        with self._lock:
+            if self._regions_version != version:
+                self._regions = {}
+                self._regions_version = version
+                self.prune_stale_versions(version)
+            if level not in self._regions:
+                regions = []
+                for townvill, town, geometry_json in self.db.get_region_geometries(level):
+                    polygons = [
+                        [[lonlat_to_world(lon, lat) for lon, lat, *_ in ring] for ring in polygon]
+                        for polygon in geometry_polygons(json.loads(geometry_json) if geometry_json else None)
+                    ]
+                    points = [point for polygon in polygons for point in polygon[0]]
+                    if not points:
+                        continue
+                    xs, ys = zip(*points)
+                    regions.append((townvill, town, polygons, (min(xs), min(ys), max(xs), max(ys))))
+                self._regions[level] = regions
+            return self._regions[level], version
+
+    def prune_stale_versions(self, version):
+        """Delete cached tiles of dataset versions older than ``version``; returns how many were removed
+
+        Only numeric version directories are touched, and newer ones are kept in
+        case another process already serves a later import.
+        """
+        if self.cache_dir is None or not self.cache_dir.is_dir() or not version.isdigit():
+            return 0
+        removed = 0
+        for path in self.cache_dir.iterdir():
+            if path.is_dir() and path.name.isdigit() and int(path.name) < int(version):
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        if removed:
+            print(f"🧹 Removed {removed} stale tile cache version(s) from {self.cache_dir}")
+        return removed
+
+    def bounds(self):
+        """World-unit bounds of all regions, or None when there are none"""
+        regions, _ = self._load_regions()
+        if not regions:
+            return None
+        boxes = [bbox for _, _, _, bbox in regions]
+        return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+    def render_tile(self, date, zoom, x, y, attributes=None):
+        """Encode one tile; None if the date has no predictions
+
+        ``attributes`` maps townvill to its attribute row and is reused when
+        rendering many tiles of the same date.
+        """
+        regions, _ = self._load_regions(zoom)
+        if attributes is None:
+            attributes = self.date_attributes(date)
+        if not attributes:
+            return None
+
+        n = 1 << zoom
+        margin = self.buffer / self.extent / n
+        tile_box = (x / n - margin, y / n - margin, (x + 1) / n + margin, (y + 1) / n + margin)
+
+        features = []
+        for townvill, town, polygons, bbox in regions:
+            row = attributes.get(townvill)
+            if row is None:
+                continue
+            if bbox[2] < tile_box[0] or bbox[0] > tile_box[2] or bbox[3] < tile_box[1] or bbox[1] > tile_box[3]:
+                continue
+            commands = tile_geometry(polygons, zoom, x, y, self.extent, self.buffer)
+            if commands is None:
+                continue
+            properties = {"townvill": townvill, "town": town, "date": date}
+            properties.update(zip(TILE_ATTRIBUTE_FIELDS, row))
+            features.append((properties, commands))
+
+        return encode_tile(features, extent=self.extent)
+
+    def date_attributes(self, date):
+        return {row[0]: row[1:] for row in self.db.get_region_attributes_by_date(date)}
+
+    def _tile_path(self, version, date, zoom, x, y):
+        return self.cache_dir / version / date / str(zoom) / str(x) / f"{y}.pbf"
+
+    def get_tile(self, date, zoom, x, y, attributes=None):
+        """Tile bytes from the disk cache, rendering and storing them on a miss"""
+        if self.cache_dir is None:
+            return self.render_tile(date, zoom, x, y, attributes)
+
+        _, version = self._load_regions()
+        path = self._tile_path(version, date, zoom, x, y)
+        if path.exists():
+            return path.read_bytes()
+
+        tile = self.render_tile(date, zoom, x, y, attributes)
+        if tile:  # Empty tiles are cheap to rebuild and not worth a file each
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            temp_path.write_bytes(tile)
+            os.replace(temp_path, path)
+        return tile
+
+    def seed(self, dates=None, min_zoom=DEFAULT_SEED_MIN_ZOOM, max_zoom=DEFAULT_SEED_MAX_ZOOM):
+        """Pre-render every tile covering the regions for the given dates and zooms"""
+        bounds = self.bounds()
+        if bounds is None:
+            print("❌ No region geometry to tile")
+            return 0
+        if dates is None:
+            dates = self.db.get_available_dates()
+
+        print(f"🧱 Seeding tiles for {len(dates)} dates, zoom {min_zoom}-{max_zoom}")
+        count = 0
+        for date in dates:
+            attributes = self.date_attributes(date)
+            for zoom in range(min_zoom, max_zoom + 1):
+                x_min, y_min, x_max, y_max = tile_range(bounds, zoom)
+                for x in range(x_min, x_max + 1):
+                    for y in range(y_min, y_max + 1):
+                        self.get_tile(date, zoom, x, y, attributes)
+                        count += 1
+            print(f"  ✅ {date}")
+
+        print(f"🎉 Seeded {count:,} tiles into {self.cache_dir}")
+        return count
+
+
+def main():
+    """Seed the tile cache: vector_tiles.py --seed [min_zoom max_zoom]"""
+    from database_manager import DiseaseDataDatabase
+
+    if len(sys.argv) > 1 and sys.argv[1] == '--seed':
+        min_zoom = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_SEED_MIN_ZOOM
+        max_zoom = int(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_SEED_MAX_ZOOM
+        db = DiseaseDataDatabase()
+        source = RegionTileSource(db, os.environ.get('DISEASE_TILE_CACHE_DIR', DEFAULT_TILE_CACHE_DIR))
+        source.seed(min_zoom=min_zoom, max_zoom=max_zoom)
+        db.close()
+        return
+
+    print("Usage: python vector_tiles.py --seed [min_zoom max_zoom]")
+
+if __name__ == "__main__":
+    main()
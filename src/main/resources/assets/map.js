@@ -7,10 +7,20 @@ document.addEventListener('DOMContentLoaded', function () {
     }).addTo(map);
 
     var geoJsonLayer = L.geoJson().addTo(map);
+    var regionLayers = {};  // townvill -> polygon layer, built once from /api/geometry
+    var geometryReady = null;
+    
+    // Vector tiles load only the visible area; without the VectorGrid plugin fall back to /api/geometry
+    var useVectorTiles = typeof L.vectorGrid !== 'undefined';
+    var regionTileLayer = null;
     var availableDates = [];
     var currentDateIndex = 0;
     var isPlaying = false;
     var playInterval;
+    var seriesReady = null;  // decoded /api/series matrices used while the timeline plays
+    var tileStyleOverrides = [];  // townvills restyled on the tile layer during playback
+    var shownDate = null;  // date the /api/geometry polygons are styled for, so /api/diff can patch them
+    var shownRegions = {};  // townvill -> feature visible on shownDate
     
     // Timeline controls
     var timelineSlider = document.getElementById('timeline-slider');
@@ -94,23 +104,265 @@ document.addEventListener('DOMContentLoaded', function () {
         `;
     }
 
-    // Load data for specific date
-    function loadDataForDate(date) {
-        fetch(`/api/data?date=${date}`)
-            .then(response => response.json())
-            .then(geoJsonData => {
-                geoJsonLayer.clearLayers();
-                
-                // Apply styling and popups to each feature
-                const styledGeoJson = L.geoJson(geoJsonData, {
-                    style: getPolygonStyle,
-                    onEachFeature: function(feature, layer) {
-                        layer.bindPopup(getPopupContent(feature));
-                    }
+    // Load the static region polygons once; the URL is content-hashed so the browser caches it
+    function loadGeometry() {
+        if (!geometryReady) {
+            geometryReady = fetch('/api/geometry')
+                .then(response => response.json())
+                .then(geoJsonData => {
+                    geoJsonLayer.addLayer(L.geoJson(geoJsonData, {
+                        style: getPolygonStyle,
+                        onEachFeature: function(feature, layer) {
+                            regionLayers[feature.properties.townvill] = layer;
+                            layer.bindPopup(() => getPopupContent(layer.feature));
+                        }
+                    }));
+                });
+        }
+        return geometryReady;
+    }
+
+    // Hide regions that have no prediction on the selected date
+    var hiddenStyle = { fillOpacity: 0, opacity: 0 };
+
+    // Feature properties for row i of an /api/attributes response
+    function attributeProperties(attributes, i, date) {
+        return {
+            townvill: attributes.townvill[i],
+            date: date,
+            predicted_case_lag_future_14: attributes.predicted_case_lag_future_14[i],
+            predicted_case_lag_future_14_percentage: attributes.predicted_case_lag_future_14_percentage[i],
+            predicted_case_lag_future_14_binary: attributes.predicted_case_lag_future_14_binary[i],
+            case_lag_future_14: attributes.case_lag_future_14[i]
+        };
+    }
+
+    // Restyle the /api/geometry polygons from a date's attributes; returns the features shown
+    function restyleRegions(attributes, date) {
+        const features = [];
+        shownRegions = {};
+        
+        attributes.townvill.forEach((townvill, i) => {
+            const layer = regionLayers[townvill];
+            if (!layer) return;
+            
+            Object.assign(layer.feature.properties, attributeProperties(attributes, i, date));
+            layer.setStyle(getPolygonStyle(layer.feature));
+            features.push(layer.feature);
+            shownRegions[townvill] = layer.feature;
+        });
+        
+        Object.keys(regionLayers).forEach(townvill => {
+            if (!shownRegions[townvill]) {
+                regionLayers[townvill].setStyle(hiddenStyle);
+            }
+        });
+        shownDate = date;
+        return features;
+    }
+
+    // Apply an /api/diff patch to the polygons styled for diff.from; returns the features shown
+    function patchRegions(diff) {
+        Object.keys(diff.changed).forEach(townvill => {
+            const layer = regionLayers[townvill];
+            if (!layer) return;
+            
+            diff.fields.forEach((field, i) => { layer.feature.properties[field] = diff.changed[townvill][i]; });
+            layer.setStyle(getPolygonStyle(layer.feature));
+            shownRegions[townvill] = layer.feature;
+        });
+        
+        diff.removed.forEach(townvill => {
+            if (regionLayers[townvill]) {
+                regionLayers[townvill].setStyle(hiddenStyle);
+            }
+            delete shownRegions[townvill];
+        });
+        
+        const features = Object.values(shownRegions);
+        features.forEach(feature => { feature.properties.date = diff.to; });
+        shownDate = diff.to;
+        return features;
+    }
+
+    // Point the vector tile layer at a date; tiles carry their own attributes
+    function showTilesForDate(date) {
+        const url = `/tiles/${date}/{z}/{x}/{y}.pbf`;
+        if (regionTileLayer) {
+            regionTileLayer.setUrl(url);
+            return;
+        }
+        
+        regionTileLayer = L.vectorGrid.protobuf(url, {
+            rendererFactory: L.canvas.tile,
+            interactive: true,
+            getFeatureId: f => f.properties.townvill,
+            vectorTileLayerStyles: {
+                regions: properties => getPolygonStyle({ properties: properties })
+            }
+        })
+            .on('click', function(e) {
+                L.popup()
+                    .setLatLng(e.latlng)
+                    .setContent(getPopupContent({ properties: e.layer.properties }))
+                    .openOn(map);
+            })
+            .addTo(map);
+    }
+
+    // Attribute columns fetched as series for playback, keyed by /api/series field name
+    var seriesFields = {
+        predicted: 'predicted_case_lag_future_14',
+        percentage: 'predicted_case_lag_future_14_percentage',
+        binary: 'predicted_case_lag_future_14_binary',
+        actual: 'case_lag_future_14'
+    };
+
+    // Typed arrays for the /api/series matrix dtypes (integer fields widen to stay exact)
+    var seriesArrays = { uint8: Uint8Array, uint16: Uint16Array, uint32: Uint32Array };
+
+    // Decode an /api/series payload: uint32 header length, JSON header, date-major values
+    function decodeSeries(buffer) {
+        const headerLength = new DataView(buffer).getUint32(0, true);
+        const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, headerLength)));
+        header.values = new seriesArrays[header.dtype](buffer, 4 + headerLength);
+        return header;
+    }
+
+    // Fetch every attribute for the whole season once, so playback needs no per-date requests
+    function loadSeries() {
+        if (!seriesReady) {
+            const fields = Object.keys(seriesFields);
+            seriesReady = Promise.all(fields.map(field =>
+                fetch(`/api/series?field=${field}`)
+                    .then(response => {
+                        if (!response.ok) throw new Error(`series ${field}: ${response.status}`);
+                        return response.arrayBuffer();
+                    })
+                    .then(decodeSeries)
+            ))
+                .then(decoded => {
+                    const series = {};
+                    fields.forEach((field, i) => { series[field] = decoded[i]; });
+                    return series;
+                })
+                .catch(error => {
+                    seriesReady = null;
+                    throw error;
                 });
+        }
+        return seriesReady;
+    }
+
+    // Build an /api/attributes-style object for one date from the decoded series
+    function seriesAttributes(series, date) {
+        const attributes = { townvill: [] };
+        Object.values(seriesFields).forEach(column => { attributes[column] = []; });
+        
+        const percentage = series.percentage;
+        const row = percentage.dates.indexOf(date);
+        if (row < 0) return attributes;
+        
+        const width = percentage.regions.length;
+        percentage.regions.forEach((townvill, col) => {
+            if (percentage.values[row * width + col] === percentage.missing) return;
+            
+            attributes.townvill.push(townvill);
+            Object.entries(seriesFields).forEach(([field, column]) => {
+                const matrix = series[field];
+                const value = matrix.values[row * width + col];
+                attributes[column].push(value === matrix.missing ? null : value * matrix.scale + matrix.offset);
+            });
+        });
+        return attributes;
+    }
+
+    // Tile mode playback: restyle the loaded tiles in place instead of fetching new ones
+    function restyleTiles(attributes, date) {
+        const features = [];
+        const seen = {};
+        
+        attributes.townvill.forEach((townvill, i) => {
+            const feature = { properties: attributeProperties(attributes, i, date) };
+            regionTileLayer.setFeatureStyle(townvill, getPolygonStyle(feature));
+            features.push(feature);
+            seen[townvill] = true;
+        });
+        
+        tileStyleOverrides.forEach(townvill => {
+            if (!seen[townvill]) {
+                regionTileLayer.setFeatureStyle(townvill, hiddenStyle);
+            }
+        });
+        tileStyleOverrides = attributes.townvill.concat(tileStyleOverrides.filter(townvill => !seen[townvill]));
+        return features;
+    }
+
+    // Playback step: style the map for a date from the preloaded series
+    function showSeriesDate(date) {
+        Promise.all([useVectorTiles ? null : loadGeometry(), loadSeries()])
+            .then(([, series]) => {
+                const attributes = seriesAttributes(series, date);
+                const features = useVectorTiles && regionTileLayer
+                    ? restyleTiles(attributes, date)
+                    : restyleRegions(attributes, date);
                 
-                geoJsonLayer.addLayer(styledGeoJson);
-                updateStats(geoJsonData);
+                updateStats({ features: features });
+                currentDateSpan.textContent = date;
+            })
+            .catch(error => {
+                console.error('Error loading series, falling back to per-date requests:', error);
+                loadDataForDate(date);
+            });
+    }
+
+    // Load data for specific date: patch the polygons from the shown date when possible
+    function loadDataForDate(date) {
+        if (useVectorTiles || shownDate === null || shownDate === date) {
+            loadAttributesForDate(date);
+            return;
+        }
+        
+        fetch(`/api/diff?from=${shownDate}&to=${date}`)
+            .then(response => {
+                if (!response.ok) throw new Error(`diff: ${response.status}`);
+                return response.json();
+            })
+            .then(diff => {
+                // Another date was shown meanwhile: the patch no longer applies
+                if (diff.from !== shownDate) {
+                    loadAttributesForDate(date);
+                    return;
+                }
+                updateStats({ features: patchRegions(diff) });
+                currentDateSpan.textContent = date;
+            })
+            .catch(error => {
+                console.error('Error loading diff, reloading attributes:', error);
+                loadAttributesForDate(date);
+            });
+    }
+
+    // Fetch a date's full attributes and restyle the map
+    function loadAttributesForDate(date) {
+        if (useVectorTiles) {
+            if (regionTileLayer) {
+                tileStyleOverrides.forEach(townvill => regionTileLayer.resetFeatureStyle(townvill));
+                tileStyleOverrides = [];
+            }
+            showTilesForDate(date);
+        }
+        
+        Promise.all([
+            useVectorTiles ? null : loadGeometry(),
+            fetch(`/api/attributes?date=${date}`).then(response => response.json())
+        ])
+            .then(([, attributes]) => {
+                const features = useVectorTiles
+                    ? attributes.townvill.map((townvill, i) => ({ properties: attributeProperties(attributes, i, date) }))
+                    : restyleRegions(attributes, date);
+                
+                updateStats({ features: features });
                 currentDateSpan.textContent = date;
             })
             .catch(error => {
@@ -125,12 +377,13 @@ document.addEventListener('DOMContentLoaded', function () {
         
         isPlaying = true;
         playPauseBtn.textContent = '⏸️';
+        loadSeries();
         
         playInterval = setInterval(function() {
             if (currentDateIndex < availableDates.length - 1) {
                 currentDateIndex++;
                 timelineSlider.value = currentDateIndex;
-                loadDataForDate(availableDates[currentDateIndex]);
+                showSeriesDate(availableDates[currentDateIndex]);
             } else {
                 pauseTimeline();
             }
@@ -143,6 +396,9 @@ document.addEventListener('DOMContentLoaded', function () {
         if (playInterval) {
             clearInterval(playInterval);
         }
+        
+        // Reload the full attributes (and tiles) so popups match the date shown
+        loadDataForDate(availableDates[currentDateIndex]);
     }
 
     // Initialize application
@@ -158,11 +414,12 @@ document.addEventListener('DOMContentLoaded', function () {
             // Timeline slider event
             timelineSlider.addEventListener('input', function() {
                 currentDateIndex = parseInt(this.value);
-                loadDataForDate(availableDates[currentDateIndex]);
                 
-                // Pause if playing
+                // Pausing reloads the selected date
                 if (isPlaying) {
                     pauseTimeline();
+                } else {
+                    loadDataForDate(availableDates[currentDateIndex]);
                 }
             });
             